@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""Speech recognition backends with silence trimming, micro-batching and model size selection"""
+
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Optional
+
+import torch
+
+from audio_io import WHISPER_SAMPLE_RATE
+from inference import InferencePool, MicroBatcher
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_SIZE = "base"
+# Smaller model used for long clips or when the ASR queue is deep
+DEFAULT_FAST_MODEL_SIZE = "tiny"
+DEFAULT_BATCH_WINDOW_MS = 30
+DEFAULT_MAX_BATCH = 8
+
+# Whisper decodes 30 second windows; longer clips go through the full transcribe loop
+WHISPER_WINDOW_SAMPLES = 30 * WHISPER_SAMPLE_RATE
+
+
+def trim_silence(
+    audio: torch.Tensor,
+    sample_rate: int = WHISPER_SAMPLE_RATE,
+    frame_ms: int = 30,
+    threshold_db: float = -35.0,
+    pad_ms: int = 200,
+) -> torch.Tensor:
+    """Cut leading and trailing silence using a frame energy voice activity detector
+
+    A frame counts as speech when its RMS level is within ``threshold_db`` of the loudest frame.
+    ``pad_ms`` of audio is kept around the detected speech so word onsets are not clipped.
+    """
+    frame = int(sample_rate * frame_ms / 1000)
+    if audio.numel() < frame:
+        return audio
+
+    frames = audio[: audio.numel() // frame * frame].reshape(-1, frame)
+    rms = frames.pow(2).mean(dim=1).sqrt()
+    peak = rms.max()
+    if peak <= 0:
+        return audio[:0]
+
+    voiced = torch.nonzero(rms >= peak * 10 ** (threshold_db / 20)).flatten()
+    pad = int(sample_rate * pad_ms / 1000)
+    start = max(int(voiced[0]) * frame - pad, 0)
+    end = min((int(voiced[-1]) + 1) * frame + pad, audio.numel())
+    return audio[start:end]
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """Word-level edit distance divided by the number of reference words"""
+    ref = reference.lower().split()
+    hyp = hypothesis.lower().split()
+    if not ref:
+        return float(bool(hyp))
+
+    distances = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, start=1):
+        previous, distances[0] = distances[0], i
+        for j, hyp_word in enumerate(hyp, start=1):
+            previous, distances[j] = distances[j], min(
+                distances[j] + 1,  # deletion
+                distances[j - 1] + 1,  # insertion
+                previous + (ref_word != hyp_word),  # substitution
+            )
+    return distances[-1] / len(ref)
+
+
+class ASRBackend(ABC):
+    """Interface for speech recognition backends
+
+    Audio is a mono float32 tensor at 16 kHz. Backends may keep several model sizes loaded.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def transcribe(self, audio: torch.Tensor, size: str) -> str:
+        """Transcribe one clip with the model of the given size"""
+
+    def transcribe_batch(self, audios: list, size: str) -> list:
+        """Transcribe several clips; backends override this when they can decode them together"""
+        return [self.transcribe(audio, size) for audio in audios]
+
+
+class WhisperBackend(ASRBackend):
+    """openai-whisper backend with batched decoding of clips up to 30 seconds"""
+
+    name = "whisper"
+
+    def __init__(
+        self,
+        device: Optional[str] = None,
+        model=None,
+        default_size: str = DEFAULT_MODEL_SIZE,
+        load_missing: bool = True,
+        optimize: Optional[Callable] = None,
+    ):
+        self.device = device
+        self.default_size = default_size
+        self.load_missing = load_missing
+        self.optimize = optimize  # Applied to sizes loaded later, e.g. the CPU profile
+        self._models = {default_size: model} if model is not None else {}
+
+    def get_model(self, size: str):
+        if size not in self._models:
+            if not self.load_missing:
+                # Only the preloaded model is available (e.g. stubs); use it for every size
+                return self._models[self.default_size]
+            import whisper
+
+            logger.info(f"Loading Whisper {size} model...")
+            model = whisper.load_model(size, device=self.device)
+            self._models[size] = self.optimize(model) if self.optimize else model
+        return self._models[size]
+
+    def transcribe(self, audio: torch.Tensor, size: str) -> str:
+        return self.get_model(size).transcribe(audio)["text"].strip()
+
+    def transcribe_batch(self, audios: list, size: str) -> list:
+        model = self.get_model(size)
+        if len(audios) == 1 or not hasattr(model, "dims") or any(a.numel() > WHISPER_WINDOW_SAMPLES for a in audios):
+            return super().transcribe_batch(audios, size)
+
+        import whisper
+
+        mels = torch.stack(
+            [whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), model.dims.n_mels) for audio in audios]
+        ).to(model.device)
+        options = whisper.DecodingOptions(fp16=model.device.type == "cuda", without_timestamps=True)
+        return [result.text.strip() for result in whisper.decode(model, mels, options)]
+
+
+class FasterWhisperBackend(ASRBackend):
+    """CTranslate2 int8 backend (faster-whisper) for CPU hosts"""
+
+    name = "faster-whisper"
+
+    def __init__(self, device: str = "cpu", compute_type: str = "int8", cpu_threads: int = 0):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise ImportError("The faster-whisper backend needs `pip install faster-whisper`") from e
+
+        self._model_cls = WhisperModel
+        self.device = device
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self._models = {}
+
+    def get_model(self, size: str):
+        if size not in self._models:
+            logger.info(f"Loading faster-whisper {size} model ({self.compute_type})...")
+            self._models[size] = self._model_cls(
+                size, device=self.device, compute_type=self.compute_type, cpu_threads=self.cpu_threads
+            )
+        return self._models[size]
+
+    def transcribe(self, audio: torch.Tensor, size: str) -> str:
+        segments, _ = self.get_model(size).transcribe(audio.numpy(), beam_size=1)
+        return "".join(segment.text for segment in segments).strip()
+
+
+BACKENDS = {"whisper": WhisperBackend, "faster-whisper": FasterWhisperBackend}
+
+
+class ModelSizePolicy:
+    """Chooses the model size for a clip from its length and the current ASR queue depth"""
+
+    def __init__(
+        self,
+        default: str = DEFAULT_MODEL_SIZE,
+        fast: str = DEFAULT_FAST_MODEL_SIZE,
+        long_clip_seconds: float = 60.0,
+        busy_queue_depth: int = 4,
+    ):
+        self.default = default
+        self.fast = fast
+        self.long_clip_seconds = long_clip_seconds
+        self.busy_queue_depth = busy_queue_depth
+
+    def choose(self, duration: float, queue_depth: int, prefer_fast: bool = False) -> str:
+        """``prefer_fast`` lets a caller ask for the fast model, e.g. when a request is running late"""
+        if prefer_fast or duration >= self.long_clip_seconds or queue_depth >= self.busy_queue_depth:
+            return self.fast
+        return self.default
+
+
+class ASRService:
+    """Trims silence, picks a model size and batches concurrent clips onto the ASR stage"""
+
+    def __init__(
+        self,
+        backend: ASRBackend,
+        inference: InferencePool,
+        policy: Optional[ModelSizePolicy] = None,
+        window_ms: float = DEFAULT_BATCH_WINDOW_MS,
+        max_batch: int = DEFAULT_MAX_BATCH,
+    ):
+        self.backend = backend
+        self.inference = inference
+        self.policy = policy or ModelSizePolicy()
+        self._batcher = MicroBatcher(inference, "asr", self._transcribe_batch, window_ms, max_batch)
+
+    @classmethod
+    def from_env(
+        cls,
+        inference: InferencePool,
+        device: Optional[str] = None,
+        model=None,
+        load_missing: bool = True,
+        optimize: Optional[Callable] = None,
+        cpu_threads: int = 0,
+    ) -> "ASRService":
+        """Create the service from ASR_* settings, optionally with a preloaded Whisper model
+
+        ``device`` None lets the backend pick; ``cpu_threads`` 0 keeps the backend's default thread count.
+        """
+        name = os.getenv("ASR_BACKEND", "whisper")
+        default_size = os.getenv("ASR_MODEL_SIZE", DEFAULT_MODEL_SIZE)
+        if name == "whisper":
+            backend = WhisperBackend(
+                device=device, model=model, default_size=default_size, load_missing=load_missing, optimize=optimize
+            )
+        else:
+            # faster-whisper runs on CUDA or the CPU (MPS falls back to the CPU)
+            device = "cpu" if device == "mps" else device or "auto"
+            backend = BACKENDS[name](device=device, cpu_threads=cpu_threads)
+        policy = ModelSizePolicy(default=default_size, fast=os.getenv("ASR_FAST_MODEL_SIZE", DEFAULT_FAST_MODEL_SIZE))
+        return cls(
+            backend,
+            inference,
+            policy,
+            window_ms=float(os.getenv("ASR_BATCH_WINDOW_MS", DEFAULT_BATCH_WINDOW_MS)),
+            max_batch=int(os.getenv("ASR_MAX_BATCH", DEFAULT_MAX_BATCH)),
+        )
+
+    async def transcribe(
+        self,
+        audio: torch.Tensor,
+        on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+        prefer_fast: bool = False,
+    ) -> str:
+        """Transcribe a mono 16 kHz clip, with the fast model if ``prefer_fast``"""
+        text, _ = await self.transcribe_with_size(audio, on_queued, prefer_fast)
+        return text
+
+    async def transcribe_with_size(
+        self,
+        audio: torch.Tensor,
+        on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+        prefer_fast: bool = False,
+    ) -> tuple:
+        """Like ``transcribe``, but returns the transcript and the model size used (None for silence)"""
+        audio = trim_silence(audio)
+        if audio.numel() == 0:
+            return "", None
+
+        duration = audio.numel() / WHISPER_SAMPLE_RATE
+        size = self.policy.choose(duration, self.inference.depth("asr"), prefer_fast)
+        logger.info(f"Transcribing {duration:.1f}s clip with {self.backend.name} {size}")
+        return await self._batcher.submit(size, audio, on_queued), size
+
+    def _transcribe_batch(self, size: str, audios: list) -> list:
+        with metrics.profiled("asr"), torch.inference_mode():
+            return self.backend.transcribe_batch(audios, size)
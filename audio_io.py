@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""In-memory audio decoding and encoding, so voice notes never touch the disk"""
+
+import io
+import logging
+import os
+
+import torch
+import torchaudio as ta
+from torchaudio.io import StreamWriter
+
+logger = logging.getLogger(__name__)
+
+WHISPER_SAMPLE_RATE = 16000
+OPUS_SAMPLE_RATE = 48000  # Opus always runs at 48 kHz internally
+DEFAULT_OPUS_BITRATE = 32000  # Plenty for mono speech; keeps uploads small
+
+
+def opus_bitrate() -> int:
+    """Opus bitrate for voice notes from OPUS_BITRATE, in bits per second"""
+    return int(os.getenv("OPUS_BITRATE", DEFAULT_OPUS_BITRATE))
+
+
+def decode_audio(data: bytes, sample_rate: int = WHISPER_SAMPLE_RATE) -> torch.Tensor:
+    """Decode encoded audio bytes into a mono float32 waveform at the given sample rate"""
+    waveform, sr = ta.load(io.BytesIO(data))
+    waveform = waveform.mean(dim=0)
+    if sr != sample_rate:
+        waveform = ta.functional.resample(waveform, sr, sample_rate)
+    return waveform.contiguous()
+
+
+def encode_opus(wav: torch.Tensor, sample_rate: int, bitrate: int = DEFAULT_OPUS_BITRATE) -> bytes:
+    """Encode a waveform as OGG/Opus bytes, the format Telegram expects for voice notes"""
+    wav = wav.detach().float().cpu().reshape(-1)
+    if sample_rate != OPUS_SAMPLE_RATE:
+        wav = ta.functional.resample(wav, sample_rate, OPUS_SAMPLE_RATE)
+
+    buffer = io.BytesIO()
+    writer = StreamWriter(dst=buffer, format="ogg")
+    writer.add_audio_stream(
+        sample_rate=OPUS_SAMPLE_RATE,
+        num_channels=1,
+        encoder="libopus",
+        encoder_option={"b": str(bitrate)},
+    )
+    with writer.open():
+        writer.write_audio_chunk(0, wav.clamp(-1.0, 1.0).unsqueeze(1))
+    return buffer.getvalue()
+
+
+def encode_wav(wav: torch.Tensor, sample_rate: int) -> bytes:
+    """Encode a waveform as WAV bytes"""
+    buffer = io.BytesIO()
+    ta.save(buffer, wav.detach().cpu().reshape(1, -1), sample_rate, format="wav")
+    return buffer.getvalue()
+
+
+def encode_voice(wav: torch.Tensor, sample_rate: int, bitrate: int = DEFAULT_OPUS_BITRATE) -> bytes:
+    """Encode a waveform for a voice note, falling back to WAV when Opus encoding is unavailable"""
+    try:
+        return encode_opus(wav, sample_rate, bitrate)
+    except Exception as e:
+        logger.warning(f"Opus encoding failed, sending WAV instead: {e}")
+        return encode_wav(wav, sample_rate)
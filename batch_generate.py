@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""Generate Alan Watts replies and voice notes for a JSONL file of prompts, without Telegram
+
+Each line is a JSON object with the prompt in ``text``, ``body`` or ``title`` and an optional
+``request_id`` or ``id`` (the shape of requests.jsonl). Replies are written to the output
+directory as ``<id>.txt`` and ``<id>.ogg`` (or ``.wav`` when Opus encoding is unavailable),
+with one ``manifest.jsonl`` line per finished prompt; empty prompts are reported as failed. Running the same command again resumes
+an interrupted run: finished prompts are skipped and generated replies are not regenerated.
+
+Examples:
+    python batch_generate.py prompts.jsonl --output generated/
+    python batch_generate.py prompts.jsonl --output generated/ --text-only --llm-concurrency 4
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from typing import Optional
+
+from audio_io import encode_voice
+from telegram_bot import AlanWatts
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTS_CONCURRENCY = 8  # Enough requests in flight to fill a TTS batch
+
+
+def read_prompts(path) -> list:
+    """Read prompts from a JSONL file as {"id", "text"} dicts"""
+    prompts = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = record.get("text") or record.get("body") or record.get("title", "")
+            prompt_id = record.get("request_id") or record.get("id") or f"line-{line_number}"
+            prompts.append({"id": re.sub(r"[^\w.-]", "_", str(prompt_id))[:100], "text": text.strip()})
+    return prompts
+
+
+def read_jsonl(path: Path) -> list:
+    """Read the records of a checkpoint file, ignoring a line cut short by a killed run"""
+    if not path.exists():
+        return []
+    records = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            logger.warning(f"Skipping incomplete line in {path}")
+    return records
+
+
+def append_jsonl(path: Path, record: dict):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class StageStats:
+    """Items, busy time and wall time of one pipeline stage"""
+
+    def __init__(self):
+        self.items = 0
+        self.busy = 0.0
+        self.first = None
+        self.last = None
+        self.audio_seconds = 0.0
+
+    def record(self, start: float, end: float):
+        self.items += 1
+        self.busy += end - start
+        self.first = start if self.first is None else min(self.first, start)
+        self.last = end if self.last is None else max(self.last, end)
+
+    def to_dict(self) -> dict:
+        wall = (self.last - self.first) if self.items else 0.0
+        return {
+            "items": self.items,
+            "wall_seconds": wall,
+            "busy_seconds": self.busy,
+            "items_per_second": self.items / wall if wall else 0.0,
+            "audio_seconds": self.audio_seconds,
+        }
+
+
+class BatchGenerator:
+    """Runs prompts through the bot's personality, LLM and TTS as a pipeline of concurrent stages
+
+    LLM requests run ``llm_concurrency`` at a time. ``tts_concurrency`` syntheses are kept in
+    flight so the TTS batcher can group them into batched passes (long replies go to the parallel
+    TTS workers when enabled, as in the bot). Encoding and writing happen in a third stage, and
+    bounded queues between the stages keep memory flat.
+    """
+
+    def __init__(
+        self,
+        watts: AlanWatts,
+        output_dir,
+        voice: Optional[dict] = None,
+        llm_concurrency: Optional[int] = None,
+        tts_concurrency: int = DEFAULT_TTS_CONCURRENCY,
+        audio: bool = True,
+    ):
+        self.watts = watts
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.voice = voice or {
+            "audio_prompt_path": watts.watts_voice,
+            "exaggeration": watts.default_exaggeration,
+            "cfg_weight": watts.default_cfg_weight,
+        }
+        self.llm_concurrency = llm_concurrency or watts.inference.stages["llm"].workers
+        self.tts_concurrency = tts_concurrency
+        self.audio = audio
+        self.manifest_path = self.output_dir / "manifest.jsonl"
+        self.replies_path = self.output_dir / "replies.jsonl"
+        self.stats = {"llm": StageStats(), "tts": StageStats(), "write": StageStats()}
+        self.failed = []
+
+    async def run(self, prompts: list) -> dict:
+        """Generate every prompt not already in the manifest and return per-stage statistics"""
+        done = {record["id"] for record in read_jsonl(self.manifest_path)}
+        replies = {record["id"]: record["reply"] for record in read_jsonl(self.replies_path)}
+        todo = [prompt for prompt in prompts if prompt["id"] not in done]
+        logger.info(f"{len(prompts)} prompts: {len(done)} already done, {len(todo)} to generate")
+
+        queues = [asyncio.Queue(maxsize=2 * self.tts_concurrency) for _ in range(2)]
+        start = time.perf_counter()
+        producer = asyncio.ensure_future(self._stage(self._reply, todo, queues[0], self.llm_concurrency, replies))
+        synthesizer = asyncio.ensure_future(self._consume(queues[0], queues[1], self._speak, self.tts_concurrency))
+        writer = asyncio.ensure_future(self._consume(queues[1], None, self._write, 2))
+        try:
+            await asyncio.gather(producer, synthesizer, writer)
+        finally:
+            for task in (producer, synthesizer, writer):
+                task.cancel()
+        elapsed = time.perf_counter() - start
+
+        return {
+            "prompts": len(prompts),
+            "skipped": len(done),
+            "generated": self.stats["write"].items,
+            "failed": self.failed,
+            "elapsed_seconds": elapsed,
+            "stages": {name: stats.to_dict() for name, stats in self.stats.items()},
+        }
+
+    async def _stage(self, fn, items: list, outbox: asyncio.Queue, workers: int, *args):
+        """Process a list with several workers, then signal the end of the stream"""
+        pending = iter(items)
+
+        async def worker():
+            for item in pending:
+                result = await fn(item, *args)
+                if result is not None:
+                    await outbox.put(result)
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        await outbox.put(None)
+
+    async def _consume(self, inbox: asyncio.Queue, outbox: Optional[asyncio.Queue], fn, workers: int):
+        """Process a queue with several workers until the previous stage ends it"""
+
+        async def worker():
+            while (item := await inbox.get()) is not None:
+                result = await fn(item)
+                if outbox is not None and result is not None:
+                    await outbox.put(result)
+            await inbox.put(None)  # Let the other workers see the end too
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        if outbox is not None:
+            await outbox.put(None)
+
+    async def _reply(self, prompt: dict, replies: dict) -> Optional[dict]:
+        if prompt["id"] in replies:
+            return {**prompt, "reply": replies[prompt["id"]]}
+        if not prompt["text"]:
+            logger.warning(f"Skipping {prompt['id']}: the prompt is empty")
+            self.failed.append(prompt["id"])
+            return None
+        start = time.perf_counter()
+        try:
+            response = await self.watts.inference.run(
+                "llm",
+                self.watts.chat,
+                model=self.watts.ollama_model,
+                messages=self.watts.memory.messages({}, self.watts.alan_watts_personality, prompt["text"]),
+                keep_alive=self.watts.keep_alive,
+            )
+        except Exception as e:
+            logger.error(f"Error generating a reply for {prompt['id']}: {e}")
+            self.failed.append(prompt["id"])
+            return None
+        self.stats["llm"].record(start, time.perf_counter())
+        reply = response["message"]["content"]
+        append_jsonl(self.replies_path, {"id": prompt["id"], "reply": reply})
+        return {**prompt, "reply": reply}
+
+    async def _speak(self, item: dict) -> Optional[dict]:
+        if not self.audio:
+            return item
+        start = time.perf_counter()
+        try:
+            wav = await self.watts._synthesize(item["reply"], self.voice)
+        except Exception as e:
+            logger.error(f"Error synthesizing {item['id']}: {e}")
+            self.failed.append(item["id"])
+            return None
+        self.stats["tts"].record(start, time.perf_counter())
+        self.stats["tts"].audio_seconds += wav.shape[-1] / self.watts.model.sr
+        return {**item, "wav": wav}
+
+    async def _write(self, item: dict):
+        start = time.perf_counter()
+        text_file = f"{item['id']}.txt"
+        (self.output_dir / text_file).write_text(item["reply"], encoding="utf-8")
+        entry = {"id": item["id"], "prompt": item["text"], "reply": item["reply"], "text_file": text_file}
+        # Seed the bot's response cache when one is configured
+        if self.watts.response_cache is not None:
+            await asyncio.to_thread(
+                self.watts.response_cache.put_reply, self.watts._reply_cache_key(item["text"]), item["reply"]
+            )
+
+        if "wav" in item:
+            sr = self.watts.model.sr
+            data = await asyncio.to_thread(encode_voice, item["wav"], sr, self.watts.opus_bitrate)
+            audio_file = f"{item['id']}.{'ogg' if data[:4] == b'OggS' else 'wav'}"
+            (self.output_dir / audio_file).write_bytes(data)
+            duration = item["wav"].shape[-1] / sr
+            entry.update(audio_file=audio_file, duration=round(duration, 2))
+            if self.watts.response_cache is not None:
+                audio_key = self.watts._audio_cache_key(item["reply"], self.voice)
+                await asyncio.to_thread(self.watts.response_cache.put_audio, audio_key, data, int(duration))
+
+        # The manifest line is the checkpoint: a prompt counts as done once it is written
+        append_jsonl(self.manifest_path, entry)
+        self.stats["write"].record(start, time.perf_counter())
+
+
+def print_report(results: dict):
+    print(
+        f"\n{results['generated']} generated, {results['skipped']} already done, {len(results['failed'])} failed "
+        f"in {results['elapsed_seconds']:.1f}s"
+    )
+    print(f"{'stage':>6} {'items':>6} {'wall s':>8} {'busy s':>8} {'items/s':>8} {'audio s/s':>10}")
+    for name, stats in results["stages"].items():
+        audio_rate = stats["audio_seconds"] / stats["wall_seconds"] if stats["wall_seconds"] else 0.0
+        print(
+            f"{name:>6} {stats['items']:>6} {stats['wall_seconds']:>8.1f} {stats['busy_seconds']:>8.1f} "
+            f"{stats['items_per_second']:>8.2f} {audio_rate:>10.2f}"
+        )
+
+
+async def generate(watts: AlanWatts, args) -> dict:
+    prompts = read_prompts(args.prompts)[: args.limit]
+    voice = {
+        "audio_prompt_path": args.voice or watts.watts_voice,
+        "exaggeration": watts.default_exaggeration if args.exaggeration is None else args.exaggeration,
+        "cfg_weight": watts.default_cfg_weight if args.cfg_weight is None else args.cfg_weight,
+    }
+    generator = BatchGenerator(
+        watts,
+        args.output,
+        voice,
+        llm_concurrency=args.llm_concurrency,
+        tts_concurrency=args.tts_concurrency,
+        audio=not args.text_only,
+    )
+    try:
+        return await generator.run(prompts)
+    finally:
+        if watts.llm is not None:
+            await watts.llm.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("prompts", help="JSONL file of prompts")
+    parser.add_argument("--output", required=True, help="output directory (reused to resume)")
+    parser.add_argument("--voice", help="audio prompt to speak with (default: the Alan Watts voice)")
+    parser.add_argument("--exaggeration", type=float, help="TTS exaggeration (default: the bot's)")
+    parser.add_argument("--cfg-weight", type=float, help="TTS cfg weight (default: the bot's)")
+    parser.add_argument("--llm-concurrency", type=int, help="LLM requests in flight (default: INFERENCE_LLM_WORKERS)")
+    parser.add_argument("--tts-concurrency", type=int, default=DEFAULT_TTS_CONCURRENCY, help="syntheses in flight")
+    parser.add_argument("--text-only", action="store_true", help="generate replies without audio")
+    parser.add_argument("--limit", type=int, help="only the first N prompts")
+    args = parser.parse_args()
+
+    watts = AlanWatts(os.getenv("TELEGRAM_BOT_TOKEN", ""), audio_models=not args.text_only)
+    if not args.text_only:
+        logger.info("Waiting for the TTS model...")
+        if not watts.models.wait("tts"):
+            print("❌ Error: the TTS model could not be loaded; use --text-only to generate replies without audio")
+            watts.inference.shutdown()
+            return
+    try:
+        results = asyncio.run(generate(watts, args))
+    finally:
+        watts.inference.shutdown()
+        if watts.parallel_tts is not None:
+            watts.parallel_tts.shutdown()
+
+    print_report(results)
+    summary_path = Path(args.output) / "summary.json"
+    summary_path.write_text(json.dumps(results, indent=2))
+    print(f"\nManifest: {Path(args.output) / 'manifest.jsonl'}, summary: {summary_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import time
+from pathlib import Path
+
+from asr import BACKENDS, WhisperBackend, trim_silence, word_error_rate
+from audio_io import WHISPER_SAMPLE_RATE, decode_audio
+
+# CPU-only benchmark over 10 second slices of the bundled Alan Watts sample.
+# The reference transcript of each slice comes from Whisper "small" on the untrimmed audio.
+AUDIO_PATH = "config/voice/watts-1m.mp3"
+SLICE_SECONDS = 10
+MODEL_SIZE = "base"
+REFERENCE_SIZE = "small"
+
+audio = decode_audio(Path(AUDIO_PATH).read_bytes(), WHISPER_SAMPLE_RATE)
+step = SLICE_SECONDS * WHISPER_SAMPLE_RATE
+clips = [audio[i : i + step] for i in range(0, audio.numel() - step + 1, step)]
+total_seconds = sum(clip.numel() for clip in clips) / WHISPER_SAMPLE_RATE
+print(f"{len(clips)} clips, {total_seconds:.0f}s of audio")
+
+reference_backend = WhisperBackend(device="cpu", default_size=REFERENCE_SIZE)
+references = [reference_backend.transcribe(clip, REFERENCE_SIZE) for clip in clips]
+
+print(f"{'backend':>16} {'mode':>12} {'RTF':>6} {'WER':>6}")
+for name, backend_cls in BACKENDS.items():
+    try:
+        backend = backend_cls(device="cpu")
+        backend.get_model(MODEL_SIZE)  # Load before timing
+    except ImportError as e:
+        print(f"{name:>16} skipped: {e}")
+        continue
+
+    trimmed = [trim_silence(clip) for clip in clips]
+    for mode, transcribe in [
+        ("sequential", lambda: [backend.transcribe(clip, MODEL_SIZE) for clip in trimmed]),
+        ("batched", lambda: backend.transcribe_batch(trimmed, MODEL_SIZE)),
+    ]:
+        start = time.perf_counter()
+        hypotheses = transcribe()
+        rtf = (time.perf_counter() - start) / total_seconds
+        wer = sum(word_error_rate(r, h) for r, h in zip(references, hypotheses)) / len(clips)
+        print(f"{name:>16} {mode:>12} {rtf:>6.3f} {wer:>6.3f}")
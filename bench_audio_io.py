@@ -0,0 +1,48 @@
+import time
+from pathlib import Path
+
+import torch
+
+from audio_io import decode_audio, encode_opus, encode_wav
+
+# Upload size and encode time of voice notes: WAV (what the bot used to send) against OGG/Opus.
+# Replies are cut from the default voice prompt, resampled to Chatterbox's 24 kHz output rate.
+AUDIO_PROMPT_PATH = "config/voice/watts-1m.mp3"
+SAMPLE_RATE = 24000
+DURATIONS = (5, 15, 45)  # Seconds of speech per reply
+BITRATES = (16000, 32000, 64000)
+REPEATS = 5
+
+
+def timed(encode, *args) -> tuple:
+    """Best-of-REPEATS encode time in milliseconds and the encoded size in bytes"""
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        data = encode(*args)
+        best = min(best, time.perf_counter() - start)
+    return len(data), best * 1000
+
+
+def main():
+    speech = decode_audio(Path(AUDIO_PROMPT_PATH).read_bytes(), SAMPLE_RATE)
+    print(f"{'seconds':>8} {'format':>12} {'bytes':>10} {'encode ms':>10} {'vs WAV':>7}")
+    for seconds in DURATIONS:
+        wav = speech[: seconds * SAMPLE_RATE]
+        if wav.numel() < seconds * SAMPLE_RATE:
+            # Loop the prompt for replies longer than it
+            wav = wav.repeat(seconds * SAMPLE_RATE // wav.numel() + 1)[: seconds * SAMPLE_RATE]
+        wav = wav.reshape(1, -1).to(torch.float32)
+
+        wav_bytes, wav_ms = timed(encode_wav, wav, SAMPLE_RATE)
+        print(f"{seconds:>8} {'wav':>12} {wav_bytes:>10} {wav_ms:>10.1f} {1:>6.0%}")
+        for bitrate in BITRATES:
+            opus_bytes, opus_ms = timed(encode_opus, wav, SAMPLE_RATE, bitrate)
+            print(
+                f"{seconds:>8} {f'opus {bitrate // 1000}k':>12} {opus_bytes:>10} {opus_ms:>10.1f} "
+                f"{opus_bytes / wav_bytes:>6.1%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import argparse
+import multiprocessing
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import torch
+import torchaudio as ta
+
+from asr import word_error_rate
+from audio_io import WHISPER_SAMPLE_RATE, decode_audio
+from cpu_profile import CPUProfile
+
+# CPU-only comparison of fp32 and the CPU profile, extending test_tts.py and test_asr.py.
+# Every variant runs in a fresh process so its peak RSS is measured on its own, under
+# torch.inference_mode as in the bot.
+TEXT = "Well, I suppose you could say we've been having a few dozen conversations simultaneously, but it's been very challenging."
+AUDIO_PROMPT_PATH = "config/voice/watts-1m.mp3"
+ASR_MODEL_SIZE = "base"
+SLICE_SECONDS = 10
+SLICES = 6
+OUTPUT_DIR = Path("temp/bench_cpu_profile")
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # kilobytes on Linux
+
+
+@torch.inference_mode()
+def bench_tts(name: str, profile: CPUProfile) -> dict:
+    from chatterbox.tts import ChatterboxTTS
+
+    profile.apply_threads()
+    model = ChatterboxTTS.from_pretrained(device="cpu")
+    if name != "fp32":
+        model = profile.optimize_tts(model)
+    # Warm up (and compile) before timing
+    model.generate("Hello.", audio_prompt_path=AUDIO_PROMPT_PATH, exaggeration=0.7, cfg_weight=0.3)
+
+    start = time.perf_counter()
+    wav = model.generate(TEXT, audio_prompt_path=AUDIO_PROMPT_PATH, exaggeration=0.7, cfg_weight=0.3)
+    elapsed = time.perf_counter() - start
+    path = OUTPUT_DIR / f"tts_{name}.wav"
+    ta.save(str(path), wav, model.sr)
+    return {"rtf": elapsed / (wav.shape[-1] / model.sr), "peak_rss_mb": peak_rss_mb(), "path": str(path)}
+
+
+@torch.inference_mode()
+def bench_asr(name: str, profile: CPUProfile, paths: list) -> dict:
+    import whisper
+
+    profile.apply_threads()
+    model = whisper.load_model(ASR_MODEL_SIZE, device="cpu")
+    if name != "fp32":
+        model = profile.optimize_asr(model)
+
+    audio = decode_audio(Path(AUDIO_PROMPT_PATH).read_bytes(), WHISPER_SAMPLE_RATE)
+    step = SLICE_SECONDS * WHISPER_SAMPLE_RATE
+    clips = [audio[i : i + step] for i in range(0, step * SLICES, step)]
+    model.transcribe(clips[0])  # Warm up
+
+    start = time.perf_counter()
+    transcripts = [model.transcribe(clip)["text"].strip() for clip in clips]
+    elapsed = time.perf_counter() - start
+    # Transcribe the synthesized replies to check the TTS variants
+    heard = {path: model.transcribe(path)["text"].strip() for path in paths}
+    return {
+        "rtf": elapsed / (SLICE_SECONDS * len(clips)),
+        "peak_rss_mb": peak_rss_mb(),
+        "transcripts": transcripts,
+        "heard": heard,
+    }
+
+
+def in_fresh_process(fn, *args) -> dict:
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(fn, *args).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare fp32 and the CPU profile for TTS and ASR")
+    parser.add_argument("--threads", type=int, default=None, help="intra-op threads (default: PyTorch's choice)")
+    parser.add_argument("--compile", action="store_true", help="also benchmark int8 with torch.compile")
+    args = parser.parse_args()
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    variants = {
+        "fp32": CPUProfile(quantize=False, threads=args.threads),
+        "int8": CPUProfile(quantize=True, threads=args.threads),
+    }
+    if args.compile:
+        variants["int8+compile"] = CPUProfile(quantize=True, compile=True, threads=args.threads)
+
+    tts = {name: in_fresh_process(bench_tts, name, profile) for name, profile in variants.items()}
+    paths = [result["path"] for result in tts.values()]
+    asr = {name: in_fresh_process(bench_asr, name, profile, paths) for name, profile in variants.items()}
+
+    # Quality: WER of the fp32 ASR transcript of each synthesized reply, and of each ASR variant against fp32
+    reference = asr["fp32"]
+    print(f"{'model':>6} {'variant':>13} {'RTF':>6} {'peak RSS':>9} {'WER':>6}")
+    for name, result in tts.items():
+        wer = word_error_rate(TEXT, reference["heard"][result["path"]])
+        print(f"{'tts':>6} {name:>13} {result['rtf']:>6.2f} {result['peak_rss_mb']:>7.0f}MB {wer:>6.3f}")
+    for name, result in asr.items():
+        pairs = zip(reference["transcripts"], result["transcripts"])
+        wer = sum(word_error_rate(ref, hyp) for ref, hyp in pairs) / len(result["transcripts"])
+        print(f"{'asr':>6} {name:>13} {result['rtf']:>6.3f} {result['peak_rss_mb']:>7.0f}MB {wer:>6.3f}")
+    print("TTS WER: the fp32 Whisper transcript of the reply against its text; ASR WER: against fp32 transcripts")
+    print(f"Synthesized replies saved in {OUTPUT_DIR}/ for listening")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import asyncio
+import random
+import statistics
+
+from conversation import ConversationMemory
+from inference import InferencePool
+from stubs import StubChat, StubTTS, StubWhisper, fake_context, fake_update
+from telegram_bot import SUMMARY_PROMPT, AlanWatts
+
+# Prompt evaluation at 0.2 ms per word; the stub keeps the previous request cached like Ollama does,
+# so only the part of the prompt after the longest shared prefix is evaluated again.
+# A single user resending the full history gets almost everything from the cache, but the context grows
+# without bound; with several users sharing the model the cache is lost between their turns.
+PROMPT_TOKEN_DELAY = 0.0002
+TURNS = 20
+REPORT_TURNS = [1, 4, 8, 12, 16, 20]
+WORDS = "life wave river mind self music dance nature moment time game reality zen water cloud".split()
+REPLY = "Well, you see, {text} is like asking what a wave means. " * 3
+
+
+async def run(naive: bool, users: int) -> dict:
+    chat = StubChat(delay=0.0, reply=REPLY, prompt_token_delay=PROMPT_TOKEN_DELAY)
+    watts = AlanWatts(
+        "bench-token",
+        model=StubTTS(delay=0.0, prepare_delay=0.0, seconds_per_char=0.001),  # Audio is not measured here
+        whisper_model=StubWhisper(),
+        chat_fn=chat,
+        inference=InferencePool(),
+    )
+    if naive:
+        # Resend the whole history every turn
+        watts.memory = ConversationMemory(watts._summarize, budget_tokens=10**9)
+
+    # Only count replies to users, not background summaries
+    per_turn = {turn: [] for turn in range(1, TURNS + 1)}
+    chat_fn = watts.chat
+
+    def counting_chat(messages, **kwargs):
+        response = chat_fn(messages=messages, **kwargs)
+        if not messages[-1]["content"].startswith(SUMMARY_PROMPT):
+            per_turn[current_turn].append(chat.prompt_evals[-1])
+        return response
+
+    watts.chat = counting_chat
+    rng = random.Random(0)
+    user_data = {user: {} for user in range(users)}
+
+    # Users take turns, so with several users the cached prompt belongs to someone else
+    for current_turn in range(1, TURNS + 1):
+        for user in range(users):
+            text = " ".join(rng.choice(WORDS) for _ in range(40)) + "?"
+            await watts.handle_text(fake_update(user_id=user, text=text), fake_context(user_data[user]))
+        await watts.memory.drain()
+
+    watts.inference.shutdown()
+    return {
+        turn: (
+            statistics.fmean(context for context, _, _ in evals),
+            statistics.fmean(evaluated for _, evaluated, _ in evals),
+            statistics.fmean(seconds for _, _, seconds in evals),
+        )
+        for turn, evals in per_turn.items()
+    }
+
+
+async def main():
+    for users in [1, 4]:
+        naive = await run(naive=True, users=users)
+        memory = await run(naive=False, users=users)
+        print(f"\n{users} user(s), words in context / words evaluated / prompt eval seconds per turn")
+        print(f"{'turn':>5} {'naive context':>14} {'eval':>6} {'s':>6} {'memory context':>15} {'eval':>6} {'s':>6}")
+        for turn in REPORT_TURNS:
+            n, m = naive[turn], memory[turn]
+            print(f"{turn:>5} {n[0]:>14.0f} {n[1]:>6.0f} {n[2]:>6.3f} {m[0]:>15.0f} {m[1]:>6.0f} {m[2]:>6.3f}")
+        total_naive = sum(seconds for _, _, seconds in naive.values())
+        total_memory = sum(seconds for _, _, seconds in memory.values())
+        print(f"Total prompt eval per user over {TURNS} turns: naive {total_naive:.2f}s, memory {total_memory:.2f}s")
+
+
+asyncio.run(main())
@@ -0,0 +1,50 @@
+import asyncio
+import functools
+import time
+
+from parallel_tts import ParallelTTS, split_text
+from stubs import StubTTS
+
+# Stub CPU model: 100 ms per call plus 4 ms per character, with the speaking rate of real speech
+load_stub = functools.partial(StubTTS, delay=0.1, char_delay=0.004, seconds_per_char=0.06, prepare_delay=0.0)
+SAMPLE_RATE = 24000
+CHUNK_CHARS = 200
+SENTENCE = "The only way to make sense out of change is to plunge into it, move with it, and join the dance. "
+LENGTHS = (200, 400, 800, 1600, 3200)
+WORKERS = (1, 2, 4, 8)
+
+
+async def run(engine: ParallelTTS, text: str) -> float:
+    start = time.perf_counter()
+    wav = await engine.generate(text, audio_prompt_path=None, exaggeration=0.7, cfg_weight=0.3)
+    elapsed = time.perf_counter() - start
+
+    # Chunks overlap by one crossfade each, so the reply is only slightly shorter than its parts
+    chunks = split_text(text, CHUNK_CHARS)
+    parts = sum(int(len(chunk) * 0.06 * SAMPLE_RATE) for chunk in chunks)
+    assert parts - len(chunks) * SAMPLE_RATE * 0.03 <= wav.shape[-1] <= parts
+    return elapsed
+
+
+async def main():
+    texts = {length: (SENTENCE * (length // len(SENTENCE) + 1))[:length].strip() for length in LENGTHS}
+    for text in texts.values():
+        assert all(len(chunk) <= CHUNK_CHARS for chunk in split_text(text, CHUNK_CHARS))
+
+    results = {}
+    for workers in WORKERS:
+        engine = ParallelTTS(load_stub, SAMPLE_RATE, workers=workers, chunk_chars=CHUNK_CHARS, min_chars=0)
+        engine.start()  # Exclude process start-up and model loading from the timings
+        for length, text in texts.items():
+            results[length, workers] = await run(engine, text)
+        engine.shutdown()
+
+    print(f"{'chars':>6} {'chunks':>7} " + " ".join(f"{f'{w} worker(s)':>12}" for w in WORKERS) + f" {'speedup':>8}")
+    for length, text in texts.items():
+        times = [results[length, workers] for workers in WORKERS]
+        row = " ".join(f"{seconds:>11.2f}s" for seconds in times)
+        print(f"{length:>6} {len(split_text(text, CHUNK_CHARS)):>7} {row} {times[0] / times[-1]:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
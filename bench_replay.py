@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""Replay synthetic or recorded Telegram traffic through AlanWatts handlers with fake models
+
+Examples:
+    python bench_replay.py --requests 200 --concurrency 16 --voice-ratio 0.3
+    python bench_replay.py --trace requests.jsonl --tts-latency lognormal:1.0,0.4 --output results.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import subprocess
+import time
+from pathlib import Path
+
+import torch
+
+from audio_io import WHISPER_SAMPLE_RATE, encode_wav
+from inference import InferencePool
+from stubs import FakeVoice, StubChat, StubTTS, StubWhisper, fake_context, fake_update
+from telegram_bot import AlanWatts
+from transcript_cache import TranscriptCache
+
+WORDS = "life wave river mind self music dance nature moment time game reality zen water cloud".split()
+COMMANDS = ["help_command", "start_command", "exaggeration_command", "cfg_weight_command"]
+
+
+def parse_latency(spec: str):
+    """Parse a latency distribution: fixed:S, uniform:LO,HI, normal:MEAN,STD or lognormal:MEDIAN,SIGMA"""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",")] if params else []
+    if kind == "fixed":
+        return values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(*values)
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(*values))
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda: random.lognormvariate(0.0, sigma) * median
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def pct(p):
+        return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+    return {"p50": pct(50), "p95": pct(95), "p99": pct(99), "mean": statistics.fmean(values), "count": len(values)}
+
+
+def synthetic_workload(args) -> list:
+    """Build a list of requests with random text lengths, voice notes and commands"""
+    rng = random.Random(args.seed)
+    workload = []
+    for _ in range(args.requests):
+        user_id = rng.randrange(args.users)
+        roll = rng.random()
+        if roll < args.command_ratio:
+            workload.append({"kind": "command", "command": rng.choice(COMMANDS), "user_id": user_id})
+        elif roll < args.command_ratio + args.voice_ratio:
+            workload.append({"kind": "voice", "seconds": rng.uniform(2, 15), "user_id": user_id})
+        else:
+            length = rng.randint(args.min_words, args.max_words)
+            text = " ".join(rng.choice(WORDS) for _ in range(length)).capitalize() + "?"
+            workload.append({"kind": "text", "text": text, "user_id": user_id})
+    return workload
+
+
+def trace_workload(path: str, users: int) -> list:
+    """Load requests from a JSONL trace (fields: text/body/title, optional voice, user_id, at)"""
+    workload = []
+    with open(path, encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = record.get("text") or record.get("body") or record.get("title", "")
+            request = {
+                "kind": "voice" if record.get("voice") else "text",
+                "text": text[:1000],
+                "seconds": record.get("seconds", 5.0),
+                "user_id": record.get("user_id", i % users),
+            }
+            if "at" in record:
+                request["at"] = float(record["at"])
+            workload.append(request)
+    return workload
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+async def replay(args) -> dict:
+    tts = StubTTS(delay=parse_latency(args.tts_latency), char_delay=args.tts_char_delay, prepare_delay=0.0)
+    asr = StubWhisper(delay=parse_latency(args.asr_latency))
+    llm = StubChat(delay=parse_latency(args.llm_latency))
+    watts = AlanWatts(
+        "bench-token",
+        model=tts,
+        whisper_model=asr,
+        chat_fn=llm,
+        inference=InferencePool(max_queue=args.requests),
+    )
+    watts.stream_replies = args.stream
+    # Replayed voice notes reuse a few clips but stand for distinct recordings, so nothing is cached
+    watts.transcripts = TranscriptCache(max_entries=0)
+
+    workload = trace_workload(args.trace, args.users) if args.trace else synthetic_workload(args)
+    user_data = {}
+    voice_clips = {}
+    latencies = {"text": [], "voice": [], "command": []}
+    errors = 0
+
+    def voice_note(seconds: float) -> FakeVoice:
+        # Low-level noise so silence trimming keeps the clip
+        key = round(seconds)
+        if key not in voice_clips:
+            voice_clips[key] = encode_wav(torch.randn(key * WHISPER_SAMPLE_RATE) * 0.1, WHISPER_SAMPLE_RATE)
+        return FakeVoice(voice_clips[key], duration=key)
+
+    async def handle(request: dict):
+        nonlocal errors
+        context = fake_context(user_data.setdefault(request["user_id"], {}))
+        if request["kind"] == "voice":
+            update = fake_update(request["user_id"], voice=voice_note(request["seconds"]))
+            handler = watts.handle_audio
+        elif request["kind"] == "command":
+            update = fake_update(request["user_id"], text=f"/{request['command']}")
+            handler = getattr(watts, request["command"])
+        else:
+            update = fake_update(request["user_id"], text=request["text"])
+            handler = watts.handle_text
+
+        start = time.perf_counter()
+        await handler(update, context)
+        latencies[request["kind"]].append(time.perf_counter() - start)
+        if any(kind == "text" and text.startswith("❌") for kind, text, _ in update.message.sent):
+            errors += 1
+
+    queue = asyncio.Queue()
+    for request in workload:
+        queue.put_nowait(request)
+    start = time.perf_counter()
+
+    async def worker():
+        while not queue.empty():
+            request = queue.get_nowait()
+            if "at" in request:
+                # Trace requests arrive at their recorded offsets
+                await asyncio.sleep(max(0.0, request["at"] - (time.perf_counter() - start)))
+            await handle(request)
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    watts.inference.shutdown()
+
+    end_to_end = [latency for values in latencies.values() for latency in values]
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "requests": len(workload),
+        "errors": errors,
+        "elapsed_seconds": elapsed,
+        "throughput_rps": len(workload) / elapsed,
+        "end_to_end": percentiles(end_to_end),
+        "by_kind": {kind: percentiles(values) for kind, values in latencies.items() if values},
+        "stages": {
+            "asr": percentiles(asr.durations),
+            "llm": percentiles(llm.durations),
+            "tts": percentiles(tts.durations),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100, help="number of synthetic requests")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight at once")
+    parser.add_argument("--users", type=int, default=20, help="distinct users sending requests")
+    parser.add_argument("--voice-ratio", type=float, default=0.2, help="share of voice notes")
+    parser.add_argument("--command-ratio", type=float, default=0.1, help="share of commands")
+    parser.add_argument("--min-words", type=int, default=3)
+    parser.add_argument("--max-words", type=int, default=40)
+    parser.add_argument("--asr-latency", default="uniform:0.1,0.3", help="fake ASR latency distribution")
+    parser.add_argument("--llm-latency", default="lognormal:0.5,0.3", help="fake LLM latency distribution")
+    parser.add_argument("--tts-latency", default="lognormal:0.8,0.3", help="fake TTS latency distribution")
+    parser.add_argument("--tts-char-delay", type=float, default=0.002, help="extra TTS seconds per character")
+    parser.add_argument("--stream", action="store_true", help="stream replies sentence by sentence")
+    parser.add_argument("--trace", help="JSONL workload trace (e.g. requests.jsonl)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    results = asyncio.run(replay(args))
+
+    print(
+        f"\n{results['requests']} requests in {results['elapsed_seconds']:.1f}s "
+        f"({results['throughput_rps']:.2f} req/s, {results['errors']} errors)"
+    )
+    print(f"{'':>12} {'p50':>8} {'p95':>8} {'p99':>8} {'count':>6}")
+    rows = [("end-to-end", results["end_to_end"])] + list(results["by_kind"].items())
+    rows += [(f"stage {name}", stats) for name, stats in results["stages"].items()]
+    for name, stats in rows:
+        if stats:
+            print(f"{name:>12} {stats['p50']:>8.3f} {stats['p95']:>8.3f} {stats['p99']:>8.3f} {stats['count']:>6}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+from inference import InferencePool
+from stubs import StubChat, StubTTS, StubWhisper, fake_context, fake_update
+from telegram_bot import AlanWatts
+
+# A six-sentence reply generated at 20 words per second and synthesized at 15 ms per character
+REPLY = (
+    "Well, you see, the question of {text} is rather like asking what the river is for. "
+    "The river does not go anywhere in particular, it simply flows, and in flowing it is complete. "
+    "We are always looking for the point of it all, as if life were a journey with a destination. "
+    "But music is not like that, you do not play a symphony in order to reach the final chord. "
+    "The point is the dancing, the playing, the singing while the music is going on. "
+    "So perhaps the meaning you are looking for is right here, hiding in plain sight."
+)
+
+
+def first_time(message, kind: str) -> float:
+    """Time of the first reply of a given kind, skipping progress notices"""
+    return next(t for k, text, t in message.sent if k == kind and not (kind == "text" and text.startswith("_")))
+
+
+async def run(stream: bool, audio_mode: str = "segments") -> tuple:
+    watts = AlanWatts(
+        "bench-token",
+        model=StubTTS(delay=0.1, char_delay=0.015),
+        whisper_model=StubWhisper(),
+        chat_fn=StubChat(delay=0.3, reply=REPLY, token_delay=0.05),
+        inference=InferencePool(),
+    )
+    watts.stream_replies = stream
+    watts.stream_audio_mode = audio_mode
+
+    update = fake_update(text="the meaning of life")
+    start = time.perf_counter()
+    await watts.handle_text(update, fake_context())
+    total = time.perf_counter() - start
+    watts.inference.shutdown()
+
+    return first_time(update.message, "text") - start, first_time(update.message, "voice") - start, total
+
+
+async def main():
+    print(f"{'mode':>20} {'first text (s)':>15} {'first audio (s)':>16} {'total (s)':>10}")
+    for name, stream, audio_mode in [
+        ("blocking", False, "segments"),
+        ("streaming/segments", True, "segments"),
+        ("streaming/stitched", True, "stitched"),
+    ]:
+        first_text, first_audio, total = await run(stream, audio_mode)
+        print(f"{name:>20} {first_text:>15.2f} {first_audio:>16.2f} {total:>10.2f}")
+
+
+asyncio.run(main())
@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+from inference import InferencePool
+from stubs import StubTTS
+from tts_batching import TTSBatcher
+
+# Deterministic fake model: 200 ms per forward pass plus 10 ms for every extra sequence in a batch
+FORWARD_DELAY = 0.2
+BATCH_ITEM_DELAY = 0.01
+REQUESTS_PER_USER = 3
+TEXT = "The only way to make sense out of change is to plunge into it, move with it, and join the dance."
+
+
+async def user(batcher: TTSBatcher):
+    for _ in range(REQUESTS_PER_USER):
+        await batcher.generate(TEXT, audio_prompt_path="watts.mp3", exaggeration=0.7, cfg_weight=0.3)
+
+
+async def run(users: int, max_batch: int) -> float:
+    model = StubTTS(delay=FORWARD_DELAY, batch_item_delay=BATCH_ITEM_DELAY, prepare_delay=0.0)
+    inference = InferencePool(workers={"tts": 1}, max_queue=1000)
+    batcher = TTSBatcher(model, inference, window_ms=20, max_batch=max_batch)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(batcher) for _ in range(users)))
+    elapsed = time.perf_counter() - start
+
+    inference.shutdown()
+    return users * REQUESTS_PER_USER / elapsed
+
+
+async def main():
+    print(f"{'users':>6} {'unbatched req/s':>16} {'batched req/s':>14} {'speedup':>8}")
+    for users in (1, 8, 32):
+        unbatched = await run(users, max_batch=1)
+        batched = await run(users, max_batch=32)
+        print(f"{users:>6} {unbatched:>16.2f} {batched:>14.2f} {batched / unbatched:>7.1f}x")
+
+
+asyncio.run(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Per-user conversation memory kept under a token budget with background summaries"""
+
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# Tokens of summary and past turns sent with each request
+DEFAULT_TOKEN_BUDGET = 3000
+# Most recent messages that are always sent verbatim and never summarized
+DEFAULT_KEEP_RECENT = 4
+# Longest summary the LLM is asked to write
+DEFAULT_SUMMARY_TOKENS = 200
+# Older turns are summarized once the history reaches this share of the budget
+COMPACT_AT = 0.75
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for Llama-style tokenizers (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+class ConversationMemory:
+    """Keeps each user's recent turns and a running summary of older ones
+
+    State lives in the user's ``context.user_data`` under ``"conversation"``. Every request
+    starts with the same personality system message so the LLM server can reuse its cached
+    prompt state, followed by the summary and the recent turns. History is only rewritten
+    when older turns are folded into the summary, which runs in the background on the LLM
+    stage via ``summarize(previous_summary, transcript, max_tokens)``.
+    """
+
+    def __init__(
+        self,
+        summarize: Callable[[str, str, int], Awaitable[str]],
+        budget_tokens: int = DEFAULT_TOKEN_BUDGET,
+        keep_recent: int = DEFAULT_KEEP_RECENT,
+        summary_tokens: int = DEFAULT_SUMMARY_TOKENS,
+    ):
+        self.summarize = summarize
+        self.budget_tokens = budget_tokens
+        self.keep_recent = keep_recent
+        self.summary_tokens = summary_tokens
+        self.compactions = 0
+        self._tasks = set()
+        # Users with a summary being written; kept here, not in user_data, so persisted snapshots never carry it
+        self._compacting = set()
+
+    @classmethod
+    def from_env(cls, summarize: Callable[[str, str, int], Awaitable[str]]) -> "ConversationMemory":
+        """Create memory configured by MEMORY_TOKEN_BUDGET, MEMORY_KEEP_RECENT and MEMORY_SUMMARY_TOKENS"""
+        return cls(
+            summarize,
+            budget_tokens=int(os.getenv("MEMORY_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET)),
+            keep_recent=int(os.getenv("MEMORY_KEEP_RECENT", DEFAULT_KEEP_RECENT)),
+            summary_tokens=int(os.getenv("MEMORY_SUMMARY_TOKENS", DEFAULT_SUMMARY_TOKENS)),
+        )
+
+    @staticmethod
+    def _state(user_data: dict) -> dict:
+        return user_data.setdefault("conversation", {"summary": "", "turns": []})
+
+    def is_empty(self, user_data: dict) -> bool:
+        state = self._state(user_data)
+        return not state["summary"] and not state["turns"]
+
+    def history_tokens(self, user_data: dict) -> int:
+        state = self._state(user_data)
+        return estimate_tokens(state["summary"]) + sum(estimate_tokens(turn["content"]) for turn in state["turns"])
+
+    def messages(self, user_data: dict, personality: str, user_text: str) -> list:
+        """Build the chat messages: stable personality prefix, summary, recent turns, then the new message"""
+        state = self._state(user_data)
+        messages = [{"role": "system", "content": personality}]
+        if state["summary"]:
+            messages.append({"role": "system", "content": f"Earlier in this conversation: {state['summary']}"})
+
+        # Drop the oldest turns if a summary is still being written and the history is over budget
+        turns = list(state["turns"])
+        budget = self.budget_tokens - estimate_tokens(state["summary"]) - estimate_tokens(user_text)
+        while turns and sum(estimate_tokens(turn["content"]) for turn in turns) > budget:
+            turns.pop(0)
+
+        return messages + turns + [{"role": "user", "content": user_text}]
+
+    def record(self, user_id: int, user_data: dict, user_text: str, reply: str):
+        """Remember a completed exchange and summarize older turns if the history is getting long"""
+        state = self._state(user_data)
+        state["turns"] += [{"role": "user", "content": user_text}, {"role": "assistant", "content": reply}]
+        if (
+            user_id not in self._compacting
+            and len(state["turns"]) > self.keep_recent
+            and self.history_tokens(user_data) >= self.budget_tokens * COMPACT_AT
+        ):
+            self._compacting.add(user_id)
+            task = asyncio.ensure_future(self._compact(user_id, state))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def forget(self, user_data: dict):
+        user_data.pop("conversation", None)
+
+    async def _compact(self, user_id: int, state: dict):
+        """Fold every turn but the most recent ones into the summary"""
+        old = state["turns"][: -self.keep_recent]
+        transcript = "\n".join(
+            f"{'User' if turn['role'] == 'user' else 'Alan Watts'}: {turn['content']}" for turn in old
+        )
+        try:
+            summary = await self.summarize(state["summary"], transcript, self.summary_tokens)
+            # Turns recorded while summarizing stay in the history
+            state["summary"] = summary.strip()[: self.summary_tokens * 4]
+            state["turns"] = state["turns"][len(old) :]
+            self.compactions += 1
+            logger.info(f"Summarized {len(old)} messages into {estimate_tokens(state['summary'])} tokens")
+        except Exception as e:
+            logger.warning(f"Could not summarize conversation: {e}")
+        finally:
+            self._compacting.discard(user_id)
+
+    async def drain(self):
+        """Wait for summaries still being written"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
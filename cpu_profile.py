@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""CPU inference profile: int8 dynamic quantization, torch.compile and thread settings for CPU-only hosts"""
+
+import logging
+import os
+from typing import Optional
+
+import torch
+from torch import nn
+
+logger = logging.getLogger(__name__)
+
+# Chatterbox: the speech-token language model is mostly linear layers and tolerates int8 well;
+# the flow-matching decoder and vocoder stay in fp32 because they shape the waveform directly
+DEFAULT_TTS_QUANTIZE = "t3"
+DEFAULT_ASR_QUANTIZE = "encoder,decoder"
+# Compiled with dynamic shapes, since text and audio lengths vary per request
+DEFAULT_TTS_COMPILE = "t3.tfmr"
+DEFAULT_ASR_COMPILE = "encoder"
+DEFAULT_COMPILE_CACHE_DIR = "temp/inductor-cache"
+
+
+def configure_threads(intra: Optional[int] = None, inter: Optional[int] = None):
+    """Set this process's intra-op and inter-op thread counts; None keeps PyTorch's default"""
+    if intra:
+        torch.set_num_threads(intra)
+    if inter:
+        try:
+            torch.set_num_interop_threads(inter)
+        except RuntimeError as e:
+            # Only allowed before the first inter-op parallel work in the process
+            logger.warning(f"Could not set inter-op threads: {e}")
+    logger.info(f"PyTorch threads: intra-op {torch.get_num_threads()}, inter-op {torch.get_num_interop_threads()}")
+
+
+def _paths(value: str) -> list:
+    return [path.strip() for path in value.split(",") if path.strip()]
+
+
+def _submodule(model, path: str):
+    for name in path.split("."):
+        model = getattr(model, name)
+    return model
+
+
+def _set_submodule(model, path: str, module):
+    parent, _, name = path.rpartition(".")
+    setattr(_submodule(model, parent) if parent else model, name, module)
+
+
+def _plain_linears(module: nn.Module):
+    """Turn Linear subclasses without extra state (e.g. Whisper's dtype-casting Linear) into nn.Linear
+
+    Dynamic quantization only swaps exact nn.Linear modules. Whisper's subclass only casts the
+    weights to the input dtype, which does nothing for fp32 inputs on the CPU.
+    """
+    for child in module.modules():
+        if isinstance(child, nn.Linear) and type(child) is not nn.Linear and not vars(type(child)).get("__init__"):
+            child.__class__ = nn.Linear
+
+
+class CPUProfile:
+    """Optimizations applied to the TTS and ASR models when they run on the CPU
+
+    Submodules are named by attribute path (e.g. ``t3.tfmr``). Quantized submodules get int8
+    weights for their linear layers with activations quantized on the fly; compiled ones are
+    wrapped in ``torch.compile`` and compiled during the startup warmup, with the compiled
+    kernels cached on disk so restarts reuse them.
+    """
+
+    def __init__(
+        self,
+        quantize: bool = True,
+        compile: bool = False,
+        threads: Optional[int] = None,
+        interop_threads: Optional[int] = None,
+        tts_quantize: str = DEFAULT_TTS_QUANTIZE,
+        asr_quantize: str = DEFAULT_ASR_QUANTIZE,
+        tts_compile: str = DEFAULT_TTS_COMPILE,
+        asr_compile: str = DEFAULT_ASR_COMPILE,
+        compile_cache_dir: Optional[str] = DEFAULT_COMPILE_CACHE_DIR,
+    ):
+        self.quantize = quantize
+        self.compile = compile
+        self.threads = threads
+        self.interop_threads = interop_threads
+        self.tts_quantize = _paths(tts_quantize)
+        self.asr_quantize = _paths(asr_quantize)
+        self.tts_compile = _paths(tts_compile)
+        self.asr_compile = _paths(asr_compile)
+        self.compile_cache_dir = compile_cache_dir
+
+    @classmethod
+    def from_env(cls) -> "CPUProfile":
+        """Create a profile configured by CPU_* environment variables"""
+        return cls(
+            quantize=os.getenv("CPU_QUANTIZE", "1") == "1",
+            compile=os.getenv("CPU_COMPILE", "0") == "1",
+            threads=int(os.getenv("CPU_THREADS", 0)) or None,
+            interop_threads=int(os.getenv("CPU_INTEROP_THREADS", 0)) or None,
+            tts_quantize=os.getenv("CPU_TTS_QUANTIZE", DEFAULT_TTS_QUANTIZE),
+            asr_quantize=os.getenv("CPU_ASR_QUANTIZE", DEFAULT_ASR_QUANTIZE),
+            tts_compile=os.getenv("CPU_TTS_COMPILE", DEFAULT_TTS_COMPILE),
+            asr_compile=os.getenv("CPU_ASR_COMPILE", DEFAULT_ASR_COMPILE),
+            compile_cache_dir=os.getenv("CPU_COMPILE_CACHE_DIR", DEFAULT_COMPILE_CACHE_DIR),
+        )
+
+    def apply_threads(self):
+        """Apply the configured thread counts to this process"""
+        if self.threads or self.interop_threads:
+            configure_threads(self.threads, self.interop_threads)
+
+    def optimize_tts(self, model):
+        """Optimize a ChatterboxTTS model loaded on the CPU"""
+        return self._optimize(model, self.tts_quantize, self.tts_compile)
+
+    def optimize_asr(self, model):
+        """Optimize an openai-whisper model loaded on the CPU"""
+        return self._optimize(model, self.asr_quantize, self.asr_compile)
+
+    def _optimize(self, model, quantize: list, compile: list):
+        if self.quantize:
+            from torch.ao.quantization import quantize_dynamic
+
+            for path in quantize:
+                try:
+                    module = _submodule(model, path)
+                    _plain_linears(module)
+                    quantize_dynamic(module, {nn.Linear}, dtype=torch.qint8, inplace=True)
+                    logger.info(f"Quantized linear layers of {type(model).__name__}.{path} to int8")
+                except Exception as e:
+                    logger.warning(f"Could not quantize {path}: {e}")
+
+        if self.compile:
+            self._enable_compile_cache()
+            for path in compile:
+                try:
+                    _set_submodule(model, path, torch.compile(_submodule(model, path), dynamic=True))
+                    logger.info(f"Compiling {type(model).__name__}.{path} on first use")
+                except Exception as e:
+                    logger.warning(f"Could not compile {path}: {e}")
+        return model
+
+    def _enable_compile_cache(self):
+        if not self.compile_cache_dir:
+            return
+        os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.abspath(self.compile_cache_dir))
+        try:
+            import torch._inductor.config as inductor_config
+
+            inductor_config.fx_graph_cache = True
+        except ImportError:
+            pass
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+import asyncio
+import functools
+import inspect
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Default number of concurrent jobs per inference stage
+DEFAULT_STAGE_WORKERS = {"asr": 1, "llm": 2, "tts": 1}
+# Default number of jobs allowed to wait per stage before new requests are rejected
+DEFAULT_MAX_QUEUE = 16
+# Weight of the newest job in a stage's running average of service time
+SERVICE_SMOOTHING = 0.2
+
+
+class QueueFullError(Exception):
+    """Raised when an inference stage cannot accept more work"""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Inference queue for stage '{stage}' is full")
+        self.stage = stage
+
+
+class InferenceStage:
+    """A dedicated worker pool with a bounded waiting queue for one inference stage"""
+
+    def __init__(self, name: str, workers: int, max_queue: int):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-worker")
+        self._slots = asyncio.Semaphore(workers)
+        self.waiting = 0
+        self.running = 0
+        self.service_seconds = None  # Running average of how long a job runs once it has a slot
+
+    @property
+    def depth(self) -> int:
+        """Number of jobs waiting or running in this stage"""
+        return self.waiting + self.running
+
+    async def run(
+        self,
+        fn: Callable,
+        *args,
+        on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+        **kwargs,
+    ):
+        """Run a blocking function in this stage's executor, or await a coroutine function, and return its result"""
+        if self.waiting >= self.max_queue:
+            raise QueueFullError(self.name)
+
+        self.waiting += 1
+        try:
+            if self._slots.locked() and on_queued is not None:
+                # Tell the caller its position in line before waiting for a slot
+                await on_queued(self.waiting)
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        start = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(fn):
+                # Async clients (e.g. remote LLM hosts) only need the concurrency limit
+                return await fn(*args, **kwargs)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            elapsed = time.perf_counter() - start
+            if self.service_seconds is None:
+                self.service_seconds = elapsed
+            else:
+                self.service_seconds += SERVICE_SMOOTHING * (elapsed - self.service_seconds)
+            self.running -= 1
+            self._slots.release()
+
+    def shutdown(self):
+        """Stop the executor, waiting for running jobs to finish"""
+        self.executor.shutdown(wait=True)
+
+
+class InferencePool:
+    """Runs ASR, LLM and TTS inference off the event loop with per-stage concurrency"""
+
+    def __init__(self, workers: Optional[dict] = None, max_queue: Optional[int] = None):
+        workers = {**DEFAULT_STAGE_WORKERS, **(workers or {})}
+        max_queue = DEFAULT_MAX_QUEUE if max_queue is None else max_queue
+        self.stages = {name: InferenceStage(name, count, max_queue) for name, count in workers.items()}
+        logger.info(
+            "Inference pool ready: "
+            + ", ".join(f"{name}={stage.workers} workers" for name, stage in self.stages.items())
+            + f", max queue {max_queue}"
+        )
+
+    @classmethod
+    def from_env(cls) -> "InferencePool":
+        """Create a pool configured by INFERENCE_<STAGE>_WORKERS and INFERENCE_MAX_QUEUE"""
+        workers = {
+            name: int(os.getenv(f"INFERENCE_{name.upper()}_WORKERS", default))
+            for name, default in DEFAULT_STAGE_WORKERS.items()
+        }
+        max_queue = int(os.getenv("INFERENCE_MAX_QUEUE", DEFAULT_MAX_QUEUE))
+        return cls(workers=workers, max_queue=max_queue)
+
+    async def run(
+        self,
+        stage: str,
+        fn: Callable,
+        *args,
+        on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+        **kwargs,
+    ):
+        """Run a blocking function on the given stage (asr, llm or tts)"""
+        return await self.stages[stage].run(fn, *args, on_queued=on_queued, **kwargs)
+
+    def depth(self, stage: str) -> int:
+        """Number of jobs waiting or running in the given stage"""
+        return self.stages[stage].depth
+
+    def shutdown(self):
+        """Stop all stage executors"""
+        for stage in self.stages.values():
+            stage.shutdown()
+
+
+class MicroBatcher:
+    """Collects items submitted within a short window and runs each group as one job on a stage
+
+    Items are grouped by key. ``run_batch(key, items)`` is called in the stage's worker thread
+    and must return one result per item, in order.
+    """
+
+    def __init__(
+        self,
+        inference: InferencePool,
+        stage: str,
+        run_batch: Callable[[object, list], list],
+        window_ms: float,
+        max_batch: int,
+    ):
+        self.inference = inference
+        self.stage = stage
+        self.run_batch = run_batch
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending = {}  # key -> (items, futures, notifiers, timer)
+        self._tasks = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, key, item, on_queued: Optional[Callable[[int], Awaitable[None]]] = None):
+        """Add an item to the batch for its key and wait for its result"""
+        loop = asyncio.get_running_loop()
+        if key not in self._pending:
+            self._pending[key] = ([], [], [], None)
+        items, futures, notifiers, timer = self._pending[key]
+
+        future = loop.create_future()
+        items.append(item)
+        futures.append(future)
+        if on_queued is not None:
+            notifiers.append(on_queued)
+        self.items += 1
+
+        if len(items) >= self.max_batch:
+            self._flush(key)
+        elif timer is None:
+            self._pending[key] = (items, futures, notifiers, loop.call_later(self.window, self._flush, key))
+
+        return await future
+
+    def _flush(self, key):
+        """Detach the pending batch for a key and start running it"""
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        if pending[3] is not None:
+            pending[3].cancel()
+        task = asyncio.ensure_future(self._run(key, *pending[:3]))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key, items: list, futures: list, notifiers: list):
+        async def notify_all(position: int):
+            for notify in notifiers:
+                await notify(position)
+
+        self.batches += 1
+        logger.debug(f"Running {self.stage} batch of {len(items)} item(s)")
+        try:
+            results = await self.inference.run(
+                self.stage, self.run_batch, key, items, on_queued=notify_all if notifiers else None
+            )
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, result in zip(futures, results):
+            if not future.done():
+                future.set_result(result)
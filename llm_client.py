@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""Async Ollama client that balances chat requests across several hosts"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+import httpx
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "http://localhost:11434"
+# Seconds to wait for a complete reply, or for the first token when streaming
+DEFAULT_TIMEOUT = 120.0
+# Seconds before the same request is also sent to a second host
+DEFAULT_HEDGE_AFTER = 10.0
+# Hosts tried per request, counting hedged requests
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_HEALTH_INTERVAL = 15.0
+# Weight of the newest sample in each host's moving average latency
+LATENCY_SMOOTHING = 0.3
+
+
+class LLMUnavailableError(Exception):
+    """Raised when no Ollama host could answer a request"""
+
+
+class OllamaHost:
+    """One Ollama server, optionally pinned to a model, with its load and health"""
+
+    def __init__(self, url: str, model: Optional[str] = None):
+        self.url = url.rstrip("/")
+        self.model = model
+        self.outstanding = 0
+        self.healthy = True
+        self.latency = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    @classmethod
+    def parse(cls, spec: str) -> "OllamaHost":
+        """Parse ``url`` or ``url=model``"""
+        url, _, model = spec.strip().partition("=")
+        return cls(url, model or None)
+
+    def observe_latency(self, seconds: float):
+        if not self.latency:
+            self.latency = seconds
+        else:
+            self.latency += LATENCY_SMOOTHING * (seconds - self.latency)
+
+    def __repr__(self):
+        return f"OllamaHost({self.url}, model={self.model}, outstanding={self.outstanding}, healthy={self.healthy})"
+
+
+class OllamaPool:
+    """Sends chat requests to the least busy healthy Ollama host over pooled HTTP connections
+
+    ``chat`` mirrors ``ollama.AsyncClient.chat``: it returns the reply as a dict, or with
+    ``stream=True`` an async iterator of chunks. A request still unanswered after
+    ``hedge_after`` seconds is also sent to the next best host and the first answer wins;
+    failed requests are retried on another host. Hosts that fail are skipped until a
+    background health check sees them answering again.
+    """
+
+    def __init__(
+        self,
+        hosts: list,
+        timeout: float = DEFAULT_TIMEOUT,
+        hedge_after: Optional[float] = DEFAULT_HEDGE_AFTER,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        health_interval: float = DEFAULT_HEALTH_INTERVAL,
+        max_connections: int = 32,
+    ):
+        if not hosts:
+            raise ValueError("At least one Ollama host is required")
+        self.hosts = [host if isinstance(host, OllamaHost) else OllamaHost.parse(host) for host in hosts]
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.max_attempts = max_attempts
+        self.health_interval = health_interval
+        self.hedges = 0
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=5.0),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self._health_task = None
+        logger.info(f"Ollama pool ready: {', '.join(host.url for host in self.hosts)}")
+
+    @classmethod
+    def from_env(cls) -> "OllamaPool":
+        """Create a pool from OLLAMA_HOSTS (comma-separated ``url`` or ``url=model``) and OLLAMA_* settings"""
+        hosts = os.getenv("OLLAMA_HOSTS") or os.getenv("OLLAMA_HOST") or DEFAULT_HOST
+        hedge_after = float(os.getenv("OLLAMA_HEDGE_AFTER", DEFAULT_HEDGE_AFTER))
+        return cls(
+            [spec for spec in hosts.split(",") if spec.strip()],
+            timeout=float(os.getenv("OLLAMA_TIMEOUT", DEFAULT_TIMEOUT)),
+            hedge_after=hedge_after if hedge_after > 0 else None,
+            max_attempts=int(os.getenv("OLLAMA_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)),
+            health_interval=float(os.getenv("OLLAMA_HEALTH_INTERVAL", DEFAULT_HEALTH_INTERVAL)),
+        )
+
+    async def chat(self, model: str, messages: list, stream: bool = False, **kwargs):
+        """Send a chat request; extra keyword arguments (options, keep_alive, ...) go into the request body"""
+        self._start_health_checks()
+        payload = {"model": model, "messages": messages, **kwargs}
+        if stream:
+            return self._stream(payload)
+        return await self._hedged(lambda host: self._post(host, payload))
+
+    def pick(self, exclude: tuple = ()) -> Optional[OllamaHost]:
+        """Least outstanding requests among healthy hosts, then lowest latency; unhealthy hosts as a last resort"""
+        candidates = [host for host in self.hosts if host not in exclude]
+        if not candidates:
+            return None
+        healthy = [host for host in candidates if host.healthy] or candidates
+        return min(healthy, key=lambda host: (host.outstanding, host.latency))
+
+    async def _hedged(self, attempt: Callable[[OllamaHost], Awaitable], discard: Callable = None):
+        """Run ``attempt(host)`` on the best host, adding hosts when it is slow or fails; the first result wins"""
+        tried = []
+        pending = {}  # task -> host
+        errors = []
+
+        def launch() -> bool:
+            host = self.pick(exclude=tuple(tried))
+            if host is None or len(tried) >= self.max_attempts:
+                return False
+            tried.append(host)
+            # Counted before the task starts so concurrent requests see the load
+            host.outstanding += 1
+            host.requests += 1
+            pending[asyncio.ensure_future(self._attempt(host, attempt))] = host
+            return True
+
+        launch()
+        deadline = time.monotonic() + self.timeout
+        try:
+            while pending:
+                hedge = self.hedge_after if self.hedge_after is not None and len(tried) < self.max_attempts else None
+                wait = max(0.0, deadline - time.monotonic())
+                if hedge is not None:
+                    wait = min(wait, hedge)
+                done, _ = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if time.monotonic() >= deadline:
+                        break
+                    # The request is slow: send it to another host as well
+                    if launch():
+                        self.hedges += 1
+                        metrics.llm_requests.inc(host=tried[-1].url, outcome="hedged")
+                        logger.info(f"Hedging slow LLM request on {tried[-1].url}")
+                    continue
+                for task in done:
+                    host = pending.pop(task)
+                    if task.exception() is None:
+                        return task.result()
+                    errors.append(f"{host.url}: {task.exception()!r}")
+                    # Retry the failed request elsewhere right away
+                    if not pending:
+                        launch()
+        finally:
+            for task in pending:
+                task.cancel()
+            if discard is not None and pending:
+                # A losing attempt may have finished before it could be cancelled
+                for result in await asyncio.gather(*pending, return_exceptions=True):
+                    if not isinstance(result, BaseException):
+                        await discard(result)
+
+        raise LLMUnavailableError(f"No Ollama host answered: {'; '.join(errors) or 'timed out'}")
+
+    async def _attempt(self, host: OllamaHost, attempt: Callable[[OllamaHost], Awaitable]):
+        start = time.perf_counter()
+        try:
+            result = await attempt(host)
+        except asyncio.CancelledError:
+            metrics.llm_requests.inc(host=host.url, outcome="cancelled")
+            raise
+        except Exception:
+            host.failures += 1
+            host.healthy = False
+            metrics.llm_requests.inc(host=host.url, outcome="error")
+            raise
+        finally:
+            host.outstanding -= 1
+        host.observe_latency(time.perf_counter() - start)
+        metrics.llm_requests.inc(host=host.url, outcome="ok")
+        return result
+
+    def _body(self, host: OllamaHost, payload: dict, stream: bool) -> dict:
+        return {**payload, "model": host.model or payload["model"], "stream": stream}
+
+    async def _post(self, host: OllamaHost, payload: dict) -> dict:
+        response = await self._client.post(f"{host.url}/api/chat", json=self._body(host, payload, False))
+        response.raise_for_status()
+        return response.json()
+
+    async def _open_stream(self, host: OllamaHost, payload: dict) -> tuple:
+        """Start a streaming request and wait for its first chunk"""
+        request = self._client.build_request("POST", f"{host.url}/api/chat", json=self._body(host, payload, True))
+        response = await self._client.send(request, stream=True)
+        try:
+            response.raise_for_status()
+            lines = response.aiter_lines()
+            async for line in lines:
+                if line.strip():
+                    return response, lines, json.loads(line)
+            raise LLMUnavailableError(f"{host.url} closed the stream without a reply")
+        except BaseException:
+            await response.aclose()
+            raise
+
+    async def _stream(self, payload: dict) -> AsyncIterator[dict]:
+        async def close(opened):
+            await opened[0].aclose()
+
+        # Hedging and retries apply until the first token arrives
+        response, lines, first = await self._hedged(lambda host: self._open_stream(host, payload), discard=close)
+        try:
+            yield first
+            async for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            await response.aclose()
+
+    def _start_health_checks(self):
+        if self._health_task is None and self.health_interval > 0:
+            self._health_task = asyncio.ensure_future(self._health_loop())
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await self.check_health()
+
+    async def check_health(self):
+        """Mark each host healthy if it answers a version request"""
+
+        async def check(host: OllamaHost):
+            try:
+                response = await self._client.get(f"{host.url}/api/version", timeout=5.0)
+                healthy = response.status_code == 200
+            except httpx.HTTPError:
+                healthy = False
+            if healthy != host.healthy:
+                logger.info(f"Ollama host {host.url} is {'healthy again' if healthy else 'unhealthy'}")
+            host.healthy = healthy
+
+        await asyncio.gather(*(check(host) for host in self.hosts))
+
+    async def aclose(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+        await self._client.aclose()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""Deadline-aware degradation of replies under load"""
+
+import logging
+import os
+from typing import Optional
+
+from inference import InferencePool
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_TOKENS = 80
+DEFAULT_SKIP_AUDIO_CHARS = 300
+# Plans must fit in this fraction of the time left, since estimates are averages and the deadline is for the tail
+DEFAULT_HEADROOM = 0.7
+# Weight of the newest reply in the running averages of reply length
+LENGTH_SMOOTHING = 0.2
+
+LEVELS = ("full", "short", "text_first", "text_only")
+
+
+def _smooth(average: Optional[float], value: float) -> float:
+    return value if average is None else average + LENGTH_SMOOTHING * (value - average)
+
+
+def _ratio(length: Optional[float], recent: Optional[float]) -> float:
+    """Service time of a job of ``length`` relative to recent jobs, 1 until both are known"""
+    return length / recent if length and recent else 1.0
+
+
+def brief(messages: list, max_tokens: int) -> list:
+    """Ask for a reply short enough to end naturally before the token cap"""
+    words = max_tokens * 3 // 4  # Roughly three words per four tokens
+    last = messages[-1]
+    return messages[:-1] + [{**last, "content": f"{last['content']}\n\n(Answer in at most {words} words.)"}]
+
+
+class Plan:
+    """How fully one request is served"""
+
+    def __init__(
+        self,
+        level: int = 0,
+        max_tokens: Optional[int] = None,
+        skip_audio_chars: Optional[int] = None,
+        estimate: float = 0.0,
+        budget: float = float("inf"),
+    ):
+        self.level = level
+        self.name = LEVELS[level]
+        self.max_tokens = max_tokens if level >= 1 else None  # Cap on LLM output tokens
+        self.fast_asr = level >= 1  # Transcribe with the fast Whisper model
+        self.defer_audio = level >= 2  # Send the text at once and the voice note when it is ready
+        self.skip_audio_chars = skip_audio_chars if level >= 3 else None  # No voice note for longer replies
+        self.estimate = estimate
+        self.budget = budget
+
+    def speaks(self, reply: str) -> bool:
+        """Whether the reply gets a voice note under this plan"""
+        return self.skip_audio_chars is None or len(reply) <= self.skip_audio_chars
+
+
+# The plan of every request when no load policy is configured
+FULL = Plan()
+
+
+class LoadPolicy:
+    """Chooses how much to degrade each request so its reply arrives within a deadline
+
+    The time left is the deadline minus what the request already spent, e.g. waiting for the
+    scheduler. A stage's latency is estimated as the wait behind the jobs in its queue plus the
+    request's own service time, from the stage's recent service times scaled by how long a reply
+    the plan produces. The least degraded level whose estimate fits is chosen:
+
+    - ``full``: the whole pipeline
+    - ``short``: replies capped at ``max_tokens`` and the fast ASR model
+    - ``text_first``: also send the reply text at once and its voice note when it is ready
+    - ``text_only``: also no voice note for replies over ``skip_audio_chars`` characters
+
+    The deadline is for the reply text; voice notes sent later are not counted.
+    """
+
+    def __init__(
+        self,
+        inference: InferencePool,
+        deadline: float,
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        skip_audio_chars: int = DEFAULT_SKIP_AUDIO_CHARS,
+        headroom: float = DEFAULT_HEADROOM,
+    ):
+        self.inference = inference
+        self.deadline = deadline
+        self.max_tokens = max_tokens
+        self.skip_audio_chars = skip_audio_chars
+        self.headroom = headroom
+        # Length of replies that were not capped, i.e. what a full reply costs
+        self.reply_words = None
+        self.reply_chars = None
+        # Length of recent LLM replies and synthesized texts, capped or not, i.e. what recent jobs cost
+        self._llm_words = None
+        self._tts_chars = None
+
+    @classmethod
+    def from_env(cls, inference: InferencePool) -> Optional["LoadPolicy"]:
+        """Create a policy from LOAD_* settings, or None when LOAD_DEADLINE_SECONDS is unset"""
+        deadline = float(os.getenv("LOAD_DEADLINE_SECONDS", 0))
+        if deadline <= 0:
+            return None
+        return cls(
+            inference,
+            deadline,
+            max_tokens=int(os.getenv("LOAD_MAX_TOKENS", DEFAULT_MAX_TOKENS)),
+            skip_audio_chars=int(os.getenv("LOAD_SKIP_AUDIO_CHARS", DEFAULT_SKIP_AUDIO_CHARS)),
+            headroom=float(os.getenv("LOAD_HEADROOM", DEFAULT_HEADROOM)),
+        )
+
+    def observe_reply(self, reply: str, capped: bool):
+        """Record the length of an LLM reply"""
+        words = len(reply.split())
+        self._llm_words = _smooth(self._llm_words, words)
+        if not capped:
+            self.reply_words = _smooth(self.reply_words, words)
+            self.reply_chars = _smooth(self.reply_chars, len(reply))
+
+    def observe_speech(self, text: str):
+        """Record the length of a synthesized text"""
+        self._tts_chars = _smooth(self._tts_chars, len(text))
+
+    def stage_seconds(self, stage: str, scale: float = 1.0) -> float:
+        """Estimated wait and service time of a new job on a stage, with its service time scaled by ``scale``"""
+        state = self.inference.stages.get(stage)
+        if state is None or state.service_seconds is None:
+            return 0.0
+        ahead = max(0, state.depth + 1 - state.workers)
+        return (ahead / state.workers + scale) * state.service_seconds
+
+    def estimates(self, asr: bool = False) -> list:
+        """Estimated seconds until the reply text is sent, per level"""
+        asr_seconds = self.stage_seconds("asr") if asr else 0.0
+        # A token is at most a word, so capped replies are estimated at up to max_tokens words
+        full_words = self.reply_words or self.max_tokens
+        short = min(1.0, self.max_tokens / full_words)
+        llm_full = self.stage_seconds("llm", _ratio(full_words, self._llm_words))
+        llm_short = self.stage_seconds("llm", _ratio(full_words * short, self._llm_words))
+        tts_full = self.stage_seconds("tts", _ratio(self.reply_chars, self._tts_chars))
+        tts_short = self.stage_seconds("tts", _ratio(self.reply_chars and self.reply_chars * short, self._tts_chars))
+        text_first = asr_seconds + llm_short
+        return [asr_seconds + llm_full + tts_full, asr_seconds + llm_short + tts_short, text_first, text_first]
+
+    def plan(self, point: str = "reply", asr: bool = False) -> Plan:
+        """Choose the plan for the current request at a decision point
+
+        ``asr`` when the request still has to be transcribed.
+        """
+        budget = self.deadline - metrics.elapsed()
+        estimates = self.estimates(asr)
+        level = next(
+            (level for level, estimate in enumerate(estimates) if estimate <= budget * self.headroom),
+            len(LEVELS) - 1,
+        )
+        plan = Plan(level, self.max_tokens, self.skip_audio_chars, estimates[level], budget)
+        metrics.load_decisions.inc(level=plan.name, point=point)
+        metrics.annotate(**{f"load_{point}": plan.name})
+        logger.info(
+            f"Load policy ({point}): {plan.name}, estimated {plan.estimate:.2f}s "
+            f"with {budget:.2f}s left of {self.deadline:.1f}s"
+        )
+        return plan
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""Latency and resource instrumentation with a Prometheus-style HTTP endpoint"""
+
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers fast cache hits up to minute-long syntheses
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+RTF_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8)
+BYTES_BUCKETS = (1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 2e7)
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+# Metrics are updated from the event loop and from inference worker threads
+_lock = threading.Lock()
+
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple, extra: Optional[tuple] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in items) + "}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts, sum, count]
+
+    def observe(self, value: float, **labels):
+        with _lock:
+            series = self._series.setdefault(_labels_key(labels), [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        for key, counts, total, count in series:
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', bound))} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels_key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with _lock:
+            values = list(self._values.items())
+        lines += [f"{self.name}{_format_labels(key)} {value}" for key, value in values]
+        return lines
+
+
+class Gauge:
+    """A gauge set directly or computed at scrape time by callbacks returning {labels: value}"""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._callbacks = []
+
+    def set(self, value: float, **labels):
+        key = _labels_key(labels)
+        with _lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels_key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def add_callback(self, callback: Callable[[], dict]):
+        self._callbacks.append(callback)
+
+    def render(self) -> list:
+        with _lock:
+            values = dict(self._values)
+        for callback in self._callbacks:
+            try:
+                values.update({_labels_key(dict(labels)): value for labels, value in callback().items()})
+            except Exception as e:
+                logger.warning(f"Metrics callback for {self.name} failed: {e}")
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        lines += [f"{self.name}{_format_labels(key)} {value}" for key, value in values.items()]
+        return lines
+
+
+class RequestTrace:
+    """Stage spans for one request, written as a JSON line when the request finishes"""
+
+    def __init__(self, user_id, kind: str):
+        self.user_id = user_id
+        self.kind = kind
+        self.start = time.time()
+        self.spans = []
+        self.attributes = {}
+
+    def to_dict(self) -> dict:
+        return {
+            "user_id": self.user_id,
+            "kind": self.kind,
+            "start": self.start,
+            "duration": time.time() - self.start,
+            "spans": self.spans,
+            **self.attributes,
+        }
+
+
+class Metrics:
+    """Registry of the bot's metrics"""
+
+    def __init__(self):
+        self.stage_seconds = Histogram(
+            "watts_stage_duration_seconds", "Time spent in each pipeline stage", LATENCY_BUCKETS
+        )
+        self.request_seconds = Histogram(
+            "watts_request_duration_seconds", "End-to-end handling time per request", LATENCY_BUCKETS
+        )
+        self.llm_tokens_per_second = Histogram(
+            "watts_llm_tokens_per_second", "LLM generation speed", RATE_BUCKETS
+        )
+        self.tts_real_time_factor = Histogram(
+            "watts_tts_real_time_factor", "Synthesis time divided by audio duration", RTF_BUCKETS
+        )
+        self.audio_bytes = Histogram("watts_audio_bytes", "Size of audio downloaded and uploaded", BYTES_BUCKETS)
+        self.requests = Counter("watts_requests_total", "Requests handled")
+        self.errors = Counter("watts_errors_total", "Failures by pipeline stage")
+        self.llm_requests = Counter("watts_llm_requests_total", "LLM requests per Ollama host and outcome")
+        self.rejected = Counter("watts_rejected_total", "Requests rejected because an inference queue was full")
+        self.voice_cache = Counter("watts_voice_cache_total", "Speaker conditioning cache lookups by result")
+        self.transcript_cache = Counter(
+            "watts_transcript_cache_total", "Voice note transcript lookups by key (file id or audio) and result"
+        )
+        self.load_decisions = Counter(
+            "watts_load_decisions_total", "Degradation levels chosen by the load policy, per decision point"
+        )
+        self.scheduler_events = Counter(
+            "watts_scheduler_events_total", "Messages merged and jobs cancelled or superseded by the request scheduler"
+        )
+        self.in_flight = Gauge("watts_requests_in_flight", "Requests currently being handled")
+        self.queue_depth = Gauge("watts_inference_queue_depth", "Jobs waiting or running per inference stage")
+        self.accelerator_memory = Gauge("watts_accelerator_memory_bytes", "Memory allocated on the accelerator")
+        self.accelerator_memory.add_callback(_accelerator_memory)
+
+        self._trace_lock = threading.Lock()
+        self.trace_log = None
+        self.profile_dir = None
+        self.profile_rate = 0.0
+
+    def configure_from_env(self):
+        """Enable the trace log and sampling profiler from METRICS_TRACE_LOG and PROFILE_* settings"""
+        trace_log = os.getenv("METRICS_TRACE_LOG")
+        self.trace_log = Path(trace_log) if trace_log else None
+        profile_dir = os.getenv("PROFILE_DIR")
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self.profile_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0.05"))
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a pipeline stage and record it on the current request trace"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stage_seconds.observe(elapsed, stage=name)
+            trace = _current_trace.get()
+            if trace is not None:
+                trace.spans.append({"stage": name, "offset": start - trace.perf_start, "duration": elapsed})
+
+    @contextmanager
+    def request(self, user_id, kind: str):
+        """Track an incoming request: in-flight gauge, latency, errors and optional trace log"""
+        trace = RequestTrace(user_id, kind)
+        trace.perf_start = time.perf_counter()
+        token = _current_trace.set(trace)
+        self.requests.inc(kind=kind)
+        self.in_flight.inc()
+        try:
+            yield trace
+        except BaseException:
+            self.errors.inc(stage="unhandled")
+            raise
+        finally:
+            self.in_flight.dec()
+            self.request_seconds.observe(time.perf_counter() - trace.perf_start, kind=kind)
+            _current_trace.reset(token)
+            self._write_trace(trace)
+
+    def elapsed(self) -> float:
+        """Seconds since the current request started, or 0 outside a request"""
+        trace = _current_trace.get()
+        return time.perf_counter() - trace.perf_start if trace is not None else 0.0
+
+    def annotate(self, **attributes):
+        """Attach attributes (e.g. cache hits) to the current request trace"""
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.attributes.update(attributes)
+
+    def _write_trace(self, trace: RequestTrace):
+        if self.trace_log is None:
+            return
+        try:
+            with self._trace_lock, open(self.trace_log, "a", encoding="utf-8") as f:
+                f.write(json.dumps(trace.to_dict()) + "\n")
+        except Exception as e:
+            logger.warning(f"Could not write request trace: {e}")
+
+    @contextmanager
+    def profiled(self, name: str):
+        """Run a sampled fraction of calls under the pyinstrument sampling profiler"""
+        if self.profile_dir is None or random.random() >= self.profile_rate:
+            yield
+            return
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning("PROFILE_DIR is set but pyinstrument is not installed")
+            self.profile_dir = None
+            yield
+            return
+
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            path = self.profile_dir / f"{name}_{time.strftime('%Y%m%d-%H%M%S')}_{time.time_ns() % 10**6}.html"
+            path.write_text(profiler.output_html(), encoding="utf-8")
+            logger.info(f"Saved {name} profile to {path}")
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in vars(self).values():
+            if isinstance(metric, (Histogram, Counter, Gauge)):
+                lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+def _accelerator_memory() -> dict:
+    import torch
+
+    if not torch.cuda.is_available():
+        return {}
+    return {(("device", f"cuda:{i}"),): torch.cuda.memory_allocated(i) for i in range(torch.cuda.device_count())}
+
+
+def start_http_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve /metrics from a background thread"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
+
+
+# Shared registry used across the bot
+metrics = Metrics()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+def pick_device(override: Optional[str] = None) -> str:
+    """Choose the inference device: an explicit override or MODEL_DEVICE, else cuda, mps or cpu"""
+    device = override or os.getenv("MODEL_DEVICE")
+    if device:
+        return device
+    if torch.cuda.is_available():
+        return "cuda"
+    if getattr(torch.backends, "mps", None) is not None and torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+class ModelManager:
+    """Loads models in parallel background threads, warms them up and tracks readiness
+
+    ``loaders`` maps a model name to a function that loads it. When a model is loaded,
+    ``on_loaded(name, model)`` wires it into the application and ``warmups[name](model)``
+    runs a short inference so the first real request doesn't pay for lazy initialization.
+    """
+
+    def __init__(
+        self,
+        loaders: Dict[str, Callable[[], object]],
+        on_loaded: Callable[[str, object], None],
+        warmups: Optional[Dict[str, Callable[[object], None]]] = None,
+    ):
+        self.loaders = loaders
+        self.on_loaded = on_loaded
+        self.warmups = warmups or {}
+        self.models = {}
+        self.status = {name: "pending" for name in loaders}
+        self.timings = {}
+        self._ready = {name: threading.Event() for name in loaders}
+        self._executor = None
+        self._started = None
+
+    def start(self):
+        """Start loading every model in the background"""
+        self._started = time.perf_counter()
+        self._executor = ThreadPoolExecutor(max_workers=len(self.loaders) or 1, thread_name_prefix="model-loader")
+        for name, status in self.status.items():
+            if status == "pending":
+                self._executor.submit(self._load, name)
+        self._executor.shutdown(wait=False)
+
+    def skip(self, name: str):
+        """Don't load a model; it is reported as skipped and never becomes ready"""
+        self.status[name] = "skipped"
+        self._ready[name].set()
+
+    def load_now(self, name: str, warmup: bool = True):
+        """Load a model synchronously in the calling thread"""
+        self._load(name, warmup)
+
+    def _load(self, name: str, warmup: bool = True):
+        try:
+            self.status[name] = "loading"
+            start = time.perf_counter()
+            logger.info(f"Loading {name} model...")
+            model = self.loaders[name]()
+            loaded = time.perf_counter()
+            self.models[name] = model
+            self.on_loaded(name, model)
+
+            self.status[name] = "warming"
+            if warmup and name in self.warmups:
+                self.warmups[name](model)
+            warmed = time.perf_counter()
+
+            self.timings[name] = {"load": loaded - start, "warmup": warmed - loaded}
+            self.status[name] = "ready"
+            logger.info(f"{name} model ready: loaded in {loaded - start:.1f}s, warmed up in {warmed - loaded:.1f}s")
+        except Exception as e:
+            self.status[name] = "failed"
+            logger.error(f"Error loading {name} model: {e}")
+        finally:
+            self._ready[name].set()
+            if all(event.is_set() for event in self._ready.values()) and self._started is not None:
+                logger.info(f"All models settled in {time.perf_counter() - self._started:.1f}s: {self.status}")
+
+    def is_ready(self, name: str) -> bool:
+        return self.status.get(name) == "ready"
+
+    def wait(self, name: str, timeout: Optional[float] = None) -> bool:
+        """Block until a model is ready or has failed; returns whether it is ready"""
+        self._ready[name].wait(timeout)
+        return self.is_ready(name)
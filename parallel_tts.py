@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""Chunked parallel synthesis of long replies across a pool of CPU worker processes"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import re
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
+
+import torch
+
+from cpu_profile import configure_threads
+from streaming import SENTENCE_END
+
+logger = logging.getLogger(__name__)
+
+# Longest text synthesized by one worker call
+DEFAULT_CHUNK_CHARS = 300
+# Replies shorter than this are synthesized in one piece
+DEFAULT_MIN_CHARS = 400
+DEFAULT_CROSSFADE_MS = 30
+# Chunk loudness is matched to the reply's median within these gain limits
+MAX_GAIN = 2.0
+MIN_GAIN = 0.5
+
+# Clause boundary: comma, semicolon, colon or dash followed by whitespace
+CLAUSE_END = re.compile(r"[,;:—–]\s+")
+
+# Model and per-voice conditionings held by each worker process
+_model = None
+_conds = {}
+
+
+def _split(text: str, pattern: re.Pattern) -> list:
+    pieces, start = [], 0
+    for match in pattern.finditer(text):
+        pieces.append(text[start : match.end()].strip())
+        start = match.end()
+    pieces.append(text[start:].strip())
+    return [piece for piece in pieces if piece]
+
+
+def split_text(text: str, max_chars: int = DEFAULT_CHUNK_CHARS) -> list:
+    """Split text into chunks of at most ``max_chars`` at sentence, then clause, then word boundaries"""
+    pieces = []
+    for sentence in _split(text, SENTENCE_END):
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        for clause in _split(sentence, CLAUSE_END):
+            while len(clause) > max_chars:
+                cut = clause.rfind(" ", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                pieces.append(clause[:cut].strip())
+                clause = clause[cut:].strip()
+            if clause:
+                pieces.append(clause)
+
+    # Merge neighbouring pieces so each worker call gets a reasonably long text
+    chunks = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) + 1 + len(piece) <= max_chars:
+            chunks[-1] += " " + piece
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+def match_loudness(wavs: list) -> list:
+    """Scale each chunk towards the median RMS of all chunks so the stitched audio has even loudness"""
+    levels = [wav.pow(2).mean().sqrt().item() for wav in wavs]
+    voiced = [level for level in levels if level > 1e-4]
+    if not voiced:
+        return wavs
+    target = statistics.median(voiced)
+    scaled = []
+    for wav, level in zip(wavs, levels):
+        gain = min(MAX_GAIN, max(MIN_GAIN, target / level)) if level > 1e-4 else 1.0
+        scaled.append((wav * gain).clamp(-1.0, 1.0))
+    return scaled
+
+
+def crossfade_concat(wavs: list, sample_rate: int, fade_ms: float = DEFAULT_CROSSFADE_MS) -> torch.Tensor:
+    """Concatenate waveforms of shape (1, samples), overlapping neighbours with a short linear crossfade"""
+    out = wavs[0].reshape(1, -1)
+    for wav in wavs[1:]:
+        wav = wav.reshape(1, -1)
+        n = min(int(sample_rate * fade_ms / 1000), out.shape[-1], wav.shape[-1])
+        if n == 0:
+            out = torch.cat([out, wav], dim=-1)
+            continue
+        ramp = torch.linspace(0.0, 1.0, n)
+        overlap = out[:, -n:] * (1 - ramp) + wav[:, :n] * ramp
+        out = torch.cat([out[:, :-n], overlap, wav[:, n:]], dim=-1)
+    return out
+
+
+def _init_worker(load_model: Callable, threads: int):
+    global _model
+    configure_threads(threads)
+    _model = load_model()
+
+
+def _worker_ready() -> int:
+    return os.getpid()
+
+
+def _generate_chunk(text: str, audio_prompt_path, exaggeration: float, cfg_weight: float) -> torch.Tensor:
+    """Synthesize one chunk in a worker, preparing each voice conditioning once per worker"""
+    if audio_prompt_path is not None:
+        # The modification time tells a replaced custom voice file from the old one
+        key = (str(audio_prompt_path), os.path.getmtime(audio_prompt_path), exaggeration)
+        if key not in _conds:
+            _model.prepare_conditionals(audio_prompt_path, exaggeration=exaggeration)
+            _conds[key] = _model.conds
+        _model.conds = _conds[key]
+    with torch.inference_mode():
+        return _model.generate(text, exaggeration=exaggeration, cfg_weight=cfg_weight).detach().cpu()
+
+
+class ParallelTTS:
+    """Synthesizes long texts by splitting them into chunks spoken in parallel by worker processes
+
+    Every worker loads its own CPU model with ``load_model()`` (which must be picklable) and
+    prepares the voice conditioning from the same prompt, so all chunks share one voice.
+    Chunks are loudness-matched and joined with short crossfades.
+    """
+
+    def __init__(
+        self,
+        load_model: Callable,
+        sample_rate: int,
+        workers: int = 2,
+        chunk_chars: int = DEFAULT_CHUNK_CHARS,
+        min_chars: int = DEFAULT_MIN_CHARS,
+        crossfade_ms: float = DEFAULT_CROSSFADE_MS,
+    ):
+        self.sample_rate = sample_rate
+        self.workers = workers
+        self.chunk_chars = chunk_chars
+        self.min_chars = min_chars
+        self.crossfade_ms = crossfade_ms
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(load_model, threads),
+        )
+        logger.info(f"Parallel TTS ready: {workers} worker processes with {threads} threads each")
+
+    @classmethod
+    def from_env(cls, load_model: Callable, sample_rate: int) -> Optional["ParallelTTS"]:
+        """Create the engine from TTS_PROCESS_WORKERS (0 disables it) and the TTS_CHUNK_* settings"""
+        workers = int(os.getenv("TTS_PROCESS_WORKERS", 0))
+        if workers <= 0:
+            return None
+        return cls(
+            load_model,
+            sample_rate,
+            workers=workers,
+            chunk_chars=int(os.getenv("TTS_CHUNK_CHARS", DEFAULT_CHUNK_CHARS)),
+            min_chars=int(os.getenv("TTS_PARALLEL_MIN_CHARS", DEFAULT_MIN_CHARS)),
+            crossfade_ms=float(os.getenv("TTS_CROSSFADE_MS", DEFAULT_CROSSFADE_MS)),
+        )
+
+    def start(self):
+        """Start every worker process and wait until each has loaded its model"""
+        futures = [self._executor.submit(_worker_ready) for _ in range(self.workers)]
+        pids = sorted({future.result() for future in futures})
+        logger.info(f"Parallel TTS workers started: {pids}")
+
+    async def generate(
+        self, text: str, audio_prompt_path=None, exaggeration: float = 0.5, cfg_weight: float = 0.5
+    ) -> torch.Tensor:
+        """Synthesize a text chunk by chunk in parallel and return one waveform"""
+        chunks = split_text(text, self.chunk_chars)
+        logger.info(f"Synthesizing {len(text)} characters as {len(chunks)} chunks on {self.workers} workers")
+        loop = asyncio.get_running_loop()
+        wavs = await asyncio.gather(
+            *(
+                loop.run_in_executor(self._executor, _generate_chunk, chunk, audio_prompt_path, exaggeration, cfg_weight)
+                for chunk in chunks
+            )
+        )
+        return await asyncio.to_thread(self._stitch, list(wavs))
+
+    def _stitch(self, wavs: list) -> torch.Tensor:
+        return crossfade_concat(match_loudness(wavs), self.sample_rate, self.crossfade_ms)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
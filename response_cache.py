@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_MB = 1024
+DEFAULT_TTL_DAYS = 30
+# Number of different replies kept per question; served in rotation once all are generated
+DEFAULT_VARIANTS = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS replies (
+    key TEXT, variant INTEGER, text TEXT, size INTEGER, created REAL, accessed REAL,
+    PRIMARY KEY (key, variant)
+);
+CREATE TABLE IF NOT EXISTS audio (
+    key TEXT PRIMARY KEY, blob TEXT, duration INTEGER, size INTEGER, created REAL, accessed REAL
+);
+"""
+
+
+def normalize_text(text: str) -> str:
+    """Normalize a user message so trivially different phrasings share a cache entry"""
+    text = re.sub(r"\s+", " ", text.lower()).strip()
+    return text.rstrip(" .!?…")
+
+
+def _hash(*parts) -> str:
+    return hashlib.sha256("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Disk-backed two-level cache of LLM replies and their synthesized audio
+
+    Level one maps a normalized question, model name and personality to the generated reply.
+    Level two maps a reply, voice and TTS parameters to the encoded voice note. Entries live in
+    SQLite with audio blobs in a directory next to it, expire after ``ttl`` seconds and are
+    evicted least recently used first once the total size exceeds ``max_bytes``.
+    """
+
+    def __init__(
+        self,
+        cache_dir,
+        max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024,
+        ttl: float = DEFAULT_TTL_DAYS * 24 * 3600,
+        variants: int = DEFAULT_VARIANTS,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.blob_dir = self.cache_dir / "audio"
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.variants = variants
+
+        self._db = sqlite3.connect(self.cache_dir / "cache.sqlite3", check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+        self.hits = {"reply": 0, "audio": 0}
+        self.misses = {"reply": 0, "audio": 0}
+        self.bytes_saved = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseCache"]:
+        """Create a cache from RESPONSE_CACHE_* settings, or None if RESPONSE_CACHE_DIR is unset"""
+        cache_dir = os.getenv("RESPONSE_CACHE_DIR")
+        if not cache_dir:
+            return None
+        return cls(
+            cache_dir,
+            max_bytes=int(float(os.getenv("RESPONSE_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024),
+            ttl=float(os.getenv("RESPONSE_CACHE_TTL_DAYS", DEFAULT_TTL_DAYS)) * 24 * 3600,
+            variants=int(os.getenv("RESPONSE_CACHE_VARIANTS", DEFAULT_VARIANTS)),
+        )
+
+    @staticmethod
+    def reply_key(user_text: str, model: str, personality: str) -> str:
+        return _hash(normalize_text(user_text), model, _hash(personality))
+
+    @staticmethod
+    def audio_key(reply: str, voice_digest: str, exaggeration: float, cfg_weight: float) -> str:
+        return _hash(reply, voice_digest, f"{exaggeration:.2f}", f"{cfg_weight:.2f}")
+
+    def get_reply(self, key: str) -> Optional[str]:
+        """Return a cached reply, rotating between variants, or None if another variant is wanted"""
+        with self._lock:
+            now = time.time()
+            self._db.execute("DELETE FROM replies WHERE key = ? AND created < ?", (key, now - self.ttl))
+            rows = self._db.execute(
+                "SELECT variant, text FROM replies WHERE key = ? ORDER BY accessed ASC", (key,)
+            ).fetchall()
+            if len(rows) < self.variants:
+                self.misses["reply"] += 1
+                return None
+
+            # Serve the variant that was used least recently
+            variant, text = rows[0]
+            self._db.execute("UPDATE replies SET accessed = ? WHERE key = ? AND variant = ?", (now, key, variant))
+            self._db.commit()
+            self.hits["reply"] += 1
+            self.bytes_saved += len(text.encode("utf-8"))
+            return text
+
+    def put_reply(self, key: str, text: str):
+        """Store a reply as a new variant for a question"""
+        with self._lock:
+            now = time.time()
+            count, variant = self._db.execute(
+                "SELECT COUNT(*), COALESCE(MAX(variant) + 1, 0) FROM replies WHERE key = ?", (key,)
+            ).fetchone()
+            if count >= self.variants:
+                return
+            self._db.execute(
+                "INSERT INTO replies VALUES (?, ?, ?, ?, ?, ?)",
+                (key, variant, text, len(text.encode("utf-8")), now, now),
+            )
+            self._evict()
+            self._db.commit()
+
+    def get_audio(self, key: str) -> Optional[tuple]:
+        """Return (encoded audio, duration in seconds) for a cached voice note"""
+        with self._lock:
+            now = time.time()
+            row = self._db.execute("SELECT blob, duration, created FROM audio WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[2] < now - self.ttl:
+                self._delete_audio(key, row[0])
+                row = None
+            if row is None:
+                self.misses["audio"] += 1
+                return None
+
+            try:
+                data = (self.blob_dir / row[0]).read_bytes()
+            except OSError:
+                self._delete_audio(key, row[0])
+                self.misses["audio"] += 1
+                return None
+
+            self._db.execute("UPDATE audio SET accessed = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits["audio"] += 1
+            self.bytes_saved += len(data)
+            return data, row[1]
+
+    def put_audio(self, key: str, data: bytes, duration: int):
+        """Store an encoded voice note"""
+        with self._lock:
+            now = time.time()
+            blob = f"{key}.bin"
+            (self.blob_dir / blob).write_bytes(data)
+            self._db.execute(
+                "INSERT OR REPLACE INTO audio VALUES (?, ?, ?, ?, ?, ?)", (key, blob, duration, len(data), now, now)
+            )
+            self._evict()
+            self._db.commit()
+
+    def _delete_audio(self, key: str, blob: str):
+        self._db.execute("DELETE FROM audio WHERE key = ?", (key,))
+        self._db.commit()
+        (self.blob_dir / blob).unlink(missing_ok=True)
+
+    def _evict(self):
+        """Drop expired entries, then least recently used ones until under the size limit"""
+        expired = time.time() - self.ttl
+        self._db.execute("DELETE FROM replies WHERE created < ?", (expired,))
+        for key, blob in self._db.execute("SELECT key, blob FROM audio WHERE created < ?", (expired,)).fetchall():
+            self._delete_audio(key, blob)
+
+        total = self.size()
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute(
+            "SELECT 'reply', key, variant, size, accessed FROM replies "
+            "UNION ALL SELECT 'audio', key, blob, size, accessed FROM audio ORDER BY accessed ASC"
+        ).fetchall()
+        for kind, key, extra, size, _ in rows:
+            if total <= self.max_bytes:
+                break
+            if kind == "reply":
+                self._db.execute("DELETE FROM replies WHERE key = ? AND variant = ?", (key, extra))
+            else:
+                self._delete_audio(key, extra)
+            total -= size
+
+    def size(self) -> int:
+        """Total bytes of cached replies and audio"""
+        (replies,) = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM replies").fetchone()
+        (audio,) = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM audio").fetchone()
+        return replies + audio
+
+    def stats(self) -> dict:
+        """Hit ratios per level and bytes served from the cache"""
+        stats = {}
+        for level in ("reply", "audio"):
+            total = self.hits[level] + self.misses[level]
+            stats[f"{level}_hits"] = self.hits[level]
+            stats[f"{level}_misses"] = self.misses[level]
+            stats[f"{level}_hit_ratio"] = self.hits[level] / total if total else 0.0
+        stats["bytes_saved"] = self.bytes_saved
+        with self._lock:
+            stats["bytes"] = self.size()
+        return stats
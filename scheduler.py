@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""Fair admission of message-processing jobs: per-user round-robin, coalescing and cancellation"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ACTIVE = 8
+DEFAULT_PER_USER = 1
+DEFAULT_COALESCE_MS = 400
+DEFAULT_MAX_PENDING = 3
+
+
+class _Job:
+    """One or more messages from a user, processed together as one prompt"""
+
+    def __init__(self, user_id: int, text: str, run: Callable[[str], Awaitable]):
+        self.user_id = user_id
+        self.texts = [text]
+        self.run = run
+        self.context = contextvars.copy_context()
+        self.created = time.perf_counter()
+        self.last_arrival = self.created
+        self.future = asyncio.get_running_loop().create_future()
+        self.task = None
+
+    def merge(self, text: str, run: Callable[[str], Awaitable]):
+        """Add a later message; the reply goes to the latest one"""
+        self.texts.append(text)
+        self.run = run
+        self.context = contextvars.copy_context()
+        self.last_arrival = time.perf_counter()
+
+    def resolve(self, result=None):
+        if not self.future.done():
+            self.future.set_result(result)
+
+
+class RequestScheduler:
+    """Decides when each user's messages are processed
+
+    At most ``max_active`` jobs run at once and at most ``per_user`` per user. Users waiting
+    for a slot are served round-robin, so one user sending many messages waits behind
+    everyone else instead of filling the queue. A user's first message starts at once;
+    while one of their jobs is running, messages sent within ``coalesce_ms`` of each
+    other are merged into one job, as are messages beyond
+    ``max_pending`` waiting jobs. ``cancel()`` drops a user's queued jobs and cancels
+    the running ones.
+    """
+
+    def __init__(
+        self,
+        max_active: int = DEFAULT_MAX_ACTIVE,
+        per_user: int = DEFAULT_PER_USER,
+        coalesce_ms: float = DEFAULT_COALESCE_MS,
+        max_pending: int = DEFAULT_MAX_PENDING,
+    ):
+        self.max_active = max_active
+        self.per_user = per_user
+        self.coalesce_seconds = coalesce_ms / 1000
+        self.max_pending = max_pending
+        self._pending = {}  # user_id -> deque of jobs not started yet
+        self._running = {}  # user_id -> set of started jobs
+        self._ring = deque()  # users with pending jobs, in the order they are served
+        self._active = 0
+        self._timer = None
+
+    @classmethod
+    def from_env(cls) -> "RequestScheduler":
+        """Create a scheduler configured by SCHEDULER_* environment variables"""
+        return cls(
+            max_active=int(os.getenv("SCHEDULER_MAX_ACTIVE", DEFAULT_MAX_ACTIVE)),
+            per_user=int(os.getenv("SCHEDULER_PER_USER", DEFAULT_PER_USER)),
+            coalesce_ms=float(os.getenv("SCHEDULER_COALESCE_MS", DEFAULT_COALESCE_MS)),
+            max_pending=int(os.getenv("SCHEDULER_MAX_PENDING", DEFAULT_MAX_PENDING)),
+        )
+
+    def pending(self, user_id: int) -> int:
+        return len(self._pending.get(user_id, ()))
+
+    def running(self, user_id: int) -> int:
+        return len(self._running.get(user_id, ()))
+
+    async def submit(self, user_id: int, text: str, run: Callable[[str], Awaitable], supersede: bool = False):
+        """Queue a message and wait until the job it belongs to has finished
+
+        ``run(text)`` processes the (possibly merged) text. Returns its result, or None
+        when the job was cancelled.
+        """
+        if supersede:
+            self.cancel(user_id, reason="superseded")
+
+        pending = self._pending.setdefault(user_id, deque())
+        last = pending[-1] if pending else None
+        if last is not None and (
+            time.perf_counter() - last.last_arrival <= self.coalesce_seconds or len(pending) >= self.max_pending
+        ):
+            last.merge(text, run)
+            job = last
+            metrics.scheduler_events.inc(event="coalesced")
+            logger.info(f"Merged message from user {user_id} into a job of {len(job.texts)} messages")
+        else:
+            job = _Job(user_id, text, run)
+            pending.append(job)
+            if user_id not in self._ring:
+                self._ring.append(user_id)
+
+        self._dispatch()
+        return await job.future
+
+    def cancel(self, user_id: int, reason: str = "cancelled") -> int:
+        """Drop a user's queued jobs and cancel their running ones; returns how many were affected"""
+        jobs = list(self._pending.pop(user_id, ()))
+        if user_id in self._ring:
+            self._ring.remove(user_id)
+        for job in jobs:
+            job.resolve(None)
+        running = list(self._running.get(user_id, ()))
+        for job in running:
+            job.task.cancel()
+        count = len(jobs) + len(running)
+        if count:
+            metrics.scheduler_events.inc(count, event=reason)
+            logger.info(f"{reason.capitalize()} {count} job(s) of user {user_id}")
+        return count
+
+    def _dispatch(self):
+        """Start ready jobs in round-robin order while there are free slots"""
+        now = time.perf_counter()
+        next_ready = None
+        started = True
+        while started and self._active < self.max_active:
+            started = False
+            for user_id in list(self._ring):
+                if self._active >= self.max_active:
+                    break
+                pending = self._pending[user_id]
+                # While a reply is in flight, wait for the user to finish typing so follow-ups merge
+                ready_at = pending[0].last_arrival + self.coalesce_seconds
+                if self.running(user_id) and ready_at > now:
+                    next_ready = ready_at if next_ready is None else min(next_ready, ready_at)
+                    continue
+                if self.running(user_id) >= self.per_user:
+                    continue
+                self._start(pending.popleft())
+                started = True
+                # Served users go to the back of the line
+                self._ring.remove(user_id)
+                if pending:
+                    self._ring.append(user_id)
+                else:
+                    del self._pending[user_id]
+
+        if next_ready is not None:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = asyncio.get_running_loop().call_later(next_ready - now, self._dispatch)
+
+    def _start(self, job: _Job):
+        self._active += 1
+        self._running.setdefault(job.user_id, set()).add(job)
+        metrics.stage_seconds.observe(time.perf_counter() - job.created, stage="schedule")
+        text = "\n".join(job.texts)
+        # Run in the latest submitter's context so its request trace records the stages
+        job.task = asyncio.get_running_loop().create_task(job.run(text), context=job.context)
+        job.task.add_done_callback(functools.partial(self._finished, job))
+
+    def _finished(self, job: _Job, task: asyncio.Task):
+        self._active -= 1
+        running = self._running.get(job.user_id)
+        if running is not None:
+            running.discard(job)
+            if not running:
+                del self._running[job.user_id]
+        if task.cancelled():
+            job.resolve(None)
+        elif task.exception() is not None:
+            if not job.future.done():
+                job.future.set_exception(task.exception())
+        else:
+            job.resolve(task.result())
+        self._dispatch()
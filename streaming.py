@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+import asyncio
+import inspect
+import logging
+import re
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from inference import InferencePool
+
+logger = logging.getLogger(__name__)
+
+# End of sentence: terminal punctuation, optional closing quotes/brackets, then whitespace
+SENTENCE_END = re.compile(r"[.!?…]+[\"'”’)\]]*\s+")
+# Sentences shorter than this are merged with the next one to avoid choppy audio
+MIN_SENTENCE_CHARS = 40
+
+
+class SentenceSplitter:
+    """Splits a stream of text tokens into complete sentences"""
+
+    def __init__(self, min_chars: int = MIN_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self, token: str) -> list:
+        """Add a token and return any sentences completed by it"""
+        self.buffer += token
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self.buffer):
+            if match.end() - start >= self.min_chars:
+                sentences.append(self.buffer[start : match.end()].strip())
+                start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        """Return whatever text is left once the stream ends"""
+        rest = self.buffer.strip()
+        self.buffer = ""
+        return rest or None
+
+
+async def stream_chat(
+    inference: InferencePool,
+    chat_fn: Callable,
+    on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+    **kwargs,
+) -> AsyncIterator[str]:
+    """Yield reply tokens from a streaming Ollama chat running on the LLM stage"""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    if inspect.iscoroutinefunction(chat_fn):
+        # Async clients like ollama.AsyncClient.chat return an async iterator of chunks
+
+        async def produce():
+            async for chunk in await chat_fn(stream=True, **kwargs):
+                queue.put_nowait(chunk["message"]["content"])
+
+    else:
+
+        def produce():
+            for chunk in chat_fn(stream=True, **kwargs):
+                loop.call_soon_threadsafe(queue.put_nowait, chunk["message"]["content"])
+
+    task = asyncio.ensure_future(inference.run("llm", produce, on_queued=on_queued))
+    # Runs after every token already queued from the worker thread
+    task.add_done_callback(lambda _: queue.put_nowait(None))
+
+    while (token := await queue.get()) is not None:
+        yield token
+
+    # Surface errors from the LLM call
+    await task
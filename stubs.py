@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""Stub models and fake Telegram objects for running AlanWatts without GPUs or a live bot"""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import torch
+
+
+def sample(delay) -> float:
+    """A fixed delay in seconds, or a draw from a latency distribution given as a callable"""
+    return delay() if callable(delay) else delay
+
+
+class _Stub:
+    """Counts calls and records how long each one kept the model busy"""
+
+    def __init__(self):
+        self.calls = 0
+        self.durations = []
+
+    def _busy(self, seconds: float):
+        self.calls += 1
+        time.sleep(seconds)
+        self.durations.append(seconds)
+
+
+class StubConditionals:
+    """Stands in for chatterbox.tts.Conditionals"""
+
+    def __init__(self, prompt_path: str, exaggeration: float):
+        self.prompt_path = prompt_path
+        self.exaggeration = exaggeration
+        self.speaker_emb = torch.zeros(1, 256)
+
+
+class StubTTS(_Stub):
+    """Stands in for ChatterboxTTS: sleeps and returns silence as long as the text would take to speak"""
+
+    def __init__(
+        self,
+        delay: float = 0.5,
+        sr: int = 24000,
+        seconds_per_char: float = 0.06,
+        batch_item_delay: float = None,
+        prepare_delay: float = 0.1,
+        char_delay: float = 0.0,
+    ):
+        super().__init__()
+        self.delay = delay
+        self.char_delay = char_delay  # Extra synthesis time per character of text
+        self.sr = sr
+        self.seconds_per_char = seconds_per_char
+        self.prepare_delay = prepare_delay
+        self.prepares = 0
+        self.conds = None
+        self.used_conds = []  # Conditionals each generate call ran with
+        self.device = "cpu"
+        if batch_item_delay is not None:
+            # Only expose a batched generate when a per-item batch cost is given
+            self.batch_item_delay = batch_item_delay
+            self.generate_batch = self._generate_batch
+
+    def _silence(self, text: str):
+        return torch.zeros(1, int(len(text) * self.seconds_per_char * self.sr))
+
+    def prepare_conditionals(self, wav_fpath, exaggeration=0.5):
+        self.prepares += 1
+        time.sleep(self.prepare_delay)
+        self.conds = StubConditionals(str(wav_fpath), exaggeration)
+
+    def generate(self, text: str, audio_prompt_path=None, exaggeration=0.5, cfg_weight=0.5, **kwargs):
+        if audio_prompt_path:
+            self.prepare_conditionals(audio_prompt_path, exaggeration=exaggeration)
+        self.used_conds.append(self.conds)
+        self._busy(sample(self.delay) + self.char_delay * len(text))
+        return self._silence(text)
+
+    def _generate_batch(self, texts: list, audio_prompt_path=None, exaggeration=0.5, cfg_weight=0.5, **kwargs):
+        # One forward pass: fixed cost plus a small cost for every extra sequence
+        if audio_prompt_path:
+            self.prepare_conditionals(audio_prompt_path, exaggeration=exaggeration)
+        self.used_conds.append(self.conds)
+        self._busy(
+            sample(self.delay) + self.batch_item_delay * (len(texts) - 1) + self.char_delay * max(map(len, texts))
+        )
+        return [self._silence(text) for text in texts]
+
+
+class StubWhisper(_Stub):
+    """Stands in for a Whisper model: sleeps for a fixed time and returns a fixed transcript"""
+
+    def __init__(self, delay: float = 0.2, text: str = "What is the meaning of life?"):
+        super().__init__()
+        self.delay = delay
+        self.text = text
+
+    def transcribe(self, audio, **kwargs):
+        self._busy(sample(self.delay))
+        return {"text": self.text}
+
+
+class StubChat(_Stub):
+    """Stands in for ollama.chat: sleeps, then echoes the user message inside a fixed reply
+
+    ``delay`` is the fixed per-request overhead and ``token_delay`` the time per generated word.
+    ``prompt_token_delay`` is the time to evaluate each prompt word that isn't a prefix of the
+    previous prompt and reply, like a server that keeps the last request's state cached.
+    With ``stream=True`` the reply is yielded word by word like Ollama's streaming chat.
+    ``options={"num_predict": n}`` stops the reply after ``n`` words, as Ollama stops after ``n`` tokens.
+    """
+
+    def __init__(
+        self,
+        delay: float = 0.2,
+        reply: str = "Well, you see, {text} is like asking what a wave means.",
+        token_delay: float = 0.0,
+        prompt_token_delay: float = 0.0,
+    ):
+        super().__init__()
+        self.delay = delay
+        self.reply = reply
+        self.token_delay = token_delay
+        self.prompt_token_delay = prompt_token_delay
+        self.prompt_evals = []  # (prompt tokens, evaluated tokens, seconds) per call
+        self._cached_prompt = []
+        self._lock = threading.Lock()
+
+    def __call__(self, model: str, messages: list, stream: bool = False, options: dict = None, **kwargs):
+        content = self.reply.format(text=messages[-1]["content"])
+        limit = (options or {}).get("num_predict")
+        if limit:
+            content = " ".join(content.split(" ")[:limit])
+        prompt_seconds, evaluated = self._evaluate_prompt(messages, content)
+        if stream:
+            return self._stream(content, prompt_seconds)
+        self._busy(sample(self.delay) + prompt_seconds + self.token_delay * len(content.split()))
+        return {
+            "message": {"role": "assistant", "content": content},
+            "prompt_eval_count": evaluated,
+            "prompt_eval_duration": int(prompt_seconds * 1e9),
+        }
+
+    def _evaluate_prompt(self, messages: list, content: str) -> tuple:
+        """Return the time to evaluate the prompt and how many of its tokens weren't cached"""
+        prompt = " ".join(f"{m['role']}: {m['content']}" for m in messages).split()
+        with self._lock:
+            common = 0
+            for cached, token in zip(self._cached_prompt, prompt):
+                if cached != token:
+                    break
+                common += 1
+            # The generated reply stays in the cache after the prompt
+            self._cached_prompt = prompt + f"assistant: {content}".split()
+        evaluated = len(prompt) - common
+        seconds = evaluated * self.prompt_token_delay
+        self.prompt_evals.append((len(prompt), evaluated, seconds))
+        return seconds, evaluated
+
+    def _stream(self, content: str, prompt_seconds: float = 0.0):
+        self._busy(sample(self.delay) + prompt_seconds)
+        for word in content.split(" "):
+            time.sleep(self.token_delay)
+            self.durations[-1] += self.token_delay
+            yield {"message": {"role": "assistant", "content": word + " "}, "done": False}
+        yield {"message": {"role": "assistant", "content": ""}, "done": True}
+
+
+class FakeMessage:
+    """Records everything the bot sends in reply to a message"""
+
+    def __init__(self, text: str = None, voice=None, audio=None, sent: list = None):
+        self.text = text
+        self.voice = voice
+        self.audio = audio
+        self.sent = sent if sent is not None else []
+
+    async def reply_text(self, text, **kwargs):
+        reply = FakeMessage(text, sent=self.sent)
+        self.sent.append(("text", text, time.perf_counter()))
+        return reply
+
+    async def reply_voice(self, voice, **kwargs):
+        self.sent.append(("voice", kwargs.get("duration"), time.perf_counter()))
+        return FakeMessage(sent=self.sent)
+
+    async def edit_text(self, text, **kwargs):
+        self.text = text
+        self.sent.append(("edit", text, time.perf_counter()))
+        return self
+
+    async def delete(self):
+        self.sent.append(("delete", self.text, time.perf_counter()))
+        return True
+
+
+class FakeFile:
+    """Stands in for telegram.File with in-memory content"""
+
+    def __init__(self, content: bytes = b""):
+        self.content = content
+
+    async def download_to_drive(self, path):
+        with open(path, "wb") as f:
+            f.write(self.content)
+        return path
+
+    async def download_as_bytearray(self, buf=None):
+        return bytearray(self.content)
+
+
+class FakeVoice:
+    """Stands in for telegram.Voice"""
+
+    def __init__(self, content: bytes = b"", duration: int = 3, file_unique_id: str = "voice"):
+        self.content = content
+        self.duration = duration
+        self.file_unique_id = file_unique_id
+        self.downloads = 0
+
+    async def get_file(self):
+        self.downloads += 1
+        return FakeFile(self.content)
+
+
+def fake_update(user_id: int = 1, text: str = None, voice: FakeVoice = None):
+    """Build an object shaped like telegram.Update for a text or voice message"""
+    message = FakeMessage(text=text, voice=voice)
+    return SimpleNamespace(message=message, effective_user=SimpleNamespace(id=user_id))
+
+
+def fake_context(user_data: dict = None, args: list = None):
+    """Build an object shaped like ContextTypes.DEFAULT_TYPE"""
+    return SimpleNamespace(user_data=user_data if user_data is not None else {}, args=args or [], error=None)
@@ -1,11 +1,13 @@
 #!/usr/bin/env python3
 
+import asyncio
+import functools
 import logging
 import os
 import time
 from pathlib import Path
 
-import torchaudio as ta
+import torch
 import whisper
 from chatterbox.tts import ChatterboxTTS
 from dotenv import load_dotenv
@@ -13,6 +15,24 @@ from ollama import chat
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, filters
 
+from asr import ASRService
+from audio_io import WHISPER_SAMPLE_RATE, decode_audio, encode_voice, opus_bitrate
+from conversation import ConversationMemory
+from cpu_profile import CPUProfile
+from inference import InferencePool, QueueFullError
+from llm_client import OllamaPool
+from load_policy import FULL, LoadPolicy, brief
+from metrics import metrics, start_http_server
+from model_manager import ModelManager, pick_device
+from parallel_tts import ParallelTTS
+from response_cache import ResponseCache
+from scheduler import RequestScheduler
+from streaming import SentenceSplitter, stream_chat
+from transcript_cache import TranscriptCache, fingerprint
+from tts_batching import TTSBatcher
+from user_store import SQLitePersistence, UserStore
+from voice_cache import VoiceConditioningCache
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -25,30 +45,120 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 
 DEFAULT_VOICE = "config/voice/watts-1m.mp3"  # Default audio prompt for Alan Watts voice
 DEFAULT_PERSONALITY = "config/personality/alan-watts-personality-chatgpt.txt"
+STREAM_EDIT_INTERVAL = 1.0  # Minimum seconds between progressive text edits (Telegram rate limits)
+SUMMARY_PROMPT = (
+    "You keep notes on a conversation between a user and Alan Watts. Update the notes with the new exchanges, "
+    "keeping names, facts about the user and the threads of the discussion. Reply with the notes only."
+)
+
+
+def load_tts(device: str):
+    """Load the ChatterboxTTS model, applying the CPU profile on CPU-only hosts"""
+    model = ChatterboxTTS.from_pretrained(device=device)
+    return CPUProfile.from_env().optimize_tts(model) if device == "cpu" else model
+
+
+def load_asr(device: str):
+    """Load the default Whisper model (other ASR backends load their models themselves)"""
+    if os.getenv("ASR_BACKEND", "whisper") != "whisper":
+        return None
+    # Whisper does not support MPS, so it runs on the CPU there
+    device = "cpu" if device == "mps" else device
+    model = whisper.load_model(os.getenv("ASR_MODEL_SIZE", "base"), device=device)
+    return CPUProfile.from_env().optimize_asr(model) if device == "cpu" else model
 
 
 class AlanWatts:
-    def __init__(self, token: str):
+    def __init__(
+        self,
+        token: str,
+        model=None,
+        whisper_model=None,
+        chat_fn=None,
+        inference: InferencePool = None,
+        loaders: dict = None,
+        device: str = None,
+        audio_models: bool = True,
+    ):
         self.token = token
         self.watts_voice = DEFAULT_VOICE  # Default audio prompt
         self.temp_dir = Path("temp")
         self.temp_dir.mkdir(exist_ok=True)  # Create temp directory if it doesn't exist
-        self.ollama_model = "llama3"  # Default Ollama model
+        self.ollama_model = os.getenv("OLLAMA_MODEL", "llama3")  # Default Ollama model
         self.alan_watts_personality = self._load_personality()
+        # Several Ollama hosts are load balanced by an async client; otherwise the local server is called directly
+        self.llm = OllamaPool.from_env() if chat_fn is None and os.getenv("OLLAMA_HOSTS") else None
+        self.chat = chat_fn or (self.llm.chat if self.llm else chat)  # Blocking or async Ollama chat function
+        # Keep the LLM loaded between requests so its cached personality prompt is reused
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        # Per-user history under a token budget, older turns summarized in the background
+        self.memory = ConversationMemory.from_env(self._summarize)
+
+        # Messages are admitted fairly across users; rapid messages from one user are merged
+        self.scheduler = RequestScheduler.from_env()
+        # A message starting with this marker replaces the user's unfinished requests
+        self.supersede_prefix = os.getenv("SUPERSEDE_PREFIX", "!")
+
+        # Blocking model calls run in per-stage worker pools so the event loop stays responsive
+        self.inference = inference or InferencePool.from_env()
+        metrics.queue_depth.add_callback(
+            lambda: {(("stage", name),): self.inference.depth(name) for name in self.inference.stages}
+        )
+        # Under load, replies are shortened or sent as text first so they arrive within LOAD_DEADLINE_SECONDS
+        self.load_policy = LoadPolicy.from_env(self.inference)
+        self._deferred_audio = set()  # Voice notes still being synthesized after their text was sent
 
         # Default TTS parameters
         self.default_exaggeration = 0.7
         self.default_cfg_weight = 0.3
 
-        # Initialize TTS model immediately
-        logger.info("Loading ChatterboxTTS model...")
-        self.model = ChatterboxTTS.from_pretrained(device="cuda")
-        logger.info("Model loaded successfully!")
+        # Stream the reply sentence by sentence instead of waiting for the full pipeline
+        self.stream_replies = os.getenv("STREAM_REPLIES", "0") == "1"
+        # "segments" sends a voice note per sentence, "stitched" sends one voice note at the end
+        self.stream_audio_mode = os.getenv("STREAM_AUDIO_MODE", "segments")
+        # Bitrate of the OGG/Opus voice notes we send
+        self.opus_bitrate = opus_bitrate()
+
+        # Replies and voice notes for repeated questions are served from disk when enabled
+        self.response_cache = ResponseCache.from_env()
+        # Transcripts of voice notes, so forwarded and re-uploaded ones are not transcribed again
+        self.transcripts = TranscriptCache.from_env()
+
+        # Audio models and the components built on them are set once the models are loaded
+        self.device = pick_device(device)
+        # Quantized models and explicit thread counts for CPU-only hosts
+        self.cpu_profile = CPUProfile.from_env() if self.device == "cpu" else None
+        if self.cpu_profile is not None:
+            self.cpu_profile.apply_threads()
+        self.model = None
+        self.whisper_model = None
+        self.voice_cache = None
+        self.tts_batcher = None
+        self.parallel_tts = None
+        self.asr = None
+        # Whisper sizes other than the default can only be loaded when we load Whisper ourselves
+        self._load_missing_whisper = whisper_model is None
+
+        self.models = ModelManager(
+            loaders={"tts": self._load_tts, "asr": self._load_asr, **(loaders or {})},
+            on_loaded=self._on_model_loaded,
+            warmups={"tts": self._warm_tts, "asr": self._warm_asr},
+        )
+
+        # Models passed in directly are ready before the bot starts accepting updates
+        for name, preloaded in [("tts", model), ("asr", whisper_model)]:
+            if preloaded is not None:
+                self.models.loaders[name] = lambda preloaded=preloaded: preloaded
+                self.models.load_now(name, warmup=False)
+
+        # Text-only tools such as `batch_generate.py --text-only` don't load the audio models at all
+        if not audio_models:
+            for name in ("tts", "asr"):
+                if self.models.status[name] == "pending":
+                    self.models.skip(name)
 
-        # Initialize Whisper model for ASR
-        logger.info("Loading Whisper ASR model...")
-        self.whisper_model = whisper.load_model("base")
-        logger.info("Whisper model loaded successfully!")
+        # Load the remaining models in the background; text replies work while they warm up
+        self.models.start()
 
     def _load_personality(self) -> str:
         """Load Alan Watts personality from config file"""
@@ -66,6 +176,80 @@ class AlanWatts:
 
         return personality
 
+    def _load_tts(self):
+        return load_tts(self.device)
+
+    def _load_asr(self):
+        return load_asr(self.device)
+
+    def _on_model_loaded(self, name: str, model):
+        """Build the components that depend on a freshly loaded model"""
+        if name == "tts":
+            # Speaker conditionings are computed once per voice prompt and reused
+            self.voice_cache = VoiceConditioningCache.from_env(model)
+            # Concurrent synthesis requests with the same voice are grouped into batches
+            self.tts_batcher = TTSBatcher.from_env(model, self.inference, voice_cache=self.voice_cache)
+            # On CPU, long replies can be split into chunks synthesized by a pool of worker processes
+            if self.device == "cpu":
+                self.parallel_tts = ParallelTTS.from_env(functools.partial(load_tts, "cpu"), model.sr)
+                if self.parallel_tts is not None:
+                    self.parallel_tts.start()
+            self.model = model
+        elif name == "asr":
+            self.asr = ASRService.from_env(
+                self.inference,
+                # Neither Whisper backend supports MPS, so ASR runs on the CPU there
+                device="cpu" if self.device == "mps" else self.device,
+                model=model,
+                load_missing=self._load_missing_whisper,
+                optimize=self.cpu_profile.optimize_asr if self.cpu_profile else None,
+                cpu_threads=(self.cpu_profile.threads or 0) if self.cpu_profile else 0,
+            )
+            self.whisper_model = model
+
+    def _warm_tts(self, model):
+        """Precompute the default Alan Watts voice and run a short synthesis"""
+        if not os.path.exists(self.watts_voice):
+            return
+        with self.voice_cache.conditioned(self.watts_voice, self.default_exaggeration) as conditioned:
+            with torch.inference_mode():
+                conditioned.generate(
+                    "Hello.", exaggeration=self.default_exaggeration, cfg_weight=self.default_cfg_weight
+                )
+        logger.info("Default voice conditioning ready")
+
+    def _warm_asr(self, model):
+        """Run a short transcription of silence"""
+        with torch.inference_mode():
+            self.asr.backend.transcribe(torch.zeros(WHISPER_SAMPLE_RATE), self.asr.policy.default)
+
+    def _queue_notifier(self, message):
+        """Return a callback that tells the user their position in an inference queue"""
+
+        async def notify(position: int):
+            try:
+                await message.edit_text(
+                    f"_Many seekers are here today. You are #{position} in line_ ⏳", parse_mode="Markdown"
+                )
+            except Exception as e:
+                logger.warning(f"Could not update queue position: {e}")
+
+        return notify
+
+    async def _reply_warming_up(self, update: Update, what: str):
+        """Tell the user an audio model is still loading"""
+        await update.message.reply_text(
+            f"🌅 _My {what} is still warming up. For now I can only answer in writing._", parse_mode="Markdown"
+        )
+
+    async def _reply_busy(self, update: Update, stage: str):
+        """Tell the user the bot is overloaded"""
+        logger.warning(f"Rejecting request: {stage} queue is full")
+        metrics.rejected.inc(stage=stage)
+        await update.message.reply_text(
+            "🌊 *Too many conversations are flowing at once.* Please try again in a moment.", parse_mode="Markdown"
+        )
+
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
         welcome_text = (
@@ -82,7 +266,8 @@ class AlanWatts:
             "`/exaggeration` - Adjust voice expressiveness (0.0-2.0)\n"
             "`/cfg_weight` - Adjust voice precision (0.0-1.0)\n"
             "`/set_voice` - Teach me to speak with your voice\n"
-            "`/reset_voice` - Return to my default Alan Watts voice\n\n"
+            "`/reset_voice` - Return to my default Alan Watts voice\n"
+            "`/forget` - Start our conversation afresh\n\n"
             "_What mysteries shall we explore together today?_ 🌸"
         )
         await update.message.reply_text(welcome_text, parse_mode="Markdown")
@@ -104,13 +289,16 @@ class AlanWatts:
             "• Whatever questions dance in your mind\n\n"
             "*A few practical notes:*\n"
             "• I respond with both written thoughts and audio\n"
-            "• Shorter messages allow for quicker contemplation\n\n"
+            "• Shorter messages allow for quicker contemplation\n"
+            f"• Messages sent in quick succession are read together; start one with `{self.supersede_prefix}` to replace "
+            "what I am still preparing\n\n"
             "*Commands to guide our conversation:*\n"
             "`/set_voice` - Teach me to speak with your voice\n"
             "`/reset_voice` - Return to my default Alan Watts voice\n"
             "`/help` - Learn more about our communication\n"
             "`/exaggeration` - Adjust voice expressiveness (0.0-2.0)\n"
             "`/cfg_weight` - Adjust voice precision (0.0-1.0)\n"
+            "`/forget` - Start our conversation afresh\n"
             "_Remember, there are no foolish questions - only the beautiful curiosity of being human. "
             "What shall we explore together?_ 🌸"
         )
@@ -206,6 +394,9 @@ class AlanWatts:
 
     async def reset_voice_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /reset_voice command to revert to default Alan Watts voice"""
+        # Replies still being prepared would use the old voice
+        self.scheduler.cancel(update.effective_user.id)
+
         if "custom_voice" in context.user_data:
             # Get the custom voice file path before removing it
             custom_voice_path = context.user_data["custom_voice"]
@@ -216,6 +407,8 @@ class AlanWatts:
             # Delete the custom voice file if it exists
             try:
                 if Path(custom_voice_path).exists():
+                    if self.voice_cache is not None:
+                        self.voice_cache.evict(custom_voice_path)
                     os.unlink(custom_voice_path)
                     logger.info(f"Deleted custom voice file: {custom_voice_path}")
             except Exception as e:
@@ -233,6 +426,14 @@ class AlanWatts:
                 parse_mode="Markdown",
             )
 
+    async def forget_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /forget command to clear the conversation history"""
+        self.memory.forget(context.user_data)
+        await update.message.reply_text(
+            "🍃 *Our past words have drifted away like clouds.*\n\n_Let us begin again, with a fresh mind._",
+            parse_mode="Markdown",
+        )
+
     async def handle_audio(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle audio files for voice setting and voice message transcription"""
         if context.user_data.get("waiting_for_voice", False):
@@ -253,6 +454,14 @@ class AlanWatts:
                 # Download the audio file
                 await audio_file.download_to_drive(voice_path)
 
+                # Prepare the voice conditioning now so the first reply doesn't pay for it
+                exaggeration = context.user_data.get("exaggeration", self.default_exaggeration)
+                if self.models.is_ready("tts"):
+                    try:
+                        await self.inference.run("tts", self.voice_cache.get, voice_path, exaggeration)
+                    except Exception as e:
+                        logger.warning(f"Could not precompute custom voice conditioning: {e}")
+
                 # Update user's voice setting
                 context.user_data["custom_voice"] = voice_path
                 context.user_data["waiting_for_voice"] = False
@@ -269,48 +478,80 @@ class AlanWatts:
                 context.user_data["waiting_for_voice"] = False
         else:
             # User sent a voice message for transcription
-            try:
-                # Notify user that Watts is listening
-                listening_msg = await update.message.reply_text("🎧 I am listening to your audio...")
-
-                # Get the voice file
-                voice_file = await update.message.voice.get_file()
-
-                # Create temporary file for the voice message
-                user_id = update.effective_user.id
-                voice_filename = f"voice_msg_{user_id}_{int(time.time())}.ogg"
-                voice_path = self.temp_dir / voice_filename
-
-                # Download the voice file
-                await voice_file.download_to_drive(voice_path)
-
-                # Transcribe the audio using Whisper
-                logger.info("Transcribing voice message...")
-                result = self.whisper_model.transcribe(str(voice_path))
-                transcribed_text = result["text"].strip()
-
-                logger.info(f"Transcribed text: {transcribed_text}")
-
-                # Clean up the voice file
-                os.unlink(voice_path)
-
-                # Update the listening message
-                await listening_msg.edit_text(f'🎧 I heard: "{transcribed_text}"\n\n')
-
-                # Process the transcribed text as if it were a text message
-                await self._process_text_message(update, context, transcribed_text)
+            voice = update.message.voice or update.message.audio
+            # Forwarded voice notes keep their file_unique_id, so a known one needs no download or ASR
+            file_unique_id = getattr(voice, "file_unique_id", None)
+            cached_text = (
+                await asyncio.to_thread(self.transcripts.get, file_unique_id=file_unique_id) if file_unique_id else None
+            )
+            if cached_text is None and not self.models.is_ready("asr"):
+                await self._reply_warming_up(update, "hearing")
+                return
 
-            except Exception as e:
-                logger.error(f"Error transcribing voice message: {e}")
-                await update.message.reply_text(
-                    "❌ *Sorry, I couldn't understand your voice message.* Please try again or send a text message.",
-                    parse_mode="Markdown",
-                )
-                if voice_path.exists():
-                    os.unlink(voice_path)
+            with metrics.request(update.effective_user.id, "voice"):
+                try:
+                    # Notify user that Watts is listening
+                    listening_msg = await update.message.reply_text("🎧 I am listening to your audio...")
+
+                    if cached_text is not None:
+                        metrics.annotate(transcript_cache="file")
+                        transcribed_text = cached_text
+                    else:
+                        transcribed_text = await self._transcribe_voice(voice, file_unique_id, listening_msg)
+
+                    logger.info(f"Transcribed text: {transcribed_text}")
+
+                    # Update the listening message
+                    await listening_msg.edit_text(f'🎧 I heard: "{transcribed_text}"\n\n')
+
+                    # Process the transcribed text as if it were a text message
+                    await self._schedule(update, context, transcribed_text)
+
+                except QueueFullError as e:
+                    await self._reply_busy(update, e.stage)
+
+                except Exception as e:
+                    logger.error(f"Error transcribing voice message: {e}")
+                    metrics.errors.inc(stage="asr")
+                    await update.message.reply_text(
+                        "❌ *Sorry, I couldn't understand your voice message.* Please try again or send a text message.",
+                        parse_mode="Markdown",
+                    )
+
+    async def _transcribe_voice(self, voice, file_unique_id: str, listening_msg) -> str:
+        """Download, decode and transcribe a voice note, reusing the transcript of identical audio"""
+        # Download the voice message into memory
+        with metrics.stage("download"):
+            voice_file = await voice.get_file()
+            data = bytes(await voice_file.download_as_bytearray())
+        metrics.audio_bytes.observe(len(data), direction="in")
+
+        # Decode in memory; the same audio uploaded as a new file is recognized by its fingerprint
+        with metrics.stage("decode"):
+            audio = await asyncio.to_thread(decode_audio, data, WHISPER_SAMPLE_RATE)
+            audio_fingerprint = await asyncio.to_thread(fingerprint, audio)
+        transcribed_text = await asyncio.to_thread(self.transcripts.get, audio_fingerprint=audio_fingerprint)
+        if transcribed_text is not None:
+            metrics.annotate(transcript_cache="audio")
+            await asyncio.to_thread(self.transcripts.put, transcribed_text, file_unique_id=file_unique_id)
+            return transcribed_text
+
+        logger.info("Transcribing voice message...")
+        plan = self._plan("asr", asr=True)
+        with metrics.stage("asr"):
+            transcribed_text, size = await self.asr.transcribe_with_size(
+                audio, on_queued=self._queue_notifier(listening_msg), prefer_fast=plan.fast_asr
+            )
+        # Transcripts of the fast model are not kept, so a rough one made under load is not reused later
+        if transcribed_text and size == self.asr.policy.default:
+            await asyncio.to_thread(
+                self.transcripts.put, transcribed_text, file_unique_id=file_unique_id, audio_fingerprint=audio_fingerprint
+            )
+        return transcribed_text
 
     async def _process_text_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_text: str):
         """Process a text message (either from text input or voice transcription)"""
+        progress_message = None
         try:
             if len(user_text) > 1000:
                 await update.message.reply_text(
@@ -323,85 +564,387 @@ class AlanWatts:
                 "_I need a moment to contemplate_ 🤔", parse_mode="Markdown"
             )
 
-            # Generate AI response using Ollama
-            logger.info(f"Generating AI response for: {user_text[:50]}...")
-            try:
-                response = chat(
-                    model=self.ollama_model,
-                    messages=[
-                        {"role": "system", "content": self.alan_watts_personality},
-                        {"role": "user", "content": user_text},
-                    ],
-                )
-                ai_response = response["message"]["content"]
-                logger.info(f"AI response generated: {ai_response[:50]}...")
-            except Exception as e:
-                logger.error(f"Error generating AI response: {e}")
-                await progress_message.edit_text(
-                    "❌ *Error generating AI response.* Converting your original message to speech instead...",
-                    parse_mode="Markdown",
-                )
-                ai_response = user_text  # Fallback to original text
+            # Get user's voice and TTS settings
+            voice = self._voice_settings(context)
+            # How much of the pipeline fits in the time left before the deadline
+            plan = self._plan("reply")
+
+            # Reuse a cached reply for questions we have answered before, unless they depend on earlier turns
+            reply_key = self._reply_cache_key(user_text) if self.memory.is_empty(context.user_data) else None
+            ai_response = await asyncio.to_thread(self.response_cache.get_reply, reply_key) if reply_key else None
+
+            if ai_response is not None:
+                logger.info(f"Using cached AI response: {ai_response[:50]}...")
+                metrics.annotate(reply_cache_hit=True)
+                self.memory.record(update.effective_user.id, context.user_data, user_text, ai_response)
+
+            elif self.stream_replies and self.models.is_ready("tts"):
+                messages = self.memory.messages(context.user_data, self.alan_watts_personality, user_text)
+                ai_response = await self._stream_reply(update, user_text, messages, progress_message, voice, plan)
+                if ai_response:
+                    self._observe_reply(ai_response, plan)
+                    self.memory.record(update.effective_user.id, context.user_data, user_text, ai_response)
+                if reply_key and ai_response:
+                    await asyncio.to_thread(self.response_cache.put_reply, reply_key, ai_response)
+                logger.info("AI response streamed successfully")
+                return
 
-            # Get user's custom voice or use default
-            audio_prompt = context.user_data.get("custom_voice", self.watts_voice)
+            else:
+                # Generate AI response using Ollama
+                logger.info(f"Generating AI response for: {user_text[:50]}...")
+                try:
+                    with metrics.stage("llm"):
+                        response = await self.inference.run(
+                            "llm",
+                            self.chat,
+                            model=self.ollama_model,
+                            on_queued=self._queue_notifier(progress_message),
+                            **self._llm_request(context, user_text, plan),
+                        )
+                    ai_response = response["message"]["content"]
+                    self._record_llm_speed(response)
+                    self._observe_reply(ai_response, plan)
+                    self.memory.record(update.effective_user.id, context.user_data, user_text, ai_response)
+                    logger.info(f"AI response generated: {ai_response[:50]}...")
+                    if reply_key:
+                        await asyncio.to_thread(self.response_cache.put_reply, reply_key, ai_response)
+                except QueueFullError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Error generating AI response: {e}")
+                    metrics.errors.inc(stage="llm")
+                    await progress_message.edit_text(
+                        "❌ *Error generating AI response.* Converting your original message to speech instead...",
+                        parse_mode="Markdown",
+                    )
+                    ai_response = user_text  # Fallback to original text
+
+            if not self.models.is_ready("tts"):
+                # Answer in writing while the voice model is still loading
+                if len(ai_response) <= 4096:  # Telegram message limit
+                    await update.message.reply_text(f"{ai_response}")
+                await self._reply_warming_up(update, "voice")
+                await progress_message.delete()
+                logger.info("AI response sent as text only (TTS model not ready)")
+                return
 
-            # Get user's exaggeration and cfg_weight settings
-            exaggeration = context.user_data.get("exaggeration", self.default_exaggeration)
-            cfg_weight = context.user_data.get("cfg_weight", self.default_cfg_weight)
+            if not plan.speaks(ai_response):
+                # Too long to voice in time under the current load
+                if len(ai_response) <= 4096:  # Telegram message limit
+                    await update.message.reply_text(f"{ai_response}")
+                await progress_message.delete()
+                logger.info(f"AI response sent as text only ({len(ai_response)} characters under load)")
+                return
 
             await progress_message.edit_text("_I am recording a message_ 🎙️", parse_mode="Markdown")
 
-            # Generate Alan Watts speech
-            logger.info(f"Generating speech for response: {ai_response[:50]}...")
-            wav = self.model.generate(
-                ai_response,
-                audio_prompt_path=audio_prompt,
-                exaggeration=exaggeration,
-                cfg_weight=cfg_weight,
-            )
+            # Reuse a cached voice note for the same reply, voice and parameters
+            audio_key = self._audio_cache_key(ai_response, voice)
+            cached_audio = await asyncio.to_thread(self.response_cache.get_audio, audio_key) if audio_key else None
+            metrics.annotate(audio_cache_hit=cached_audio is not None)
+
+            if cached_audio is None and plan.defer_audio:
+                # Send the text now and the voice note once it is synthesized
+                if len(ai_response) <= 4096:  # Telegram message limit
+                    await update.message.reply_text(f"{ai_response}")
+                task = asyncio.create_task(self._send_audio_later(update, ai_response, voice, audio_key))
+                self._deferred_audio.add(task)
+                task.add_done_callback(self._deferred_audio.discard)
+                await progress_message.delete()
+                logger.info("AI response text sent, voice note to follow")
+                return
 
-            # Save to temporary file in project temp directory
-            temp_filename = f"tts_{update.effective_user.id}_{hash(ai_response[:50])}_{int(time.time())}.wav"
-            temp_path = self.temp_dir / temp_filename
-            ta.save(temp_path, wav, self.model.sr)
+            if cached_audio is None:
+                # Generate Alan Watts speech
+                logger.info(f"Generating speech for response: {ai_response[:50]}...")
+                wav = await self._synthesize(ai_response, voice, on_queued=self._queue_notifier(progress_message))
 
             # Send the AI response as text first
             if len(ai_response) <= 4096:  # Telegram message limit
                 await update.message.reply_text(f"{ai_response}")
 
-            # Send the audio file as voice message
-            with open(temp_path, "rb") as audio_file:
-                await update.message.reply_voice(
-                    voice=audio_file,
-                    duration=int(len(wav) / self.model.sr),  # Duration in seconds
-                )
-
-            # Clean up
-            os.unlink(temp_path)
+            # Send the audio as voice message
+            if cached_audio is None:
+                data, duration = await self._send_waveform(update, wav)
+                if audio_key:
+                    await asyncio.to_thread(self.response_cache.put_audio, audio_key, data, duration)
+            else:
+                await self._send_voice(update, *cached_audio)
             await progress_message.delete()
 
             logger.info("AI response generated and sent successfully")
+            logger.debug(f"Voice cache stats: {self.voice_cache.stats()}")
+            if self.response_cache:
+                logger.debug(f"Response cache stats: {self.response_cache.stats()}")
+
+        except QueueFullError as e:
+            await self._reply_busy(update, e.stage)
+
+        except asyncio.CancelledError:
+            # Cancelled by the scheduler: the user reset their voice or sent a superseding message
+            logger.info(f"Cancelled reply to user {update.effective_user.id}")
+            if progress_message is not None:
+                try:
+                    await progress_message.delete()
+                except Exception as e:
+                    logger.warning(f"Could not delete progress message: {e}")
+            raise
 
         except Exception as e:
             logger.error(f"Error processing message: {e}")
+            metrics.errors.inc(stage="pipeline")
             await update.message.reply_text(
                 "❌ *Sorry, there was an error processing your message.* Please try again.", parse_mode="Markdown"
             )
 
+    def _plan(self, point: str, asr: bool = False):
+        """The load policy's plan for the current request, or the full pipeline without a policy"""
+        return self.load_policy.plan(point, asr=asr) if self.load_policy else FULL
+
+    def _llm_request(self, context: ContextTypes.DEFAULT_TYPE, user_text: str, plan) -> dict:
+        """Messages and options for the reply LLM request, shortened when the plan caps the reply"""
+        messages = self.memory.messages(context.user_data, self.alan_watts_personality, user_text)
+        request = {"messages": messages, "keep_alive": self.keep_alive}
+        if plan.max_tokens:
+            request["messages"] = brief(messages, plan.max_tokens)
+            request["options"] = {"num_predict": plan.max_tokens}
+        return request
+
+    def _observe_reply(self, ai_response: str, plan):
+        """Tell the load policy how long a reply was"""
+        if self.load_policy is not None:
+            self.load_policy.observe_reply(ai_response, capped=plan.max_tokens is not None)
+
+    async def _send_audio_later(self, update: Update, ai_response: str, voice: dict, audio_key):
+        """Synthesize and send the voice note of a reply whose text was already sent"""
+        try:
+            wav = await self._synthesize(ai_response, voice)
+            data, duration = await self._send_waveform(update, wav)
+            if audio_key:
+                await asyncio.to_thread(self.response_cache.put_audio, audio_key, data, duration)
+        except QueueFullError as e:
+            logger.warning(f"Dropping voice note: {e.stage} queue is full")
+            metrics.rejected.inc(stage=e.stage)
+        except Exception as e:
+            logger.error(f"Error sending voice note: {e}")
+            metrics.errors.inc(stage="tts")
+
+    async def _summarize(self, summary: str, transcript: str, max_tokens: int) -> str:
+        """Ask the LLM to fold new exchanges into a conversation summary"""
+        notes = f"Notes so far: {summary}\n\n" if summary else ""
+        response = await self.inference.run(
+            "llm",
+            self.chat,
+            model=self.ollama_model,
+            # Same personality prefix as replies, so the cached prompt state survives the summary request
+            messages=[
+                {"role": "system", "content": self.alan_watts_personality},
+                {"role": "user", "content": f"{SUMMARY_PROMPT}\n\n{notes}New exchanges:\n{transcript}"},
+            ],
+            keep_alive=self.keep_alive,
+            options={"num_predict": max_tokens},
+        )
+        return response["message"]["content"]
+
+    def _voice_settings(self, context: ContextTypes.DEFAULT_TYPE) -> dict:
+        """Return the user's voice prompt and TTS parameters as generate() keyword arguments"""
+        return {
+            "audio_prompt_path": context.user_data.get("custom_voice", self.watts_voice),
+            "exaggeration": context.user_data.get("exaggeration", self.default_exaggeration),
+            "cfg_weight": context.user_data.get("cfg_weight", self.default_cfg_weight),
+        }
+
+    def _reply_cache_key(self, user_text: str):
+        """Response cache key for a question, or None when caching is disabled"""
+        if self.response_cache is None:
+            return None
+        return ResponseCache.reply_key(user_text, self.ollama_model, self.alan_watts_personality)
+
+    def _audio_cache_key(self, ai_response: str, voice: dict):
+        """Audio cache key for a reply spoken with the given voice settings, or None when caching is disabled"""
+        if self.response_cache is None:
+            return None
+        voice_digest = self.voice_cache.digest(voice["audio_prompt_path"])
+        return ResponseCache.audio_key(ai_response, voice_digest, voice["exaggeration"], voice["cfg_weight"])
+
+    def _record_llm_speed(self, response):
+        """Record generation speed from the eval statistics Ollama returns with a reply"""
+        try:
+            tokens, nanoseconds = response["eval_count"], response["eval_duration"]
+        except (KeyError, TypeError):
+            return
+        if tokens and nanoseconds:
+            metrics.llm_tokens_per_second.observe(tokens / (nanoseconds / 1e9))
+
+    async def _synthesize(self, text: str, voice: dict, on_queued=None):
+        """Synthesize speech for a text with the user's voice settings"""
+        if self.load_policy is not None:
+            self.load_policy.observe_speech(text)
+        with metrics.stage("tts"):
+            if self.parallel_tts is not None and len(text) >= self.parallel_tts.min_chars:
+                # Holds a TTS stage slot, so long replies count toward its depth, queue limit and service time
+                return await self.inference.run("tts", self.parallel_tts.generate, text, on_queued=on_queued, **voice)
+            return await self.tts_batcher.generate(text, on_queued=on_queued, **voice)
+
+    async def _send_voice(self, update: Update, data: bytes, duration: int):
+        """Send encoded audio as a voice message"""
+        with metrics.stage("upload"):
+            await update.message.reply_voice(voice=data, duration=duration)
+        metrics.audio_bytes.observe(len(data), direction="out")
+
+    async def _send_waveform(self, update: Update, wav) -> tuple:
+        """Encode and send a waveform as a voice message, returning (encoded audio, duration)"""
+        # Encode to OGG/Opus in memory, off the event loop
+        with metrics.stage("encode"):
+            data = await asyncio.to_thread(encode_voice, wav, self.model.sr, self.opus_bitrate)
+        duration = int(wav.shape[-1] / self.model.sr)  # Duration in seconds
+        await self._send_voice(update, data, duration)
+        return data, duration
+
+    async def _stream_reply(
+        self, update: Update, user_text: str, messages: list, progress_message, voice: dict, plan=FULL
+    ):
+        """Stream the LLM reply into per-sentence TTS and progressively updated Telegram messages
+
+        Under a plan that drops voice notes for long replies, only the text is streamed.
+
+        Returns the generated reply, or None if the LLM failed before finishing it.
+        """
+        splitter = SentenceSplitter()
+        speech = asyncio.Queue()  # TTS tasks in reply order, None when the reply is complete
+        sender = asyncio.create_task(self._send_speech(update, speech))
+        text_message = None
+        shown = ""
+        last_edit = 0.0
+
+        def speak(sentence: str):
+            # The reply's length is unknown while it streams, so a plan that may drop its voice note drops it
+            if plan.skip_audio_chars is None:
+                speech.put_nowait(asyncio.ensure_future(self._synthesize(sentence, voice)))
+
+        async def show(text: str):
+            nonlocal text_message, shown, last_edit
+            if text == shown or len(text) > 4096:  # Telegram message limit
+                return
+            if text_message is None:
+                text_message = await update.message.reply_text(text)
+                await progress_message.delete()
+            else:
+                text_message = await text_message.edit_text(text)
+            shown = text
+            last_edit = time.monotonic()
+
+        try:
+            ai_response = ""
+            complete = True
+            tokens = 0
+            llm_start = time.perf_counter()
+            try:
+                logger.info(f"Streaming AI response for: {user_text[:50]}...")
+                options = {"options": {"num_predict": plan.max_tokens}} if plan.max_tokens else {}
+                async for token in stream_chat(
+                    self.inference,
+                    self.chat,
+                    model=self.ollama_model,
+                    messages=brief(messages, plan.max_tokens) if plan.max_tokens else messages,
+                    keep_alive=self.keep_alive,
+                    on_queued=self._queue_notifier(progress_message),
+                    **options,
+                ):
+                    ai_response += token
+                    tokens += 1
+                    for sentence in splitter.feed(token):
+                        speak(sentence)
+                        if time.monotonic() - last_edit >= STREAM_EDIT_INTERVAL:
+                            await show(ai_response.strip())
+            except QueueFullError:
+                raise
+            except Exception as e:
+                logger.error(f"Error streaming AI response: {e}")
+                metrics.errors.inc(stage="llm")
+                complete = False
+                if not ai_response:
+                    await progress_message.edit_text(
+                        "❌ *Error generating AI response.* Converting your original message to speech instead...",
+                        parse_mode="Markdown",
+                    )
+                    ai_response = user_text  # Fallback to original text
+                    for sentence in splitter.feed(user_text):
+                        speak(sentence)
+
+            llm_elapsed = time.perf_counter() - llm_start
+            metrics.stage_seconds.observe(llm_elapsed, stage="llm")
+            if complete and tokens and llm_elapsed > 0:
+                # Streamed chunks are roughly one token each
+                metrics.llm_tokens_per_second.observe(tokens / llm_elapsed)
+
+            rest = splitter.flush()
+            if rest:
+                speak(rest)
+            await show(ai_response.strip())
+
+            speech.put_nowait(None)
+            await sender
+            return ai_response.strip() if complete else None
+        finally:
+            if not sender.done():
+                sender.cancel()
+                while not speech.empty():
+                    task = speech.get_nowait()
+                    if task is not None:
+                        task.cancel()
+
+    async def _send_speech(self, update: Update, speech: asyncio.Queue):
+        """Send synthesized sentences in order, one voice note each or stitched into one"""
+        wavs = []
+        while (task := await speech.get()) is not None:
+            wav = await task
+            if self.stream_audio_mode == "stitched":
+                wavs.append(wav)
+            else:
+                await self._send_waveform(update, wav)
+        if wavs:
+            await self._send_waveform(update, torch.cat(wavs, dim=-1))
+
     async def handle_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle text messages and convert to speech"""
         user_text = update.message.text
-        await self._process_text_message(update, context, user_text)
+        supersede = bool(self.supersede_prefix) and user_text.startswith(self.supersede_prefix)
+        if supersede:
+            user_text = user_text[len(self.supersede_prefix) :].strip()
+        with metrics.request(update.effective_user.id, "text"):
+            await self._schedule(update, context, user_text, supersede=supersede)
+
+    async def _schedule(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_text: str, supersede: bool = False
+    ):
+        """Process a message once the scheduler admits it, merged with the user's other recent messages"""
+        await self.scheduler.submit(
+            update.effective_user.id,
+            user_text,
+            lambda text: self._process_text_message(update, context, text),
+            supersede=supersede,
+        )
 
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle errors"""
         logger.error(f"Update {update} caused error {context.error}")
 
-    def revive(self):
-        """Revives Alan Watts"""
-        # Create application
-        app = Application.builder().token(self.token).build()
+    def build_application(self, persistence=None, updater: bool = True) -> Application:
+        """Create the Telegram application with all handlers registered
+
+        Without an updater the application only handles updates put on its update queue,
+        as the webhook workers do.
+        """
+        # Updates are handled concurrently; heavy inference is bounded by the inference pool
+        builder = Application.builder().token(self.token).concurrent_updates(True)
+        if persistence is not None:
+            builder = builder.persistence(persistence)
+        if not updater:
+            builder = builder.updater(None)
+        if self.llm is not None:
+            builder = builder.post_shutdown(lambda app: self.llm.aclose())
+        app = builder.build()
 
         # Add handlers
         app.add_handler(CommandHandler("start", self.start_command))
@@ -410,13 +953,33 @@ class AlanWatts:
         app.add_handler(CommandHandler("reset_voice", self.reset_voice_command))
         app.add_handler(CommandHandler("exaggeration", self.exaggeration_command))
         app.add_handler(CommandHandler("cfg_weight", self.cfg_weight_command))
+        app.add_handler(CommandHandler("forget", self.forget_command))
         app.add_handler(MessageHandler(filters.AUDIO | filters.VOICE, self.handle_audio))
         app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_text))
         app.add_error_handler(self.error_handler)
+        return app
+
+    def revive(self):
+        """Revives Alan Watts"""
+        # User settings and custom voices survive restarts when USER_STORE_PATH is set
+        store = UserStore.from_env()
+        app = self.build_application(persistence=SQLitePersistence(store) if store else None)
+
+        # Expose latency and resource metrics for Prometheus when METRICS_PORT is set
+        metrics.configure_from_env()
+        if os.getenv("METRICS_PORT"):
+            start_http_server(int(os.getenv("METRICS_PORT")))
 
         # Start the bot
         logger.info("Reviving Alan Watts")
-        app.run_polling(allowed_updates=Update.ALL_TYPES)
+        try:
+            app.run_polling(allowed_updates=Update.ALL_TYPES)
+        finally:
+            self.inference.shutdown()
+            if self.parallel_tts is not None:
+                self.parallel_tts.shutdown()
+            if store is not None:
+                store.close()
 
 
 def main():
@@ -0,0 +1,72 @@
+import asyncio
+import json
+import tempfile
+from pathlib import Path
+
+from batch_generate import BatchGenerator, print_report, read_jsonl, read_prompts
+from inference import InferencePool
+from response_cache import ResponseCache
+from stubs import StubChat, StubTTS, StubWhisper
+from telegram_bot import AlanWatts
+
+PROMPTS = 12
+
+
+async def main():
+    workdir = Path(tempfile.mkdtemp())
+    prompts_path = workdir / "prompts.jsonl"
+    with open(prompts_path, "w", encoding="utf-8") as f:
+        for i in range(PROMPTS):
+            f.write(json.dumps({"request_id": f"q-{i}", "title": f"Question {i}", "body": f"What is wave {i}?"}) + "\n")
+    prompts = read_prompts(prompts_path)
+    assert prompts[3] == {"id": "q-3", "text": "What is wave 3?"}
+
+    chat = StubChat(delay=0.1)
+    tts = StubTTS(delay=0.3, batch_item_delay=0.02, seconds_per_char=0.001, prepare_delay=0.0)
+    watts = AlanWatts("test-token", model=tts, whisper_model=StubWhisper(), chat_fn=chat, inference=InferencePool())
+    output = workdir / "out"
+
+    # Kill the first run part-way through
+    task = asyncio.create_task(BatchGenerator(watts, output).run(prompts))
+    while len(read_jsonl(output / "manifest.jsonl")) < 4:
+        await asyncio.sleep(0.05)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await asyncio.sleep(0.5)  # Let the stub calls already running in worker threads finish
+    finished = {record["id"] for record in read_jsonl(output / "manifest.jsonl")}
+    replied = {record["id"] for record in read_jsonl(output / "replies.jsonl")}
+    llm_calls = chat.calls
+    print(f"Killed after {len(finished)} finished prompts and {len(replied)} replies")
+
+    # The second run only generates what is missing, reusing checkpointed replies
+    results = await BatchGenerator(watts, output).run(prompts)
+    print_report(results)
+    manifest = read_jsonl(output / "manifest.jsonl")
+    assert sorted(record["id"] for record in manifest) == sorted(prompt["id"] for prompt in prompts)
+    assert results["skipped"] == len(finished) and results["generated"] == PROMPTS - len(finished)
+    assert results["stages"]["llm"]["items"] == PROMPTS - len(replied), "checkpointed replies are not regenerated"
+    assert chat.calls == llm_calls + PROMPTS - len(replied)
+    for record in manifest:
+        assert (output / record["text_file"]).read_text(encoding="utf-8").endswith("what a wave means.")
+        assert (output / record["audio_file"]).stat().st_size > 0
+    assert watts.tts_batcher.batches < watts.tts_batcher.requests, "syntheses should be batched"
+
+    # A finished run has nothing left to do
+    results = await BatchGenerator(watts, output).run(prompts)
+    assert results["generated"] == 0 and results["skipped"] == PROMPTS
+    watts.inference.shutdown()
+
+    # Text-only runs load no audio models, still seed the reply cache and don't send empty prompts to the LLM
+    chat = StubChat(delay=0.01)
+    watts = AlanWatts("test-token", chat_fn=chat, inference=InferencePool(), audio_models=False)
+    assert watts.models.status == {"tts": "skipped", "asr": "skipped"}
+    watts.response_cache = ResponseCache(workdir / "cache")
+    prompts = [{"id": "q-0", "text": "What is wave 0?"}, {"id": "empty", "text": ""}]
+    results = await BatchGenerator(watts, workdir / "text", audio=False).run(prompts)
+    print(f"Text-only: {results['generated']} generated, failed {results['failed']}")
+    assert results["generated"] == 1 and results["failed"] == ["empty"] and chat.calls == 1
+    assert watts.response_cache.get_reply(watts._reply_cache_key("What is wave 0?")).endswith("what a wave means.")
+    watts.inference.shutdown()
+
+
+asyncio.run(main())
@@ -0,0 +1,26 @@
+import asyncio
+
+from cpu_profile import CPUProfile
+from inference import InferencePool
+from stubs import StubChat, StubConditionals, StubTTS, StubWhisper
+from telegram_bot import AlanWatts
+
+
+async def main():
+    # A model optimized by the CPU profile still speaks with the cached conditioning of each voice
+    model = StubTTS(delay=0.0, prepare_delay=0.0)
+    model.conds = StubConditionals("BUILTIN", 0.5)
+    model = CPUProfile(quantize=False).optimize_tts(model)  # The stub has no layers to quantize
+    watts = AlanWatts("test-token", model=model, whisper_model=StubWhisper(), chat_fn=StubChat(), inference=InferencePool())
+    voice = {"audio_prompt_path": watts.watts_voice, "exaggeration": 0.7, "cfg_weight": 0.3}
+
+    await asyncio.gather(*(watts._synthesize("What is the self?", voice) for _ in range(3)))
+    used = [(conds.prompt_path, conds.exaggeration) for conds in model.used_conds]
+    print(f"generate used conds: {used}")
+    assert used == [(watts.watts_voice, 0.7)] * 3
+    assert model.conds.prompt_path == "BUILTIN", "the shared model keeps its own conditioning"
+    assert watts.voice_cache.stats()["entries"] == 1
+    watts.inference.shutdown()
+
+
+asyncio.run(main())
@@ -0,0 +1,43 @@
+import asyncio
+import time
+
+from inference import InferencePool
+from stubs import StubChat, StubTTS, StubWhisper, fake_context, fake_update
+from telegram_bot import AlanWatts
+
+# Slow stub models: every synthesis takes 2 seconds and only one can run at a time
+watts = AlanWatts(
+    "test-token",
+    model=StubTTS(delay=2.0),
+    whisper_model=StubWhisper(),
+    chat_fn=StubChat(delay=0.1),
+    inference=InferencePool(workers={"tts": 1}),
+)
+
+
+async def main():
+    # Four users ask questions at the same time, queueing up long synthesis jobs
+    updates = [fake_update(user_id=i, text=f"Question {i}") for i in range(4)]
+    jobs = [asyncio.create_task(watts.handle_text(u, fake_context())) for u in updates]
+    await asyncio.sleep(0.5)
+
+    # Meanwhile someone asks for help
+    start = time.perf_counter()
+    help_update = fake_update(user_id=99, text="/help")
+    await watts.help_command(help_update, fake_context())
+    help_latency = time.perf_counter() - start
+
+    await asyncio.gather(*jobs)
+
+    queued = [text for u in updates for kind, text, _ in u.message.sent if kind == "edit" and "in line" in text]
+    voices = [u for u in updates if any(kind == "voice" for kind, _, _ in u.message.sent)]
+
+    print(f"/help answered in {help_latency * 1000:.1f} ms while synthesis was running")
+    print(f"Queue notices: {queued}")
+    assert help_latency < 0.1, "/help was blocked by inference"
+    assert queued, "queued users should be told their position"
+    assert len(voices) == len(updates), "every user should receive a voice reply"
+
+
+asyncio.run(main())
+watts.inference.shutdown()
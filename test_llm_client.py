@@ -0,0 +1,144 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm_client import LLMUnavailableError, OllamaPool
+from stubs import StubTTS, StubWhisper, fake_context, fake_update
+from telegram_bot import AlanWatts
+
+
+def fake_ollama(delay: float = 0.05, fail: bool = False, reply: str = "The wave is the ocean."):
+    """Start a local server speaking enough of the Ollama API for the client; returns (url, server)"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self._send(500 if server.fail else 200, {"version": "0.0.0-fake"})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            server.requests += 1
+            time.sleep(server.delay)
+            if server.fail:
+                self._send(500, {"error": "model crashed"})
+                return
+            message = {"role": "assistant", "content": f"{body['model']}: {reply}"}
+            if not body.get("stream"):
+                self._send(200, {"model": body["model"], "message": message, "done": True, "eval_count": 5})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            words = message["content"].split(" ")
+            chunks = [{"message": {"role": "assistant", "content": word + " "}, "done": False} for word in words]
+            for chunk in chunks + [{"message": {"role": "assistant", "content": ""}, "done": True}]:
+                data = (json.dumps(chunk) + "\n").encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _send(self, status: int, payload: dict):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.delay, server.fail, server.requests = delay, fail, 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}", server
+
+
+MESSAGES = [{"role": "user", "content": "What is a wave?"}]
+
+
+async def timed_chats(pool: OllamaPool, count: int) -> list:
+    async def one():
+        start = time.perf_counter()
+        response = await pool.chat(model="llama3", messages=MESSAGES)
+        return time.perf_counter() - start, response
+
+    return await asyncio.gather(*(one() for _ in range(count)))
+
+
+async def main():
+    # Concurrent requests are spread over equally fast hosts
+    (url_a, a), (url_b, b) = fake_ollama(delay=0.2), fake_ollama(delay=0.2)
+    pool = OllamaPool([url_a, url_b], hedge_after=None)
+    results = await timed_chats(pool, 10)
+    print(f"Balanced: host A served {a.requests}, host B served {b.requests}")
+    assert a.requests == b.requests == 5
+    assert all(response["message"]["content"].endswith("The wave is the ocean.") for _, response in results)
+    await pool.aclose()
+
+    # A failing host is retried elsewhere and then avoided until it recovers
+    (url_bad, bad), (url_good, good) = fake_ollama(fail=True), fake_ollama()
+    pool = OllamaPool([url_bad, url_good], hedge_after=None)
+    results = await timed_chats(pool, 6)
+    assert len(results) == 6 and not pool.hosts[0].healthy
+    failed = bad.requests
+    await timed_chats(pool, 6)
+    print(f"Failing host: {bad.requests} request(s) hit it, healthy host served {good.requests}")
+    assert bad.requests == failed, "an unhealthy host gets no new requests"
+    bad.fail = False
+    await pool.check_health()
+    assert pool.hosts[0].healthy, "health check should bring the host back"
+    await pool.aclose()
+
+    # A slow host is hedged by a fast one
+    (url_slow, slow), (url_fast, fast) = fake_ollama(delay=3.0), fake_ollama(delay=0.05)
+    pool = OllamaPool([url_slow, url_fast], hedge_after=0.3)
+    pool.hosts[1].outstanding = 1  # Make the slow host the first choice
+    latency, _ = (await timed_chats(pool, 1))[0]
+    pool.hosts[1].outstanding = 0
+    print(f"Slow host hedged: answered in {latency:.2f}s after {pool.hedges} hedge(s)")
+    assert latency < 1.0 and pool.hedges == 1
+    await pool.aclose()
+
+    # Streaming yields chunks in order, and models can be pinned per host
+    url, _ = fake_ollama()
+    pool = OllamaPool([f"{url}=llama3:70b"])
+    tokens = [chunk["message"]["content"] async for chunk in await pool.chat("llama3", MESSAGES, stream=True)]
+    print(f"Streamed: {''.join(tokens)!r}")
+    assert "".join(tokens).strip() == "llama3:70b: The wave is the ocean."
+    await pool.aclose()
+
+    # Requests fail once every host has timed out
+    url, _ = fake_ollama(delay=3.0)
+    pool = OllamaPool([url], timeout=0.5, hedge_after=None)
+    start = time.perf_counter()
+    try:
+        await pool.chat("llama3", MESSAGES)
+        raise AssertionError("expected LLMUnavailableError")
+    except LLMUnavailableError as e:
+        print(f"Timed out after {time.perf_counter() - start:.2f}s: {e}")
+    assert time.perf_counter() - start < 1.5
+    await pool.aclose()
+
+    # The bot answers through the pool, both whole and streamed
+    (url_a, a), (url_b, b) = fake_ollama(), fake_ollama()
+    pool = OllamaPool([url_a, url_b])
+    watts = AlanWatts("test-token", model=StubTTS(delay=0.05), whisper_model=StubWhisper(), chat_fn=pool.chat)
+    for stream in [False, True]:
+        watts.stream_replies = stream
+        update = fake_update(text="What is a wave?")
+        await watts.handle_text(update, fake_context())
+        texts = [text for kind, text, _ in update.message.sent if kind == "text"]
+        assert any("The wave is the ocean." in text for text in texts), texts
+        assert any(kind == "voice" for kind, _, _ in update.message.sent)
+    print(f"Bot replies served by hosts: A={a.requests}, B={b.requests}")
+    watts.inference.shutdown()
+    await pool.aclose()
+
+
+asyncio.run(main())
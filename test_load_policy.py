@@ -0,0 +1,100 @@
+import asyncio
+import random
+import time
+
+from inference import InferencePool
+from load_policy import LoadPolicy
+from metrics import metrics
+from scheduler import RequestScheduler
+from stubs import StubChat, StubTTS, StubWhisper, fake_context, fake_update
+from telegram_bot import AlanWatts
+
+DEADLINE = 1.5  # Seconds until the reply text is sent
+BASE_RATE = 1.6  # Messages per second at 1x load
+SECONDS = 6  # Arrivals per run
+# A long reply: about 120 words take ~0.5s to generate and ~0.3s to synthesize
+REPLY = "Well, you see, {text} is like asking what a wave means. " + "The river does not hurry, yet it arrives. " * 13
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def simulate(load: float, policy: bool) -> dict:
+    """Send messages from many users as a Poisson stream and measure the time until each reply text"""
+    chat = StubChat(delay=0.025, reply=REPLY, token_delay=0.004)
+    tts = StubTTS(delay=0.025, char_delay=0.0004, seconds_per_char=0.001, prepare_delay=0.0)
+    watts = AlanWatts(
+        "test-token", model=tts, whisper_model=StubWhisper(), chat_fn=chat, inference=InferencePool(max_queue=64)
+    )
+    watts.scheduler = RequestScheduler(max_active=16, coalesce_ms=100)
+    watts.load_policy = LoadPolicy(watts.inference, DEADLINE, max_tokens=40) if policy else None
+
+    rng = random.Random(7)
+    latencies = []
+    updates = []
+
+    async def handle(user_id: int):
+        update = fake_update(user_id, text=f"What is wave {user_id}?")
+        updates.append(update)
+        start = time.perf_counter()
+        await watts.handle_text(update, fake_context())
+        replies = [at for kind, text, at in update.message.sent if kind == "text" and text.startswith("Well")]
+        latencies.append(replies[0] - start if replies else float("inf"))
+
+    # One message first, so the policy has seen each stage's service time, as after the bot's first replies
+    await watts.handle_text(fake_update(-1, text="What is a wave?"), fake_context())
+
+    tasks = []
+    elapsed = 0.0
+    start = time.perf_counter()
+    for user_id in range(10_000):
+        elapsed += rng.expovariate(BASE_RATE * load)
+        if elapsed > SECONDS:
+            break
+        await asyncio.sleep(max(0.0, start + elapsed - time.perf_counter()))
+        tasks.append(asyncio.create_task(handle(user_id)))
+    await asyncio.gather(*tasks)
+    await asyncio.gather(*watts._deferred_audio)
+    watts.inference.shutdown()
+
+    voice_notes = sum(kind == "voice" for update in updates for kind, _, _ in update.message.sent)
+    return {
+        "requests": len(latencies),
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "voice": voice_notes / len(latencies),
+    }
+
+
+def decisions() -> dict:
+    return {dict(key)["level"]: value for key, value in metrics.load_decisions._values.items()}
+
+
+async def main():
+    print(f"{'policy':>7} {'load':>5} {'requests':>9} {'p50':>6} {'p95':>6} {'voice':>6}  decisions")
+    results = {}
+    for load in (1, 2, 4):
+        before = decisions()
+        result = results[load] = await simulate(load, policy=True)
+        made = {level: count - before.get(level, 0) for level, count in decisions().items()}
+        made = {level: count for level, count in made.items() if count}
+        print(
+            f"{'on':>7} {load:>4}x {result['requests']:>9} {result['p50']:>5.2f}s {result['p95']:>5.2f}s "
+            f"{result['voice']:>6.0%}  {made}"
+        )
+        assert result["p95"] <= DEADLINE, f"p95 over the deadline at {load}x load"
+    baseline = await simulate(4, policy=False)
+    print(
+        f"{'off':>7} {4:>4}x {baseline['requests']:>9} {baseline['p50']:>5.2f}s {baseline['p95']:>5.2f}s "
+        f"{baseline['voice']:>6.0%}"
+    )
+
+    # Light load is served in full; heavier load is degraded instead of missing the deadline
+    assert results[1]["voice"] == 1.0
+    assert decisions().get("short", 0) + decisions().get("text_first", 0) > 0
+    assert baseline["p95"] > DEADLINE, "without the policy the full pipeline should miss the deadline at 4x"
+
+
+asyncio.run(main())
@@ -0,0 +1,68 @@
+import asyncio
+import json
+import tempfile
+import threading
+import urllib.request
+from pathlib import Path
+
+from metrics import Counter, Gauge, metrics, start_http_server
+from stubs import StubChat, StubTTS, StubWhisper, fake_context, fake_update
+from telegram_bot import AlanWatts
+
+# Handle a few text messages with stub models, then scrape the metrics endpoint
+trace_log = Path(tempfile.mkdtemp()) / "trace.jsonl"
+metrics.trace_log = trace_log
+server = start_http_server(0, host="127.0.0.1")
+port = server.server_address[1]
+
+watts = AlanWatts(
+    "test-token",
+    model=StubTTS(delay=0.2),
+    whisper_model=StubWhisper(delay=0.1),
+    chat_fn=StubChat(delay=0.3),
+)
+
+
+async def main():
+    updates = [fake_update(user_id=i, text=f"What is the self, part {i}?") for i in range(3)]
+    await asyncio.gather(*(watts.handle_text(update, fake_context()) for update in updates))
+
+
+asyncio.run(main())
+watts.inference.shutdown()
+
+with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+    body = response.read().decode()
+print(body)
+
+for stage in ["llm", "tts", "encode", "upload"]:
+    assert f'watts_stage_duration_seconds_count{{stage="{stage}"}} 3' in body, f"missing {stage} timings"
+assert 'watts_requests_total{kind="text"} 3' in body
+assert "watts_requests_in_flight 0" in body
+assert 'watts_inference_queue_depth{stage="tts"} 0' in body
+assert "watts_tts_real_time_factor_count" in body
+assert 'watts_audio_bytes_count{direction="out"} 3' in body
+
+traces = [json.loads(line) for line in trace_log.read_text().splitlines()]
+print(f"Trace of the first request: {traces[0]}")
+assert len(traces) == 3
+assert [span["stage"] for span in traces[0]["spans"]] == ["llm", "tts", "encode", "upload"]
+
+# Scrapes are safe while worker threads add new label sets
+counter, gauge = Counter("test_total", "Test"), Gauge("test_gauge", "Test")
+
+
+def add_labels():
+    for i in range(20000):
+        counter.inc(worker=i)
+        gauge.set(i, worker=i)
+
+
+writer = threading.Thread(target=add_labels)
+writer.start()
+while writer.is_alive():
+    counter.render()
+    gauge.render()
+writer.join()
+assert len(counter.render()) == len(gauge.render()) == 20002
+server.shutdown()
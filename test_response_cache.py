@@ -0,0 +1,67 @@
+import tempfile
+import time
+from pathlib import Path
+
+from response_cache import ResponseCache, normalize_text
+
+
+def main():
+    workdir = Path(tempfile.mkdtemp())
+
+    # Trivially different phrasings of a question share a key; other models and personalities don't
+    assert normalize_text("  What is   Zen?! ") == normalize_text("what is zen") == "what is zen"
+    key = ResponseCache.reply_key("What is Zen?", "llama3", "You are Alan Watts.")
+    assert key == ResponseCache.reply_key("what is  zen", "llama3", "You are Alan Watts.")
+    assert key != ResponseCache.reply_key("What is Zen?", "mistral", "You are Alan Watts.")
+    assert key != ResponseCache.reply_key("What is Zen?", "llama3", "You are someone else.")
+    assert ResponseCache.audio_key("Zen is...", "voice", 0.7, 0.3) != ResponseCache.audio_key("Zen is...", "voice", 0.5, 0.3)
+
+    # Replies and audio: a miss, then a hit
+    cache = ResponseCache(workdir / "cache")
+    assert cache.get_reply(key) is None
+    cache.put_reply(key, "Zen is the art of being here.")
+    assert cache.get_reply(key) == "Zen is the art of being here."
+    audio_key = ResponseCache.audio_key("Zen is the art of being here.", "voice", 0.7, 0.3)
+    assert cache.get_audio(audio_key) is None
+    cache.put_audio(audio_key, b"OggS" + bytes(100), 3)
+    assert cache.get_audio(audio_key) == (b"OggS" + bytes(100), 3)
+    stats = cache.stats()
+    assert stats["reply_hits"] == stats["reply_misses"] == stats["audio_hits"] == stats["audio_misses"] == 1
+
+    # Entries survive a restart; a missing audio file is a miss
+    cache = ResponseCache(workdir / "cache")
+    assert cache.get_reply(key) == "Zen is the art of being here."
+    (workdir / "cache" / "audio" / f"{audio_key}.bin").unlink()
+    assert cache.get_audio(audio_key) is None
+
+    # Several variants per question are served in rotation once all of them exist
+    cache = ResponseCache(workdir / "variants", variants=2)
+    cache.put_reply(key, "first")
+    assert cache.get_reply(key) is None, "a second variant is still wanted"
+    cache.put_reply(key, "second")
+    cache.put_reply(key, "third")  # Beyond the number of variants: ignored
+    assert {cache.get_reply(key), cache.get_reply(key)} == {"first", "second"}
+
+    # Expired entries are misses
+    cache = ResponseCache(workdir / "expiry", ttl=0.1)
+    cache.put_reply(key, "soon gone")
+    cache.put_audio(audio_key, bytes(10), 1)
+    time.sleep(0.2)
+    assert cache.get_reply(key) is None and cache.get_audio(audio_key) is None
+    assert not (workdir / "expiry" / "audio" / f"{audio_key}.bin").exists()
+
+    # Beyond the size limit the least recently used entries are evicted
+    cache = ResponseCache(workdir / "size", max_bytes=250)
+    keys = [ResponseCache.audio_key(f"reply {i}", "voice", 0.7, 0.3) for i in range(3)]
+    cache.put_audio(keys[0], bytes(100), 1)
+    cache.put_audio(keys[1], bytes(100), 1)
+    time.sleep(0.01)
+    cache.get_audio(keys[0])  # Now the most recently used
+    cache.put_audio(keys[2], bytes(100), 1)
+    assert cache.size() <= 250
+    assert cache.get_audio(keys[1]) is None
+    assert cache.get_audio(keys[0]) is not None and cache.get_audio(keys[2]) is not None
+    print(f"Response cache OK: {cache.stats()}")
+
+
+main()
@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+from inference import InferencePool
+from scheduler import RequestScheduler
+from stubs import StubChat, StubTTS, StubWhisper, fake_context, fake_update
+from telegram_bot import AlanWatts
+
+
+async def heavy_and_light(scheduler: RequestScheduler) -> tuple:
+    """One user sends ten messages, then three users send one each; returns completion times"""
+    start = time.perf_counter()
+    done = {}
+
+    async def job(name: str):
+        await asyncio.sleep(0.2)
+        done[name] = time.perf_counter() - start
+
+    heavy = [scheduler.submit(1, f"heavy {i}", lambda text, i=i: job(f"heavy {i}")) for i in range(10)]
+    heavy = [asyncio.create_task(coro) for coro in heavy]
+    await asyncio.sleep(0.05)
+    light = [
+        asyncio.create_task(scheduler.submit(user, "light", lambda text, u=user: job(f"light {u}"))) for user in (2, 3, 4)
+    ]
+    await asyncio.gather(*heavy, *light)
+    return done
+
+
+async def main():
+    # A heavy user cannot starve light users: each of them is served after at most one heavy job
+    done = await heavy_and_light(RequestScheduler(max_active=2, per_user=1, coalesce_ms=0, max_pending=100))
+    light = [done[f"light {user}"] for user in (2, 3, 4)]
+    print(f"Light users done after {', '.join(f'{t:.2f}s' for t in light)}; heavy user after {done['heavy 9']:.2f}s")
+    assert max(light) < 0.7, "light users should not wait for the heavy user's backlog"
+    assert done["heavy 9"] > 1.5
+
+    # With one slot, users take turns instead of being served first come, first served
+    order = []
+    scheduler = RequestScheduler(max_active=1, per_user=1, coalesce_ms=0, max_pending=100)
+
+    async def record(name: str):
+        order.append(name)
+        await asyncio.sleep(0.05)
+
+    jobs = [asyncio.create_task(scheduler.submit(1, "", lambda text, i=i: record(f"a{i}"))) for i in range(4)]
+    await asyncio.sleep(0.01)
+    jobs += [asyncio.create_task(scheduler.submit(2, "", lambda text, i=i: record(f"b{i}"))) for i in range(2)]
+    await asyncio.gather(*jobs)
+    print(f"Round-robin order: {order}")
+    # User 2 joins the line behind user 1's next job, then they alternate
+    assert order == ["a0", "a1", "b0", "a2", "b1", "a3"]
+
+    watts = AlanWatts(
+        "test-token",
+        model=StubTTS(delay=1.0),
+        whisper_model=StubWhisper(),
+        chat_fn=StubChat(delay=0.05),
+        inference=InferencePool(workers={"tts": 2}),
+    )
+    watts.scheduler = RequestScheduler(max_active=4, per_user=1, coalesce_ms=200)
+
+    # An idle user's message starts at once instead of waiting out the merge window
+    started = []
+    scheduler = RequestScheduler(coalesce_ms=1000)
+    start = time.perf_counter()
+    await scheduler.submit(4, "", lambda text: asyncio.sleep(0, started.append(time.perf_counter() - start)))
+    print(f"Idle user's message started after {started[0] * 1000:.1f} ms")
+    assert started[0] < 0.1
+
+    # Messages sent while a reply is in flight become one prompt and one reply
+    user_data = {}
+    updates = [fake_update(user_id=5, text=text) for text in ["Hello Alan.", "I have a question.", "What is Zen?"]]
+    jobs = []
+    for update in updates:
+        jobs.append(asyncio.create_task(watts.handle_text(update, fake_context(user_data))))
+        await asyncio.sleep(0.05)
+    await asyncio.gather(*jobs)
+    prompts = [m["content"] for m in watts.memory.messages(user_data, "", "") if m["role"] == "user"]
+    voices = [u for u in updates if any(kind == "voice" for kind, _, _ in u.message.sent)]
+    prompts = prompts[:-1]  # The last is the empty message passed to messages()
+    print(f"Prompts: {prompts!r}")
+    assert prompts == ["Hello Alan.", "I have a question.\nWhat is Zen?"]
+    assert voices == [updates[0], updates[-1]], "one voice reply to the first message and one to the latest"
+
+    # /reset_voice cancels a reply that is still being recorded
+    update = fake_update(user_id=6, text="Tell me about the self.")
+    job = asyncio.create_task(watts.handle_text(update, fake_context()))
+    await asyncio.sleep(0.6)
+    await watts.reset_voice_command(fake_update(user_id=6, text="/reset_voice"), fake_context())
+    await job
+    kinds = [kind for kind, _, _ in update.message.sent]
+    print(f"Cancelled by /reset_voice: {kinds}")
+    assert "voice" not in kinds and "delete" in kinds
+
+    # A message starting with "!" replaces the unfinished one
+    first = fake_update(user_id=7, text="What is time?")
+    second = fake_update(user_id=7, text="! Actually, what is space?")
+    jobs = [asyncio.create_task(watts.handle_text(first, fake_context()))]
+    await asyncio.sleep(0.6)
+    jobs.append(asyncio.create_task(watts.handle_text(second, fake_context())))
+    await asyncio.gather(*jobs)
+    texts = [text for kind, text, _ in second.message.sent if kind == "text"]
+    assert not any(kind == "voice" for kind, _, _ in first.message.sent)
+    assert any(kind == "voice" for kind, _, _ in second.message.sent)
+    assert any("Actually, what is space?" in text for text in texts) and not any("!" in text for text in texts)
+    print("Superseded reply dropped, new question answered")
+
+    watts.inference.shutdown()
+
+
+asyncio.run(main())
@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+from stubs import StubChat, StubTTS, StubWhisper, fake_context, fake_update
+from telegram_bot import AlanWatts
+
+LOAD_SECONDS = 2.0
+
+
+def slow_loader(model):
+    def load():
+        time.sleep(LOAD_SECONDS)
+        return model
+
+    return load
+
+
+# Both audio models take two seconds to load; the bot must answer before they are ready
+start = time.perf_counter()
+watts = AlanWatts(
+    "test-token",
+    chat_fn=StubChat(delay=0.1),
+    loaders={"tts": slow_loader(StubTTS(delay=0.1)), "asr": slow_loader(StubWhisper(delay=0.1))},
+)
+print(f"Bot constructed in {time.perf_counter() - start:.2f}s, models: {watts.models.status}")
+
+
+async def main():
+    # The first update is answered in writing with a warming up notice
+    update = fake_update(text="Who are you?")
+    await watts.handle_text(update, fake_context())
+    first_reply = time.perf_counter() - start
+    kinds = [kind for kind, _, _ in update.message.sent]
+    texts = [text for kind, text, _ in update.message.sent if kind == "text"]
+    print(f"First update handled after {first_reply:.2f}s: {kinds}")
+
+    assert first_reply < LOAD_SECONDS, "first update should be handled before the models finish loading"
+    assert "voice" not in kinds, "no voice reply while the TTS model is loading"
+    assert any("warming up" in text for text in texts), "user should be told the voice is warming up"
+
+    # A voice message is declined until the ASR model is ready
+    voice_update = fake_update(voice=object())
+    await watts.handle_audio(voice_update, fake_context())
+    assert any("warming up" in text for _, text, _ in voice_update.message.sent)
+
+    # Once loading finishes, replies include audio again
+    assert watts.models.wait("tts", timeout=10) and watts.models.wait("asr", timeout=10)
+    print(f"Models ready: {watts.models.status}, timings: {watts.models.timings}")
+    update = fake_update(text="Who are you?")
+    await watts.handle_text(update, fake_context())
+    assert any(kind == "voice" for kind, _, _ in update.message.sent)
+
+
+asyncio.run(main())
+watts.inference.shutdown()
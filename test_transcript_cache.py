@@ -0,0 +1,77 @@
+import asyncio
+import tempfile
+from pathlib import Path
+
+import torch
+
+from audio_io import WHISPER_SAMPLE_RATE, decode_audio, encode_wav
+from inference import InferencePool
+from stubs import FakeVoice, StubChat, StubTTS, StubWhisper, fake_context, fake_update
+from telegram_bot import AlanWatts
+from transcript_cache import TranscriptCache, fingerprint
+
+
+async def main():
+    # Low-level noise so silence trimming keeps the clip
+    clip = encode_wav(torch.randn(3 * WHISPER_SAMPLE_RATE) * 0.1, WHISPER_SAMPLE_RATE)
+    other = encode_wav(torch.randn(3 * WHISPER_SAMPLE_RATE) * 0.1, WHISPER_SAMPLE_RATE)
+    audio = decode_audio(clip, WHISPER_SAMPLE_RATE)
+    assert fingerprint(audio) == fingerprint(decode_audio(clip, WHISPER_SAMPLE_RATE))
+    assert fingerprint(audio) != fingerprint(decode_audio(other, WHISPER_SAMPLE_RATE))
+
+    whisper = StubWhisper(delay=0.05)
+    path = Path(tempfile.mkdtemp()) / "transcripts.db"
+    watts = AlanWatts(
+        "test-token", model=StubTTS(delay=0.0), whisper_model=whisper, chat_fn=StubChat(delay=0.0), inference=InferencePool()
+    )
+    watts.transcripts = TranscriptCache(path)
+
+    async def send(voice: FakeVoice) -> list:
+        update = fake_update(voice=voice)
+        await watts.handle_audio(update, fake_context())
+        return update.message.sent
+
+    # The first voice note is transcribed
+    sent = await send(FakeVoice(clip, file_unique_id="original"))
+    assert any(kind == "voice" for kind, _, _ in sent)
+    assert whisper.calls == 1
+
+    # Forwarding it again needs neither the download nor ASR
+    forwarded = FakeVoice(clip, file_unique_id="original")
+    sent = await send(forwarded)
+    assert forwarded.downloads == 0 and whisper.calls == 1
+    assert any(kind == "edit" and whisper.text in text for kind, text, _ in sent)
+
+    # The same audio uploaded as a new file is matched by its fingerprint
+    reuploaded = FakeVoice(clip, file_unique_id="reupload")
+    await send(reuploaded)
+    assert reuploaded.downloads == 1 and whisper.calls == 1
+    # ...and its file id is remembered too
+    assert watts.transcripts.get(file_unique_id="reupload") == whisper.text
+
+    # Different audio is transcribed
+    await send(FakeVoice(other, file_unique_id="other"))
+    assert whisper.calls == 2
+
+    # Transcripts of the fast model are not cached
+    watts.asr.policy.long_clip_seconds = 1
+    fast = encode_wav(torch.randn(3 * WHISPER_SAMPLE_RATE) * 0.1, WHISPER_SAMPLE_RATE)
+    await send(FakeVoice(fast, file_unique_id="fast"))
+    await send(FakeVoice(fast, file_unique_id="fast"))
+    assert whisper.calls == 4 and watts.transcripts.get(file_unique_id="fast") is None
+    watts.inference.shutdown()
+
+    # Transcripts persist across restarts
+    assert TranscriptCache(path).get(file_unique_id="original") == whisper.text
+
+    # The least recently used transcripts are evicted
+    cache = TranscriptCache(max_entries=2)
+    cache.put("one", file_unique_id="1")
+    cache.put("two", file_unique_id="2")
+    cache.get(file_unique_id="1")
+    cache.put("three", file_unique_id="3")
+    assert len(cache) == 2 and cache.get(file_unique_id="2") is None and cache.get(file_unique_id="1") == "one"
+    print("Transcript cache OK")
+
+
+asyncio.run(main())
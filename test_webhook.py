@@ -0,0 +1,186 @@
+import asyncio
+import functools
+import json
+import multiprocessing
+import os
+import socket
+import tempfile
+import urllib.request
+from pathlib import Path
+
+from stubs import StubChat, StubTTS, StubWhisper, fake_context, fake_update
+from telegram_bot import AlanWatts
+from user_store import SQLitePersistence, UserStore
+from webhook import WebhookRouter, WorkerPool, shard_for
+
+COMMANDS = {"/exaggeration": "exaggeration_command", "/forget": "forget_command"}
+parent_loads = []
+
+
+def load_stub_models() -> dict:
+    parent_loads.append(os.getpid())
+    return {"tts": StubTTS(delay=0.05), "asr": StubWhisper()}
+
+
+def make_stub_bot(preloaded: dict) -> AlanWatts:
+    return AlanWatts("test-token", model=preloaded["tts"], whisper_model=preloaded["asr"], chat_fn=StubChat(delay=0.05))
+
+
+async def serve_fake(results, watts: AlanWatts, queue, store, index: int, workers: int):
+    """Handle routed updates with fake Telegram objects and report what was sent back"""
+    users = store.load(shard=(index, workers))
+    while (raw := await asyncio.to_thread(queue.get)) is not None:
+        message = json.loads(raw)["message"]
+        user_id, text = message["from"]["id"], message["text"]
+        user_data = users.setdefault(user_id, {})
+        command, *args = text.split()
+        update = fake_update(user_id, text=text)
+        if command in COMMANDS:
+            await getattr(watts, COMMANDS[command])(update, fake_context(user_data, args))
+        else:
+            await watts.handle_text(update, fake_context(user_data))
+        store.put(user_id, user_data)
+        results.put(
+            {
+                "worker": index,
+                "pid": os.getpid(),
+                "user": user_id,
+                "model_id": id(watts.model),
+                "sent": [(kind, text) for kind, text, _ in update.message.sent],
+            }
+        )
+
+
+async def start_shard(store: UserStore, shard: tuple):
+    """A worker's application with its shard of the shared store loaded"""
+    watts = make_stub_bot({"tts": StubTTS(delay=0.0), "asr": StubWhisper()})
+    app = watts.build_application(persistence=SQLitePersistence(store, shard=shard), updater=False)
+    app.bot._initialized = True  # Skip get_me, which needs the Telegram API
+    await app.initialize()
+    return app
+
+
+async def save(app, user_id: int):
+    """Persist a user's data as the application does after handling one of their updates"""
+    app.mark_data_for_update_persistence(user_ids=[user_id])
+    await app.update_persistence()
+
+
+async def voice_handoff(store_path: str):
+    """A custom voice set on one worker follows the user to a worker that never had the file"""
+    store = UserStore(store_path, flush_interval=60)
+    voice_path = Path(tempfile.mkdtemp()) / "voice_2.wav"
+    voice_path.write_bytes(b"RIFF custom voice prompt")
+
+    # Two workers: users 2 and 4 are on shard 0
+    app = await start_shard(store, (0, 2))
+    app.user_data[2].update(custom_voice=str(voice_path), exaggeration=1.2)
+    app.user_data[4].update(exaggeration=0.9)
+    await save(app, 2)
+    await save(app, 4)
+    await app.shutdown()  # Flushes the store
+
+    # Scaled to three workers on another host: user 2 moves to shard 2 and the voice file is not there
+    voice_path.unlink()
+    app = await start_shard(store, (2, 3))
+    assert set(app.user_data) == {2}, "only the shard's users are loaded"
+    assert app.user_data[2]["exaggeration"] == 1.2
+    assert voice_path.read_bytes() == b"RIFF custom voice prompt", "the voice prompt should be restored"
+
+    # Resetting the voice deletes it from the store
+    del app.user_data[2]["custom_voice"]
+    await save(app, 2)
+    await app.shutdown()
+    assert not store.restore_voice(2, voice_path)
+    store.close()
+    print("Custom voice restored on another shard after a handoff, and deleted with /reset_voice")
+
+
+def post(port: int, user_id: int, text: str):
+    message = {"message_id": 1, "from": {"id": user_id}, "chat": {"id": user_id}, "text": text}
+    update = {"update_id": 1, "message": message}
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/", data=json.dumps(update).encode(), headers={"X-Telegram-Bot-Api-Secret-Token": "s3"}
+    )
+    urllib.request.urlopen(request).close()
+
+
+def free_ports(count: int) -> int:
+    """First of ``count`` consecutive free ports"""
+    while True:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            base = probe.getsockname()[1]
+        try:
+            for port in range(base, base + count):
+                with socket.socket() as probe:
+                    probe.bind(("", port))
+            return base
+        except OSError:
+            continue
+
+
+def scrape(port: int) -> str:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=10) as response:
+        return response.read().decode()
+
+
+def run(store_path: str, messages: list, metrics_port: int = None) -> tuple:
+    """Start two workers behind the router, send messages and return the per-message reports
+
+    With ``metrics_port``, also returns each worker's metrics page.
+    """
+    if metrics_port is not None:
+        os.environ["METRICS_PORT"] = str(metrics_port)
+    results = multiprocessing.get_context("fork").Queue()
+    pool = WorkerPool(
+        2,
+        make_bot=make_stub_bot,
+        serve=functools.partial(serve_fake, results),
+        store_path=store_path,
+        load_models=load_stub_models,
+    )
+    pool.start()
+    router = WebhookRouter(pool.queues, secret_token="s3", host="127.0.0.1", port=0)
+    router.start()
+    for user_id, text in messages:
+        post(router.port, user_id, text)
+    reports = [results.get(timeout=30) for _ in messages]
+    pages = [scrape(metrics_port + index) for index in range(2)] if metrics_port is not None else []
+    os.environ.pop("METRICS_PORT", None)
+    router.stop()
+    pool.stop()
+    return reports, pool, pages
+
+
+if __name__ == "__main__":
+    store_path = str(Path(tempfile.mkdtemp()) / "users.sqlite")
+    users = [1, 2, 3, 4, 5, 6]
+
+    # Every user's messages go to the same worker; models are loaded once and shared by both workers
+    metrics_port = free_ports(2)
+    messages = [(1, "/exaggeration 1.5")] + [(user, "What is the self?") for user in users]
+    reports, pool, pages = run(store_path, messages, metrics_port)
+    for report in reports:
+        kinds = [kind for kind, _ in report["sent"]]
+        print(f"user {report['user']} -> worker {report['worker']} (pid {report['pid']}): {kinds}")
+        assert report["worker"] == shard_for(report["user"], 2)
+    assert len({report["pid"] for report in reports}) == 2, "two worker processes should share the load"
+    assert all(any(kind == "voice" for kind, _ in report["sent"]) for report in reports[1:])
+    assert parent_loads == [os.getpid()], "models should be loaded once, in the parent"
+    assert len({report["model_id"] for report in reports}) == 1, "forked workers should reuse the parent's model"
+    print(f"Models loaded once in the parent (pid {parent_loads[0]}) and shared by the workers")
+
+    # Worker N serves its own metrics on METRICS_PORT plus N
+    for index, page in enumerate(pages):
+        handled = sum(report["worker"] == index for report in reports[1:])
+        assert f'watts_requests_total{{kind="text"}} {handled}' in page, f"worker {index} metrics: {page}"
+    print(f"Workers serve metrics on ports {metrics_port} and {metrics_port + 1}")
+
+    # After a restart the settings are read back from the shared store
+    reports, _, _ = run(store_path, [(1, "/exaggeration"), (2, "/exaggeration")])
+    print(f"After restart: {[report['sent'][0][1].splitlines()[0] for report in reports]}")
+    restored = {report["user"]: report["sent"][0][1] for report in reports}
+    assert "`1.50`" in restored[1] and "`0.70`" in restored[2]
+
+    asyncio.run(voice_handoff(str(Path(tempfile.mkdtemp()) / "users.sqlite")))
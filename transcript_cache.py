@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Persistent cache of voice note transcripts, so forwarded voice notes are transcribed once"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+import torch
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 10000
+# Fingerprint resolution: samples rounded to 8-bit levels
+FINGERPRINT_LEVELS = 127
+
+
+def fingerprint(audio: torch.Tensor) -> str:
+    """Content fingerprint of a decoded clip
+
+    Hashes the samples rather than the file, so the same recording in a different container
+    (or with different tags) matches, and rounds them so decoder rounding noise does not matter.
+    """
+    levels = (audio * FINGERPRINT_LEVELS).round().clamp(-FINGERPRINT_LEVELS, FINGERPRINT_LEVELS)
+    return hashlib.sha256(levels.numpy().astype("int8").tobytes()).hexdigest()
+
+
+class TranscriptCache:
+    """Transcripts keyed by Telegram's ``file_unique_id`` and by audio fingerprint
+
+    A file id hit needs no download at all; a fingerprint hit catches the same audio uploaded
+    again as a new file. Entries live in SQLite (in memory unless a path is given) and the least
+    recently used are evicted beyond ``max_entries``.
+    """
+
+    def __init__(self, path=None, max_entries: int = DEFAULT_MAX_ENTRIES):
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._db = sqlite3.connect(str(path) if path else ":memory:", check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS transcripts (key TEXT PRIMARY KEY, text TEXT, accessed REAL)")
+        # Eviction walks the oldest entries in access order instead of sorting the table
+        self._db.execute("CREATE INDEX IF NOT EXISTS transcripts_accessed ON transcripts (accessed)")
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "TranscriptCache":
+        """Create a cache at TRANSCRIPT_CACHE_PATH (in memory when unset)"""
+        return cls(
+            os.getenv("TRANSCRIPT_CACHE_PATH") or None,
+            max_entries=int(os.getenv("TRANSCRIPT_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+        )
+
+    def get(self, file_unique_id: Optional[str] = None, audio_fingerprint: Optional[str] = None) -> Optional[str]:
+        """Look up a transcript by file id or by fingerprint (whichever is given)"""
+        kind, key = ("file", file_unique_id) if file_unique_id else ("audio", audio_fingerprint)
+        with self._lock:
+            row = self._db.execute("SELECT text FROM transcripts WHERE key = ?", (f"{kind}:{key}",)).fetchone()
+            if row is not None:
+                self._db.execute("UPDATE transcripts SET accessed = ? WHERE key = ?", (time.time(), f"{kind}:{key}"))
+                self._db.commit()
+        metrics.transcript_cache.inc(key=kind, result="hit" if row else "miss")
+        return row[0] if row else None
+
+    def put(self, text: str, file_unique_id: Optional[str] = None, audio_fingerprint: Optional[str] = None):
+        """Store a transcript under the file id and the fingerprint"""
+        keys = [f"file:{file_unique_id}"] if file_unique_id else []
+        keys += [f"audio:{audio_fingerprint}"] if audio_fingerprint else []
+        with self._lock:
+            now = time.time()
+            self._db.executemany(
+                "INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?)", [(key, text, now) for key in keys]
+            )
+            self._db.execute(
+                "DELETE FROM transcripts WHERE key IN "
+                "(SELECT key FROM transcripts ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM transcripts").fetchone()[0]
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Optional
+
+import torch
+
+from inference import InferencePool, MicroBatcher
+from metrics import metrics
+from voice_cache import VoiceConditioningCache
+
+logger = logging.getLogger(__name__)
+
+# How long to wait for more requests before running a batch
+DEFAULT_BATCH_WINDOW_MS = 50
+# Largest number of texts synthesized in one forward pass
+DEFAULT_MAX_BATCH = 8
+# Requests whose exaggeration/cfg_weight fall in the same bucket of this width share a batch
+PARAM_TOLERANCE = 0.05
+
+
+class TTSBatcher:
+    """Groups concurrent synthesis requests into batched TTS forward passes
+
+    Requests arriving within a short window that share the same voice prompt and similar
+    exaggeration/cfg_weight are synthesized together with ``model.generate_batch``. Models
+    without a batched generate are called one request at a time.
+    """
+
+    def __init__(
+        self,
+        model,
+        inference: InferencePool,
+        window_ms: float = DEFAULT_BATCH_WINDOW_MS,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        voice_cache: Optional[VoiceConditioningCache] = None,
+    ):
+        self.model = model
+        self.voice_cache = voice_cache
+        max_batch = max_batch if hasattr(model, "generate_batch") else 1
+        self._batcher = MicroBatcher(inference, "tts", self._generate_batch, window_ms, max_batch)
+
+    @classmethod
+    def from_env(
+        cls, model, inference: InferencePool, voice_cache: Optional[VoiceConditioningCache] = None
+    ) -> "TTSBatcher":
+        """Create a batcher configured by TTS_BATCH_WINDOW_MS and TTS_MAX_BATCH"""
+        window_ms = float(os.getenv("TTS_BATCH_WINDOW_MS", DEFAULT_BATCH_WINDOW_MS))
+        max_batch = int(os.getenv("TTS_MAX_BATCH", DEFAULT_MAX_BATCH))
+        return cls(model, inference, window_ms=window_ms, max_batch=max_batch, voice_cache=voice_cache)
+
+    @property
+    def batches(self) -> int:
+        return self._batcher.batches
+
+    @property
+    def requests(self) -> int:
+        return self._batcher.items
+
+    async def generate(
+        self,
+        text: str,
+        audio_prompt_path=None,
+        exaggeration: float = 0.5,
+        cfg_weight: float = 0.5,
+        on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+    ):
+        """Synthesize one text, possibly as part of a larger batch, and return its waveform"""
+        key = (
+            str(audio_prompt_path),
+            round(exaggeration / PARAM_TOLERANCE),
+            round(cfg_weight / PARAM_TOLERANCE),
+        )
+        return await self._batcher.submit(key, (text, audio_prompt_path, exaggeration, cfg_weight), on_queued)
+
+    def _generate_batch(self, key: tuple, requests: list) -> list:
+        """Run the model on a batch of requests in a worker thread"""
+        texts = [text for text, *_ in requests]
+        # Every request in a batch shares the voice; use the first request's parameters
+        _, audio_prompt_path, exaggeration, cfg_weight = requests[0]
+        logger.info(f"Synthesizing batch of {len(texts)} text(s)")
+
+        start = time.perf_counter()
+        with metrics.profiled("tts"), torch.inference_mode():
+            if self.voice_cache is None or audio_prompt_path is None:
+                wavs = self._call_model(self.model, texts, audio_prompt_path, exaggeration, cfg_weight)
+            else:
+                # Reuse the cached speaker conditioning instead of re-embedding the prompt audio
+                with self.voice_cache.conditioned(audio_prompt_path, exaggeration) as model:
+                    wavs = self._call_model(model, texts, None, exaggeration, cfg_weight)
+
+        audio_seconds = sum(wav.shape[-1] for wav in wavs) / self.model.sr
+        if audio_seconds > 0:
+            metrics.tts_real_time_factor.observe((time.perf_counter() - start) / audio_seconds)
+        return wavs
+
+    @staticmethod
+    def _call_model(model, texts: list, audio_prompt_path, exaggeration: float, cfg_weight: float) -> list:
+        kwargs = dict(audio_prompt_path=audio_prompt_path, exaggeration=exaggeration, cfg_weight=cfg_weight)
+        if len(texts) > 1:
+            return model.generate_batch(texts, **kwargs)
+        return [model.generate(texts[0], **kwargs)]
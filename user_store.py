@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""Per-user settings and custom voice prompts in SQLite, shared by every bot process"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+# Seconds between commits of buffered writes
+DEFAULT_FLUSH_INTERVAL = 2.0
+
+
+class UserStore:
+    """User data and custom voice prompts in one SQLite database
+
+    Several processes can open the same database (WAL mode). Writes are buffered in memory
+    and committed together in one transaction every ``flush_interval`` seconds by a
+    background thread, and on ``flush()``/``close()``.
+    """
+
+    def __init__(self, path, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS users (user_id INTEGER PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS voices (user_id INTEGER PRIMARY KEY, data BLOB NOT NULL, updated REAL NOT NULL);
+            """
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._pending_users = {}  # user_id -> serialized data
+        self._pending_voices = {}  # user_id -> bytes, or None to delete
+        self.writes = 0
+        self.commits = 0
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="user-store-flush", daemon=True)
+        self._flusher.start()
+
+    @classmethod
+    def from_env(cls) -> Optional["UserStore"]:
+        """Create a store at USER_STORE_PATH, or return None when it is not set"""
+        path = os.getenv("USER_STORE_PATH")
+        if not path:
+            return None
+        return cls(path, flush_interval=float(os.getenv("USER_STORE_FLUSH_SECONDS", DEFAULT_FLUSH_INTERVAL)))
+
+    def load(self, shard: Optional[tuple] = None) -> dict:
+        """Load every user's data, or only users in ``shard=(index, count)`` (user_id % count == index)"""
+        self.flush()
+        query, params = "SELECT user_id, data FROM users", ()
+        if shard is not None:
+            query, params = query + " WHERE user_id % ? = ?", (shard[1], shard[0])
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return {user_id: json.loads(data) for user_id, data in rows}
+
+    def put(self, user_id: int, data: dict):
+        """Buffer a user's data; it is committed with the next flush"""
+        # Serialize now so later changes to the dict are not written half-way
+        serialized = json.dumps(data, default=str)
+        with self._lock:
+            self._pending_users[user_id] = serialized
+            self.writes += 1
+
+    def delete(self, user_id: int):
+        with self._lock:
+            self._pending_users[user_id] = None
+            self._pending_voices[user_id] = None
+
+    def put_voice(self, user_id: int, data: bytes):
+        with self._lock:
+            self._pending_voices[user_id] = data
+
+    def delete_voice(self, user_id: int):
+        with self._lock:
+            self._pending_voices[user_id] = None
+
+    def restore_voice(self, user_id: int, path) -> bool:
+        """Write a user's stored voice prompt to ``path``; returns whether one was stored"""
+        self.flush()
+        with self._lock:
+            row = self._db.execute("SELECT data FROM voices WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            return False
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_bytes(row[0])
+        return True
+
+    def flush(self):
+        """Commit buffered writes in one transaction"""
+        with self._lock:
+            users, self._pending_users = self._pending_users, {}
+            voices, self._pending_voices = self._pending_voices, {}
+            if not users and not voices:
+                return
+            now = time.time()
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO users (user_id, data, updated) VALUES (?, ?, ?)",
+                    [(user_id, data, now) for user_id, data in users.items() if data is not None],
+                )
+                self._db.executemany(
+                    "DELETE FROM users WHERE user_id = ?",
+                    [(user_id,) for user_id, data in users.items() if data is None],
+                )
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO voices (user_id, data, updated) VALUES (?, ?, ?)",
+                    [(user_id, data, now) for user_id, data in voices.items() if data is not None],
+                )
+                self._db.executemany(
+                    "DELETE FROM voices WHERE user_id = ?",
+                    [(user_id,) for user_id, data in voices.items() if data is None],
+                )
+            self.commits += 1
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error writing user store: {e}")
+
+    def close(self):
+        self._stop.set()
+        self._flusher.join()
+        self.flush()
+        self._db.close()
+
+
+class SQLitePersistence(BasePersistence):
+    """python-telegram-bot persistence that keeps ``user_data`` and custom voice files in a UserStore
+
+    With ``shard=(index, count)`` only the users routed to this worker are loaded. Voice prompt
+    files referenced by ``custom_voice`` are copied into the store and written back to disk when
+    a worker that doesn't have them loads the user.
+    """
+
+    def __init__(self, store: UserStore, shard: Optional[tuple] = None, update_interval: float = 5.0):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.store = store
+        self.shard = shard
+        self._voices = {}  # user_id -> (path, mtime) of the stored voice prompt
+
+    async def get_user_data(self) -> dict:
+        users = self.store.load(self.shard)
+        for user_id, data in users.items():
+            voice = data.get("custom_voice")
+            if voice and not Path(voice).exists() and not self.store.restore_voice(user_id, voice):
+                data.pop("custom_voice")
+            elif voice:
+                self._voices[user_id] = (voice, Path(voice).stat().st_mtime)
+        return users
+
+    async def update_user_data(self, user_id: int, data: dict):
+        self.store.put(user_id, data)
+        voice = data.get("custom_voice")
+        if voice and Path(voice).exists():
+            seen = (str(voice), Path(voice).stat().st_mtime)
+            if self._voices.get(user_id) != seen:
+                self.store.put_voice(user_id, await asyncio.to_thread(Path(voice).read_bytes))
+                self._voices[user_id] = seen
+        elif self._voices.pop(user_id, None) is not None:
+            self.store.delete_voice(user_id)
+
+    async def drop_user_data(self, user_id: int):
+        self.store.delete(user_id)
+        self._voices.pop(user_id, None)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        pass
+
+    async def flush(self):
+        self.store.flush()
+
+    # Only user data is persisted
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        pass
+
+    async def update_bot_data(self, data: dict):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def update_conversation(self, name: str, key: tuple, new_state):
+        pass
+
+    async def drop_chat_data(self, chat_id: int):
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict):
+        pass
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+
+import copy
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+import torch
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Memory budget for cached speaker conditionings
+DEFAULT_MAX_MB = 512
+
+
+def _nbytes(obj, seen=None) -> int:
+    """Estimate the tensor memory held by a conditioning object"""
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, torch.Tensor):
+        return obj.element_size() * obj.nelement()
+    if isinstance(obj, dict):
+        return sum(_nbytes(value, seen) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(_nbytes(value, seen) for value in obj)
+    if hasattr(obj, "__dict__"):
+        return sum(_nbytes(value, seen) for value in vars(obj).values())
+    return 0
+
+
+class VoiceConditioningCache:
+    """LRU cache of TTS speaker conditionings keyed by prompt file content and exaggeration
+
+    Preparing conditionals decodes, resamples and embeds the reference audio, which is costly
+    to repeat on every reply. Entries are kept in memory under a byte cap and optionally saved
+    to ``cache_dir`` so a restarted bot starts warm.
+    """
+
+    def __init__(self, model, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024, cache_dir: Optional[Path] = None):
+        self.model = model
+        self.max_bytes = max_bytes
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self._entries = OrderedDict()  # key -> (conds, nbytes)
+        self._digests = {}  # path -> ((mtime_ns, size), digest)
+        self._lock = threading.RLock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls, model) -> "VoiceConditioningCache":
+        """Create a cache configured by VOICE_CACHE_MAX_MB and VOICE_CACHE_DIR"""
+        max_mb = float(os.getenv("VOICE_CACHE_MAX_MB", DEFAULT_MAX_MB))
+        return cls(model, max_bytes=int(max_mb * 1024 * 1024), cache_dir=os.getenv("VOICE_CACHE_DIR"))
+
+    def digest(self, prompt_path) -> str:
+        """Content hash of a prompt file, recomputed only when the file changes"""
+        path = str(prompt_path)
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._digests.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self._digests[path] = (signature, digest)
+        return digest
+
+    @staticmethod
+    def _key(digest: str, exaggeration: float) -> str:
+        return f"{digest}_{exaggeration:.2f}"
+
+    def get(self, prompt_path, exaggeration: float):
+        """Return the conditioning for a prompt file, computing it on a miss"""
+        with self._lock:
+            key = self._key(self.digest(prompt_path), exaggeration)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.voice_cache.inc(result="hit")
+                return self._entries[key][0]
+            self.misses += 1
+        metrics.voice_cache.inc(result="miss")
+
+        # Computed without the lock, so other voices keep being served meanwhile
+        conds = self._load_from_disk(key)
+        if conds is None:
+            logger.info(f"Preparing voice conditioning for {prompt_path}")
+            model = self._model_copy()
+            model.prepare_conditionals(str(prompt_path), exaggeration=exaggeration)
+            conds = model.conds
+            self._save_to_disk(key, conds)
+
+        with self._lock:
+            if key not in self._entries:
+                self._store(key, conds)
+            return self._entries[key][0]
+
+    @contextmanager
+    def conditioned(self, prompt_path, exaggeration: float):
+        """Yield the model with the conditioning for a prompt installed
+
+        The model reads its conditioning from ``model.conds``, so each caller gets its own
+        shallow copy of the model (sharing the weights) and generations with different voices
+        can run in parallel worker threads.
+        """
+        model = self._model_copy()
+        model.conds = self.get(prompt_path, exaggeration)
+        yield model
+
+    def _model_copy(self):
+        return copy.copy(self.model)
+
+    def _store(self, key: str, conds):
+        size = _nbytes(conds)
+        self._entries[key] = (conds, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.bytes -= evicted_size
+
+    def evict(self, prompt_path):
+        """Drop every cached conditioning for a prompt file, in memory and on disk"""
+        with self._lock:
+            try:
+                digest = self.digest(prompt_path)
+            except OSError:
+                return
+            self._digests.pop(str(prompt_path), None)
+
+            for key in [key for key in self._entries if key.startswith(digest)]:
+                _, size = self._entries.pop(key)
+                self.bytes -= size
+            if self.cache_dir:
+                for path in self.cache_dir.glob(f"{digest}_*.pt"):
+                    path.unlink(missing_ok=True)
+            logger.info(f"Evicted voice conditioning for {prompt_path}")
+
+    def _load_from_disk(self, key: str):
+        if not self.cache_dir:
+            return None
+        path = self.cache_dir / f"{key}.pt"
+        if not path.exists():
+            return None
+        try:
+            conds = torch.load(path, map_location=getattr(self.model, "device", "cpu"), weights_only=False)
+            logger.info(f"Loaded voice conditioning from {path}")
+            return conds
+        except Exception as e:
+            logger.warning(f"Could not load voice conditioning {path}: {e}")
+            return None
+
+    def _save_to_disk(self, key: str, conds):
+        if not self.cache_dir:
+            return
+        try:
+            torch.save(conds, self.cache_dir / f"{key}.pt")
+        except Exception as e:
+            logger.warning(f"Could not save voice conditioning: {e}")
+
+    def stats(self) -> dict:
+        """Hit and miss counters and current memory use"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+        }
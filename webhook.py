@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""Webhook front end that shards Telegram updates by user across model-holding worker processes
+
+Run with ``python webhook.py``. The front end only parses the update to find the user and
+hands it to worker ``user_id % WEBHOOK_WORKERS``, so a user's settings and voice prompt
+are always used by the same worker. On CPU the models are loaded once before the workers
+are forked and their weights are shared copy-on-write; on GPUs every worker loads its own.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+from telegram import Bot, Update
+
+from cpu_profile import configure_threads
+from metrics import metrics, start_http_server
+from model_manager import pick_device
+from telegram_bot import AlanWatts, load_asr, load_tts
+from user_store import SQLitePersistence, UserStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2
+DEFAULT_PORT = 8443
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def update_user_id(update: dict) -> Optional[int]:
+    """The id of the user who sent an update (message, callback query, ...), if any"""
+    for value in update.values():
+        if isinstance(value, dict) and isinstance(value.get("from"), dict):
+            return value["from"].get("id")
+    return None
+
+
+def shard_for(user_id: Optional[int], workers: int) -> int:
+    """Worker index for a user; updates without a user go to the first worker"""
+    return (user_id or 0) % workers
+
+
+class WebhookRouter:
+    """HTTP endpoint receiving Telegram webhook updates and forwarding each one to its user's worker queue"""
+
+    def __init__(
+        self, queues: list, secret_token: Optional[str] = None, host: str = "0.0.0.0", port: int = DEFAULT_PORT
+    ):
+        self.queues = queues
+        self.secret_token = secret_token
+        self.routed = [0] * len(queues)
+        router = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if router.secret_token and self.headers.get(SECRET_HEADER) != router.secret_token:
+                    self.send_error(403)
+                    return
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                try:
+                    update = json.loads(body)
+                except ValueError:
+                    self.send_error(400)
+                    return
+                router.route(update, body.decode("utf-8"))
+                # Answer right away; Telegram retries updates that are not acknowledged
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.port = self.server.server_address[1]
+
+    def route(self, update: dict, raw: str):
+        index = shard_for(update_user_id(update), len(self.queues))
+        self.queues[index].put(raw)
+        self.routed[index] += 1
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="webhook-http", daemon=True).start()
+        logger.info(f"Webhook front end listening on port {self.port} for {len(self.queues)} workers")
+
+    def stop(self):
+        self.server.shutdown()
+
+
+def load_shared_models(device: str) -> dict:
+    """Load the audio models once in the parent so forked workers share their weights"""
+    return {"tts": load_tts(device), "asr": load_asr(device)}
+
+
+def make_watts(token: str, preloaded: dict) -> AlanWatts:
+    return AlanWatts(token, model=preloaded.get("tts"), whisper_model=preloaded.get("asr"))
+
+
+async def serve_telegram(watts: AlanWatts, queue, store: Optional[UserStore], index: int, workers: int):
+    """Feed routed updates into a python-telegram-bot application without its own updater"""
+    persistence = SQLitePersistence(store, shard=(index, workers)) if store else None
+    app = watts.build_application(persistence=persistence, updater=False)
+    async with app:
+        await app.start()
+        try:
+            while (raw := await asyncio.to_thread(queue.get)) is not None:
+                await app.update_queue.put(Update.de_json(json.loads(raw), app.bot))
+        finally:
+            await app.stop()
+
+
+def worker_main(
+    index: int, workers: int, queue, make_bot: Callable, serve: Callable, store_path: Optional[str], preloaded: dict
+):
+    """Entry point of a worker process"""
+    logging.basicConfig(
+        format=f"%(asctime)s - worker {index} - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+    )
+    # Split the CPU between workers instead of every worker using all cores (CPU_THREADS overrides this)
+    configure_threads(max(1, (os.cpu_count() or 1) // workers))
+    # Each worker exports its own metrics, on METRICS_PORT plus its index
+    metrics.configure_from_env()
+    if os.getenv("METRICS_PORT"):
+        port = int(os.getenv("METRICS_PORT")) + index
+        os.environ["METRICS_PORT"] = str(port)
+        start_http_server(port)
+
+    watts = make_bot(preloaded)
+    store = UserStore(store_path) if store_path else None
+    try:
+        asyncio.run(serve(watts, queue, store, index, workers))
+    finally:
+        watts.inference.shutdown()
+        if store is not None:
+            store.close()
+
+
+class WorkerPool:
+    """Starts worker processes that each hold the models and serve one shard of the users
+
+    ``load_models()`` runs in the parent when weights can be shared, i.e. on CPU where
+    workers are forked; otherwise each worker loads its own models.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        make_bot: Callable[[dict], AlanWatts],
+        serve: Callable = serve_telegram,
+        store_path: Optional[str] = None,
+        load_models: Optional[Callable[[], dict]] = None,
+    ):
+        self.workers = workers
+        self.make_bot = make_bot
+        self.serve = serve
+        self.store_path = store_path
+        self.load_models = load_models
+        self.queues = []
+        self.processes = []
+
+    def start(self):
+        can_fork = "fork" in multiprocessing.get_all_start_methods()
+        preloaded = self.load_models() if self.load_models is not None and can_fork else {}
+        if preloaded:
+            logger.info(f"Loaded shared models in the parent: {', '.join(preloaded)}")
+        context = multiprocessing.get_context("fork" if preloaded else "spawn")
+        self.queues = [context.Queue() for _ in range(self.workers)]
+        self.processes = [
+            context.Process(
+                target=worker_main,
+                args=(index, self.workers, queue, self.make_bot, self.serve, self.store_path, preloaded),
+                name=f"watts-worker-{index}",
+            )
+            for index, queue in enumerate(self.queues)
+        ]
+        for process in self.processes:
+            process.start()
+
+    def stop(self, timeout: float = 30.0):
+        """Ask every worker to finish its queue and exit"""
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+
+def main():
+    load_dotenv()
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+
+    token = os.getenv("TELEGRAM_BOT_TOKEN")
+    url = os.getenv("WEBHOOK_URL")
+    if not token or not url:
+        print("❌ Error: Please set TELEGRAM_BOT_TOKEN and WEBHOOK_URL (the public https URL of this server)")
+        return
+
+    workers = int(os.getenv("WEBHOOK_WORKERS", DEFAULT_WORKERS))
+    secret = os.getenv("WEBHOOK_SECRET")
+    device = pick_device()
+    pool = WorkerPool(
+        workers,
+        make_bot=functools.partial(make_watts, token),
+        store_path=os.getenv("USER_STORE_PATH", "temp/users.sqlite"),
+        # CUDA cannot be used in forked processes, so GPU workers load their own models
+        load_models=functools.partial(load_shared_models, device) if device == "cpu" else None,
+    )
+    pool.start()
+
+    router = WebhookRouter(pool.queues, secret_token=secret, port=int(os.getenv("WEBHOOK_PORT", DEFAULT_PORT)))
+    router.start()
+    asyncio.run(Bot(token).set_webhook(url, allowed_updates=Update.ALL_TYPES, secret_token=secret))
+    logger.info(f"Webhook set to {url}")
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print("\n🛑 Bot stopped by user")
+    finally:
+        router.stop()
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()